@@ -1,8 +1,9 @@
 # app.py — Finanzas personales (orden por FECHA en Últimos 8)
 from __future__ import annotations
 
-import time, math
+import os, time, math, hashlib, json
 from datetime import date, timedelta, datetime
+import numpy as np
 import pandas as pd
 import streamlit as st
 
@@ -150,37 +151,61 @@ st.markdown(f"""
 #   GOOGLE SHEETS
 # ==========================
 import gspread
-from google.oauth2.service_account import Credentials
 from gspread_dataframe import get_as_dataframe, set_with_dataframe
 from gspread.exceptions import APIError
+from ledgers import SCOPES, ledgers_configurados, ClientPool, CacheLRU, tamano_bytes
+from monitor import medir, CAMPOS_METADATOS
 
 # Validación temprana de secrets
-if "SHEET_ID" not in st.secrets:
-    st.error("Falta `SHEET_ID` en st.secrets.")
+LEDGERS = ledgers_configurados(st.secrets)
+if not LEDGERS:
+    st.error("Falta `SHEET_ID` (o la tabla `[ledgers]`) en st.secrets.")
     st.stop()
 if "gcp_service_account" not in st.secrets:
     st.error("Faltan credenciales `gcp_service_account` en st.secrets.")
     st.stop()
 
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
-SHEET_ID = st.secrets["SHEET_ID"]
 SVC = dict(st.secrets["gcp_service_account"])
 
+# ---- Libro de esta sesión (?ledger=Nombre o selector; un solo libro = sin selector)
+_ql = qp.get("ledger") if qp else None
+if _ql in LEDGERS and "ledger" not in st.session_state:
+    st.session_state.ledger = _ql
+if st.session_state.get("ledger") not in LEDGERS:
+    st.session_state.ledger = next(iter(LEDGERS))
+if len(LEDGERS) > 1:
+    st.selectbox("📒 Libro", list(LEDGERS), key="ledger")
+SHEET_ID = LEDGERS[st.session_state.ledger]
+
 @st.cache_resource(show_spinner=False)
-def get_client():
-    creds = Credentials.from_service_account_info(SVC, scopes=SCOPES)
-    return gspread.authorize(creds)
+def pool_clientes():
+    """Clientes autorizados compartidos por todos los libros y sesiones del proceso."""
+    return ClientPool(SCOPES)
 
 @st.cache_resource(show_spinner=False)
-def open_sheet(max_retries: int = 4, base_sleep: float = 0.8):
+def cache_tablas():
+    """Lecturas de Sheets por libro: acotadas en memoria (CACHE_MB) con expulsión LRU.
+
+    Las tablas van llaveadas por su versión, así que no caducan por escrituras de
+    la app; el TTL (CACHE_TTL, s) sólo acota ediciones hechas a mano en el Sheet.
+    """
+    return CacheLRU(max_bytes=int(st.secrets.get("CACHE_MB", 256)) * 2**20,
+                    ttl=float(st.secrets.get("CACHE_TTL", 600)))
+
+def get_client():
+    return pool_clientes().get(SVC)
+
+def limpiar_cache():
+    """Invalida las lecturas del libro activo; las de otros libros se conservan."""
+    cache_tablas().invalidar(SHEET_ID)
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def open_sheet(sheet_id: str, max_retries: int = 4, base_sleep: float = 0.8):
     """Abre el Spreadsheet con reintentos y mensajes claros de error."""
     last_exc = None
     for i in range(max_retries):
         try:
-            return get_client().open_by_key(SHEET_ID)
+            return get_client().open_by_key(sheet_id)
         except APIError as e:
             last_exc = e
             # backoff exponencial pequeño
@@ -222,11 +247,36 @@ def _fallback_df(ws):
     df = pd.DataFrame(rows, columns=headers)
     return df
 
+def _tipar(df, dtypes):
+    if dtypes and not df.empty:
+        for c, typ in dtypes.items():
+            if c in df.columns:
+                try:
+                    if typ == "float":
+                        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.0)
+                    elif typ == "int":
+                        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype(int)
+                    elif typ == "date":
+                        df[c] = pd.to_datetime(df[c], errors="coerce").dt.date
+                    else:
+                        df[c] = df[c].astype(str)
+                except:
+                    pass
+    return df
+
+# Latencias y bytes de la última lectura/escritura por (libro, pestaña) para el monitor de
+# capacidad; la sesión puede cambiar de libro y las medidas de uno no deben mezclarse con otro
+METRICAS = st.session_state.setdefault("metricas_libro", {})
+
+def llave_metrica(ws):
+    return (SHEET_ID, ws.title)
+
 def get_df(ws, dtypes=None, retries=3, backoff=1.2):
     last_exc = None
     for i in range(retries):
         try:
-            df = get_as_dataframe(ws, evaluate_formulas=False, dtype=None, headers=True)
+            with medir(METRICAS, llave_metrica(ws), "lectura_ms"):
+                df = get_as_dataframe(ws, evaluate_formulas=False, dtype=None, headers=True)
             break
         except APIError as e:
             last_exc = e
@@ -248,20 +298,8 @@ def get_df(ws, dtypes=None, retries=3, backoff=1.2):
     if not df.empty:
         df.columns = [str(c).strip() for c in df.columns]
 
-    if dtypes and not df.empty:
-        for c, typ in dtypes.items():
-            if c in df.columns:
-                try:
-                    if typ == "float":
-                        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.0)
-                    elif typ == "int":
-                        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype(int)
-                    elif typ == "date":
-                        df[c] = pd.to_datetime(df[c], errors="coerce").dt.date
-                    else:
-                        df[c] = df[c].astype(str)
-                except:
-                    pass
+    df = _tipar(df, dtypes)
+    METRICAS.setdefault(llave_metrica(ws), {})["bytes"] = tamano_bytes(df)
     return df.reset_index(drop=True)
 
 def write_df_safe(ws, df, max_retries=5, base_sleep=0.8):
@@ -277,9 +315,10 @@ def write_df_safe(ws, df, max_retries=5, base_sleep=0.8):
                 if headers:
                     ws.append_row(headers)
                 return
-            ws.clear()
-            set_with_dataframe(ws, df, include_index=False,
-                               include_column_header=True, resize=True)
+            with medir(METRICAS, llave_metrica(ws), "escritura_ms"):
+                ws.clear()
+                set_with_dataframe(ws, df, include_index=False,
+                                   include_column_header=True, resize=True)
             return
         except APIError:
             attempt += 1
@@ -288,25 +327,132 @@ def write_df_safe(ws, df, max_retries=5, base_sleep=0.8):
             sleep_s = base_sleep * (2 ** (attempt - 1)) + (0.05 * attempt)
             time.sleep(sleep_s)
 
+def _valores_hoja(df):
+    """DataFrame -> filas (encabezado incluido) listas para la API de valores."""
+    out = df.astype(object).where(df.notna(), "")
+    rows = [[str(c) for c in df.columns]]
+    for fila in out.itertuples(index=False, name=None):
+        rows.append([v.isoformat() if isinstance(v, (date, datetime)) else v for v in fila])
+    return rows
+
+def write_batch_safe(pares, max_retries=5, base_sleep=0.8):
+    """Escribe varias pestañas en UNA sola llamada (values:batchUpdate).
+
+    `pares` es una lista de (worksheet, DataFrame). Las filas y columnas sobrantes de
+    cada pestaña se rellenan en blanco dentro de la misma llamada, así no hace falta
+    un `ws.clear()` previo por pestaña. El tamaño de la cuadrícula se pide antes
+    (metadatos, sin valores): los worksheets están en caché por proceso y su
+    `row_count` no ve lo que creció desde otro proceso o a mano.
+    """
+    pares = [(ws, df) for ws, df in pares if df is not None and len(df.columns) > 0]
+    if not pares:
+        return
+    grid = {p["properties"]["title"]: p["properties"]["gridProperties"]
+            for p in sh.fetch_sheet_metadata(params={"fields": CAMPOS_METADATOS}).get("sheets", [])}
+    data = []
+    for ws, df in pares:
+        vals = _valores_hoja(df)
+        gp = grid.get(ws.title, {})
+        filas = int(gp.get("rowCount", ws.row_count))
+        cols  = int(gp.get("columnCount", ws.col_count))
+        if len(vals) > filas or len(df.columns) > cols:
+            # no add_rows/add_cols: suman sobre el tamaño en caché del worksheet
+            filas, cols = max(filas, len(vals)), max(cols, len(df.columns))
+            ws.resize(rows=filas, cols=cols)
+        # toda la cuadrícula: lo que sobre a la derecha o abajo (columnas viejas, filas borradas) queda en blanco
+        vals = [f + [""] * (cols - len(f)) for f in vals] + [[""] * cols for _ in range(filas - len(vals))]
+        data.append({"range": f"'{ws.title}'!A1", "values": vals})
+    attempt = 0
+    while True:
+        try:
+            t0 = time.perf_counter()
+            sh.values_batch_update({"valueInputOption": "USER_ENTERED", "data": data})
+            ms = (time.perf_counter() - t0) * 1000
+            # una sola llamada: se reparte entre las pestañas según las celdas que llevó cada una
+            celdas = [len(d["values"]) * len(d["values"][0]) for d in data]
+            for (ws, _), c in zip(pares, celdas):
+                METRICAS.setdefault(llave_metrica(ws), {})["escritura_ms"] = round(ms * c / sum(celdas), 1)
+            return
+        except APIError:
+            attempt += 1
+            if attempt >= max_retries:
+                raise
+            time.sleep(base_sleep * (2 ** (attempt - 1)) + (0.05 * attempt))
+
+from recurrentes import REC_COLS
+
+from concurrencia import (VERSIONES_COLS, parse_versiones, tabla_versiones,
+                          fusionar, marcar)
+from monitor import MONITOR_COLS
+from portafolio import OPERACIONES_COLS
+from sobres import PRESUPUESTOS_COLS
+
+ESTRUCTURA = {
+    "Config":      ["clave","valor"],
+    "Gastos":      ["ts","fecha","cuenta","monto","categoria","nota","moneda","tasa"],
+    "Traspasos":   ["ts","fecha","cuenta_emisora","cuenta_receptora","monto","comentario","moneda","tasa"],
+    "Ingresos":    ["ts","fecha","cuenta","monto","categoria","nota","moneda","tasa"],
+    "Recurrentes": REC_COLS,
+    "Operaciones": OPERACIONES_COLS,
+    "Presupuestos": PRESUPUESTOS_COLS,
+    "Monitor":     MONITOR_COLS,
+    "Versiones":   VERSIONES_COLS,
+}
+DTYPES = {"Gastos": {"monto":"float"}, "Traspasos": {"monto":"float"},
+          "Ingresos": {"monto":"float"}, "Recurrentes": {"monto":"float"},
+          "Operaciones": {"titulos":"float", "precio":"float", "comision":"float"},
+          "Presupuestos": {"monto":"float"}}
+# Llave de fila para fusionar escrituras concurrentes
+LLAVES = {"Config": "clave", "Gastos": "ts", "Traspasos": "ts", "Ingresos": "ts",
+          "Recurrentes": "id", "Operaciones": "ts", "Presupuestos": "id", "Monitor": ["fecha","pestaña"]}
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def hojas_libro(sheet_id: str) -> dict:
+    """Pestañas del libro (creadas si faltan); una vez por proceso, no en cada rerun."""
+    sh_ = open_sheet(sheet_id)
+    return {t: ensure_worksheet(sh_, t, cols) for t, cols in ESTRUCTURA.items()}
+
 # Conexión a Sheets
 with st.status("Conectando con Sheets…", expanded=False) as s:
-    sh    = open_sheet()
-    wsCfg = ensure_worksheet(sh, "Config",    ["clave","valor"])
-    wsG   = ensure_worksheet(sh, "Gastos",    ["ts","fecha","cuenta","monto","categoria","nota"])
-    wsT   = ensure_worksheet(sh, "Traspasos", ["ts","fecha","cuenta_emisora","cuenta_receptora","monto","comentario"])
-    wsI   = ensure_worksheet(sh, "Ingresos",  ["ts","fecha","cuenta","monto","categoria","nota"])
+    sh    = open_sheet(SHEET_ID)
+    HOJAS = hojas_libro(SHEET_ID)
+    wsCfg, wsG, wsT, wsI, wsR = (HOJAS[t] for t in ["Config","Gastos","Traspasos","Ingresos","Recurrentes"])
     s.update(label="Conectado ✅", state="complete")
 
-@st.cache_data(ttl=2.0)
+# ---- ¿Cambió algo? (pestaña Versiones: una lectura chica en vez de releer todo)
+def versiones_remotas(fresco: bool = False) -> dict:
+    leer = lambda: parse_versiones(sh.values_get("'Versiones'!A2:F").get("values", []))
+    if fresco:
+        return leer()
+    return cache_tablas().get((SHEET_ID, "versiones"), leer, ttl=2.0)
+
+VERSIONES = versiones_remotas()
+BASE, BASE_VER = {}, {}      # lo que esta corrida leyó de cada pestaña y con qué versión
+ESCRITOR = st.session_state.setdefault("escritor", f"s{int(time.time()*1000) % 10**8}")
+
+def leer_pestaña(ws):
+    """Tabla en caché bajo su versión: mientras nadie escriba, no se vuelve a leer."""
+    t = ws.title
+    v = VERSIONES.get(t, {}).get("version", 0)
+    df = cache_tablas().get((SHEET_ID, t, v), lambda: get_df(ws, dtypes=DTYPES.get(t)))
+    BASE[t], BASE_VER[t] = df, v
+    # copias: el resto del script modifica las tablas en sitio
+    return df.copy()
+
 def read_tables_cached():
-    cfg_       = get_df(wsCfg)
-    gastos_    = get_df(wsG, dtypes={"monto":"float"})
-    traspasos_ = get_df(wsT, dtypes={"monto":"float"})
-    ingresos_  = get_df(wsI, dtypes={"monto":"float"})
-    return cfg_, gastos_, traspasos_, ingresos_
+    return tuple(leer_pestaña(ws) for ws in (wsCfg, wsG, wsT, wsI))
 
 cfg, gastos, traspasos, ingresos = read_tables_cached()
 
+def read_recurrentes_cached():
+    r = leer_pestaña(wsR)
+    return r if not r.empty else pd.DataFrame(columns=REC_COLS)
+
+recurrentes = read_recurrentes_cached()
+presupuestos = leer_pestaña(HOJAS["Presupuestos"])
+if presupuestos.empty:
+    presupuestos = pd.DataFrame(columns=PRESUPUESTOS_COLS)
+
 def ensure_ts(df: pd.DataFrame):
     if df is None or df.empty: return df, False
     changed = False
@@ -323,9 +469,69 @@ def ensure_ts(df: pd.DataFrame):
 gastos, g_ch     = ensure_ts(gastos)
 traspasos, t_ch  = ensure_ts(traspasos)
 ingresos, i_ch   = ensure_ts(ingresos)
-if g_ch: write_df_safe(wsG, gastos)
-if t_ch: write_df_safe(wsT, traspasos)
-if i_ch: write_df_safe(wsI, ingresos)
+# La base de la fusión es la tabla ya con `ts` entero (misma llave que escribimos)
+BASE.update({"Gastos": gastos.copy(), "Traspasos": traspasos.copy(), "Ingresos": ingresos.copy()})
+
+def tabla_remota(ws, rem: dict) -> pd.DataFrame:
+    """Estado actual de la pestaña en Sheets.
+
+    Si desde nuestra versión el otro dispositivo sólo agregó filas al final
+    (`reescritura` ≤ la versión que leímos), se piden sólo esas filas nuevas;
+    si borró o editó, se relee la pestaña completa.
+    """
+    t, base = ws.title, BASE.get(t)
+    if base is not None and not base.empty and rem.get("reescritura", 0) <= BASE_VER.get(t, 0) \
+            and rem.get("filas", 0) >= len(base):
+        n = len(base.columns)
+        desde, hasta = len(base) + 2, rem["filas"] + 1
+        # mismas opciones que get_as_dataframe en get_df: fechas como texto, no como serial (46314)
+        vals = ws.get_values(f"A{desde}:{gspread.utils.rowcol_to_a1(hasta, n)}",
+                             value_render_option="FORMULA",
+                             date_time_render_option="FORMATTED_STRING") if hasta >= desde else []
+        cola = pd.DataFrame([(list(f) + [""] * n)[:n] for f in vals], columns=base.columns)
+        cola = _tipar(cola[(cola != "").any(axis=1)].copy(), DTYPES.get(t))
+        suya = pd.concat([base, cola], ignore_index=True)
+    else:
+        suya = get_df(ws, dtypes=DTYPES.get(t))
+    return ensure_ts(suya)[0] if "ts" in suya.columns else suya
+
+def guardar(cambios: dict) -> dict:
+    """Escribe {pestaña: DataFrame} + Versiones en UNA llamada, con control optimista.
+
+    Antes de escribir se compara la versión remota de cada pestaña con la que
+    leyó esta corrida. Si otro dispositivo escribió en medio, se traen sus
+    cambios y se fusionan por llave (saldos: se suma nuestra diferencia) en vez
+    de pisarlos. Devuelve las tablas tal como quedaron escritas.
+    """
+    global VERSIONES
+    rem = dict(versiones_remotas(fresco=True))
+    finales, ajenas = {}, 0
+    for t, df in cambios.items():
+        previo = BASE.get(t)
+        if rem.get(t, {}).get("version", 0) != BASE_VER.get(t, 0):
+            suya = tabla_remota(HOJAS[t], rem.get(t, {}))
+            df, n = fusionar(previo, df, suya, LLAVES[t],
+                             sumar=("valor", "saldo_") if t == "Config" else None)
+            previo, ajenas = suya, ajenas + n
+        rem[t] = marcar(rem, t, previo, df, ESCRITOR)
+        finales[t] = df
+    write_batch_safe([(HOJAS[t], df) for t, df in finales.items()]
+                     + [(HOJAS["Versiones"], tabla_versiones(rem))])
+    for t, df in finales.items():
+        BASE[t], BASE_VER[t] = df.copy(), rem[t]["version"]
+    VERSIONES = rem
+    cache_tablas().quitar((SHEET_ID, "versiones"))
+    if ajenas:
+        st.session_state.ajenas = st.session_state.get("ajenas", 0) + ajenas
+    return finales
+
+if st.session_state.get("ajenas"):
+    st.toast(f"🔀 Se integraron {st.session_state.pop('ajenas')} cambios de otro dispositivo.")
+
+_sin_ts = {t: df for t, df, ch in [("Gastos", gastos, g_ch), ("Traspasos", traspasos, t_ch),
+                                    ("Ingresos", ingresos, i_ch)] if ch}
+if _sin_ts:
+    guardar(_sin_ts)
 
 def cfg_get(k, default=None):
     if cfg.empty: return default
@@ -341,6 +547,13 @@ def cfg_set(k, v):
         else: cfg = pd.concat([cfg, pd.DataFrame({"clave":[k], "valor":[v]})], ignore_index=True)
 
 def cuentas(): return ["BBVA Concentradora","BBVA Credito","Apartados","GBM"]
+
+TIPOS_MOV = ["Gasto","Traspaso","Ingreso"]
+CATEGORIAS = {
+    "Gasto":    ["Comida","Gasolina","Ocio","Servicios","Otro"],
+    "Traspaso": ["Inversión","Ahorro","Agregar fondos","Otro"],   # columna `comentario`
+    "Ingreso":  ["Semana","Nómina","Intereses","Dividendos","Otro"],
+}
 def saldo_key(cta): return f"saldo_{cta}"
 
 def get_saldos():
@@ -358,19 +571,347 @@ def set_all_saldos(s):
 if cfg_get("objetivo_semana") is None:        cfg_set("objetivo_semana","1500")
 if cfg_get("objetivo_ahorro_mes") is None:    cfg_set("objetivo_ahorro_mes","8500")
 
+# ==========================
+#   LEDGER UNIFICADO (vectorizado)
+# ==========================
+from movimientos import (LEDGER_COLS, ledger_unificado, ledger_a_tabla,
+                         flujos_cuenta, efecto_saldos, reporte_periodos, sin_tasa, restaurar_filas)
+
+def version_datos(*dfs) -> str:
+    """Huella barata del contenido de las tablas; sirve como llave de caché."""
+    h = hashlib.blake2b(digest_size=8)
+    for df in dfs:
+        h.update(str(len(df)).encode())
+        if not df.empty:
+            h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def version_pestaña(t: str) -> str:
+    """Huella de la pestaña `t` tal como la tiene esta corrida.
+
+    Se calcula una vez por versión (y por recarga: vive en `cache_tablas` junto a
+    la tabla), no en cada rerun; una escritura propia sube la versión y la renueva.
+    """
+    return cache_tablas().get((SHEET_ID, "huella", t, BASE_VER.get(t, 0)), lambda: version_datos(BASE[t]))
+
+# ==========================
+#   MOVIMIENTOS RECURRENTES (reglas en la pestaña "Recurrentes")
+# ==========================
+from recurrentes import FRECUENCIAS, ocurrencias_recurrentes
+
+def proyectar_recurrentes(desde, hasta) -> pd.DataFrame:
+    """Ocurrencias futuras (sin escribir nada) para pronósticos."""
+    return ocurrencias_recurrentes(recurrentes, desde, hasta)
+
+def materializar_recurrentes(hasta=None) -> int:
+    """Registra en un solo lote todas las ocurrencias vencidas desde la última corrida.
+
+    La marca `hasta` de cada regla evita regenerar lo ya procesado (o lo que el
+    usuario borró después), y el `ts` determinista evita duplicados si otra
+    sesión materializó lo mismo: antes de escribir se revisan las versiones
+    (si alguien escribió, se recarga lo cambiado) y se descartan los `ts` que ya existan.
+    """
+    global gastos, traspasos, ingresos, cfg, recurrentes
+    hasta = pd.Timestamp(hasta or date.today()).normalize()
+    if recurrentes.empty:
+        return 0
+    marca = pd.to_datetime(recurrentes["hasta"], errors="coerce") + pd.Timedelta(days=1)
+    if ocurrencias_recurrentes(recurrentes, marca, hasta).empty:
+        return 0
+
+    # Otra sesión pudo materializar lo mismo: si algo cambió, primero recargar (sólo lo cambiado)
+    rem = versiones_remotas(fresco=True)
+    if any(rem.get(t, {}).get("version", 0) != BASE_VER.get(t, 0)
+           for t in ["Config","Gastos","Traspasos","Ingresos","Recurrentes"]):
+        cache_tablas().quitar((SHEET_ID, "versiones"))
+        st.rerun()
+    occ = ocurrencias_recurrentes(recurrentes, marca, hasta)
+    existentes = ledger_unificado(gastos, traspasos, ingresos)["ts"]
+    occ = occ[~occ["ts"].isin(existentes)]
+
+    tablas = {"Gasto": gastos, "Traspaso": traspasos, "Ingreso": ingresos}
+    hojas  = {"Gasto": "Gastos", "Traspaso": "Traspasos", "Ingreso": "Ingresos"}
+    tocadas = [t for t in TIPOS_MOV if (occ["tipo"]==t).any()]
+    for t in tocadas:
+        tablas[t] = pd.concat([tablas[t], ledger_a_tabla(occ, t)], ignore_index=True)
+    s = get_saldos()
+    for cta, v in efecto_saldos(occ).items():
+        s[cta] = s.get(cta, 0.0) + float(v)
+    set_all_saldos(s)
+    recurrentes["hasta"] = hasta.date().isoformat()
+
+    fin = guardar({**{hojas[t]: tablas[t] for t in tocadas}, "Config": cfg, "Recurrentes": recurrentes})
+    gastos    = fin.get("Gastos", gastos)
+    traspasos = fin.get("Traspasos", traspasos)
+    ingresos  = fin.get("Ingresos", ingresos)
+    cfg, recurrentes = fin["Config"], fin["Recurrentes"]
+    return len(occ)
+
+n_rec = materializar_recurrentes()
+if n_rec:
+    st.toast(f"🔁 {n_rec} movimientos recurrentes registrados.")
+
+# ==========================
+#   TIPOS DE CAMBIO (tabla diaria local; saldos en MXN)
+# ==========================
+from divisas import (BASE as MONEDA_BASE, TASAS_DEFAULT, leer_tasas, normalizar_tasas, importar_tasas,
+                     monedas_disponibles, tasa_asof, a_moneda, simbolo)
+
+RUTA_TASAS = str(st.secrets.get("TASAS_PATH", TASAS_DEFAULT))
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def tasas_locales(ruta: str, mtime: float) -> pd.DataFrame:
+    """Tipos de cambio del disco; se vuelven a leer sólo si el archivo cambió."""
+    return leer_tasas(ruta)
+
+mtime_tasas = os.path.getmtime(RUTA_TASAS) if os.path.exists(RUTA_TASAS) else 0.0
+TASAS = tasas_locales(RUTA_TASAS, mtime_tasas)
+ver_tasas = f"{mtime_tasas}:{len(TASAS)}"
+
+def tasa_de(moneda, fecha) -> float:
+    """MXN por unidad de `moneda` vigente en `fecha` (1 para MXN; NaN si no hay tipo)."""
+    return float(tasa_asof([pd.Timestamp(fecha)], [moneda or MONEDA_BASE], TASAS)[0])
+
+def a_base(monto, moneda, fecha) -> float:
+    """Un monto capturado en `moneda` a MXN al tipo de `fecha` (NaN si no hay tipo)."""
+    return float(monto) * tasa_de(moneda, fecha)
+
+def moneda_de(v) -> str:
+    v = str(v or "").strip().upper()
+    return MONEDA_BASE if v in ("", "NAN", "NONE") else v
+
+def fijar_tasas(df: pd.DataFrame):
+    """Guarda en `tasa` el tipo de las filas en otra moneda que no lo traen (como `ensure_ts`).
+
+    Filas nuevas ya llevan la tasa con que se movió el saldo; las anteriores a la
+    columna o capturadas a mano en el Sheet quedan fijas con el tipo de su fecha
+    disponible hoy, para que importar tipos después no cambie lo que revierten.
+    """
+    if df is None or df.empty or "moneda" not in df.columns:
+        return df, False
+    ajena = df["moneda"].map(moneda_de) != MONEDA_BASE
+    tasa = pd.to_numeric(df["tasa"], errors="coerce") if "tasa" in df.columns else pd.Series(np.nan, index=df.index)
+    falta = ajena & ~(tasa > 0) & pd.to_datetime(df["fecha"], errors="coerce").notna()
+    if not falta.any():
+        return df, False
+    nueva = tasa_asof(pd.to_datetime(df.loc[falta, "fecha"], errors="coerce"), df.loc[falta, "moneda"].map(moneda_de), TASAS)
+    ok = np.isfinite(nueva)
+    if not ok.any():
+        return df, False
+    df = df.copy()
+    df["tasa"] = tasa.where(tasa > 0)
+    df.loc[falta[falta].index[ok], "tasa"] = nueva[ok]
+    return df, True
+
+gastos, g_fx    = fijar_tasas(gastos)
+traspasos, t_fx = fijar_tasas(traspasos)
+ingresos, i_fx  = fijar_tasas(ingresos)
+_sin_tasa = {t: df for t, df, ch in [("Gastos", gastos, g_fx), ("Traspasos", traspasos, t_fx),
+                                      ("Ingresos", ingresos, i_fx)] if ch}
+if _sin_tasa:
+    fin = guardar(_sin_tasa)
+    gastos, traspasos, ingresos = (fin.get(t, df) for t, df in
+                                   [("Gastos", gastos), ("Traspasos", traspasos), ("Ingresos", ingresos)])
+
+# Ledger tipado de esta corrida (ya con recurrentes materializados y en MXN) y su versión
+ledger = ledger_unificado(gastos, traspasos, ingresos, TASAS)
+ver_datos = "|".join([*(version_pestaña(t) for t in ("Gastos","Traspasos","Ingresos")), ver_tasas])
+
+# ==========================
+#   PRONÓSTICO DE FIN DE PERIODO (patrones diarios históricos)
+# ==========================
+def pronostico_periodo(flujos: pd.DataFrame, freq: str, hoy_, n_periodos: int = 12) -> pd.DataFrame:
+    """Proyecta el cierre de la semana ("W") o mes ("M") en curso por `grupo`.
+
+    `flujos` trae columnas fecha/grupo/valor. Para cada uno de los últimos
+    `n_periodos` periodos cerrados se suma lo ocurrido DESPUÉS del día equivalente
+    a hoy (mismo día de la semana o del mes); la media de esos restantes es lo
+    esperado y los percentiles 10/90 dan la banda. Todo con groupby/unstack.
+    """
+    cols = ["actual","esperado","proyectado","bajo","alto","periodos"]
+    hoy_ = pd.Timestamp(hoy_).normalize()
+    if freq=="W":
+        ini_actual = hoy_ - pd.Timedelta(days=hoy_.weekday())
+        ventana = pd.date_range(end=ini_actual - pd.Timedelta(days=7), periods=n_periodos, freq="7D")
+    else:
+        ini_actual = hoy_.replace(day=1)
+        ventana = pd.date_range(end=ini_actual - pd.DateOffset(months=1), periods=n_periodos, freq="MS")
+    primera = flujos["fecha"].min()
+    if pd.notna(primera):
+        ventana = ventana[ventana + (pd.Timedelta(days=6) if freq=="W" else pd.offsets.MonthEnd(0)) >= primera]
+
+    # Sólo lo que cae en la ventana o en el periodo en curso (barato sobre años de historial)
+    f = flujos[(flujos["fecha"] >= (ventana[0] if len(ventana) else ini_actual)) & (flujos["fecha"] <= hoy_)]
+    dias = f["fecha"].to_numpy("datetime64[D]")
+    if freq=="W":
+        pos = (dias.view("int64") - 4) % 7                    # 1970-01-01 fue jueves -> lunes=0
+        periodo = dias - pos.astype("timedelta64[D]")
+        pos_hoy = hoy_.weekday()
+    else:
+        periodo = dias.astype("datetime64[M]").astype("datetime64[D]")
+        pos = (dias - periodo).astype("int64") + 1
+        pos_hoy = hoy_.day
+    periodo = pd.DatetimeIndex(periodo)
+
+    en_curso = periodo==ini_actual
+    actual = f[en_curso].groupby("grupo")["valor"].sum()
+
+    en_hist = ~en_curso & (pos > pos_hoy)
+    hist = f[en_hist].assign(periodo=periodo[en_hist])
+    resto = (hist.groupby(["periodo","grupo"])["valor"].sum()
+                 .unstack(fill_value=0.0)
+                 .reindex(index=ventana, columns=flujos["grupo"].unique(), fill_value=0.0))
+    if resto.empty:
+        esperado = bajo = alto = pd.Series(0.0, index=resto.columns)
+    else:
+        esperado = resto.mean()
+        bajo, alto = resto.quantile(0.10), resto.quantile(0.90)
+
+    out = pd.DataFrame({"actual": actual, "esperado": esperado,
+                        "bajo": bajo, "alto": alto}).fillna(0.0)
+    out["bajo"] += out["actual"]; out["alto"] += out["actual"]
+    out["proyectado"] = out["actual"] + out["esperado"]
+    out["periodos"] = len(ventana)
+    return out[cols]
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def pronosticos(_led: pd.DataFrame, version: str, hoy_: date) -> dict:
+    """Pronósticos de la semana y el mes; en caché por versión de datos y día."""
+    corte = pd.Timestamp(hoy_).replace(day=1) - pd.DateOffset(months=12)   # ventana más larga
+    _led = _led[_led["fecha"] >= corte]
+    g = _led[_led["tipo"]=="Gasto"]
+    gasto = lambda col: pd.concat([
+        pd.DataFrame({"fecha": g["fecha"], "grupo": g[col], "valor": g["monto"]}),
+        pd.DataFrame({"fecha": g["fecha"], "grupo": "Total", "valor": g["monto"]}),
+    ], ignore_index=True)
+    neto = flujos_cuenta(_led).rename(columns={"cuenta":"grupo"})
+    return {
+        "sem_cuenta":    pronostico_periodo(gasto("cuenta"), "W", hoy_),
+        "sem_categoria": pronostico_periodo(gasto("categoria"), "W", hoy_),
+        "mes_cuenta":    pronostico_periodo(gasto("cuenta"), "M", hoy_),
+        "mes_categoria": pronostico_periodo(gasto("categoria"), "M", hoy_),
+        "mes_ahorro":    pronostico_periodo(neto, "M", hoy_),
+    }
+
+# ==========================
+#   MONITOR DE CAPACIDAD (una muestra al día en la pestaña "Monitor")
+# ==========================
+from monitor import LIMITE_CELDAS, CAMPOS_METADATOS, muestras, proyectar
+
+def presupuesto_latencia() -> dict:
+    def _ms(k, d):
+        try: return float(cfg_get(k, d))
+        except: return float(d)
+    return {"lectura_ms": _ms("presupuesto_lectura_ms", "2500"),
+            "escritura_ms": _ms("presupuesto_escritura_ms", "4000")}
+
+def muestrear_capacidad(forzar: bool = False):
+    """Guarda la muestra del día y el resumen/alertas en Config (3 llamadas, una vez al día).
+
+    Metadatos de la cuadrícula (sin valores) + historial del Monitor + una sola
+    escritura en lote de Monitor y Config. El resto de las corridas sólo leen
+    `monitor_alertas` de Config, que ya viene en la lectura normal.
+    """
+    hoy_ = date.today()
+    if not forzar and cfg_get("monitor_fecha") == hoy_.isoformat():
+        return
+    meta = sh.fetch_sheet_metadata(params={"includeGridData": "false", "fields": CAMPOS_METADATOS})
+    hist = leer_pestaña(HOJAS["Monitor"])
+    hist = hist if not hist.empty else pd.DataFrame(columns=MONITOR_COLS)
+    # Filas de datos sin descargar pestañas: lo ya leído en esta corrida (BASE), Versiones
+    # de su propia lectura y lo demás del conteo `filas` que cada escritura deja en Versiones
+    # (una pestaña que la app nunca escribió queda sin dato; la cuadrícula ya va en filas_grid)
+    filas = {t: len(VERSIONES) if t == "Versiones" else len(BASE[t]) if t in BASE
+             else VERSIONES.get(t, {}).get("filas", np.nan) for t in HOJAS}
+    nuevas = muestras(meta, hoy_, filas, {t: m for (sid, t), m in METRICAS.items() if sid == SHEET_ID})
+    hist = pd.concat([hist[hist["fecha"].astype(str) != hoy_.isoformat()], nuevas], ignore_index=True)
+    hist = hist[pd.to_datetime(hist["fecha"], errors="coerce") >= pd.Timestamp(hoy_) - pd.Timedelta(days=400)]
+
+    res, total, alertas = proyectar(hist, hoy_, presupuesto_latencia())
+    cfg_set("monitor_fecha", hoy_.isoformat())
+    cfg_set("monitor_alertas", " | ".join(alertas))
+    cfg_set("monitor_resumen", json.dumps({
+        "total": total,
+        "pestañas": res.reset_index().replace([np.inf, -np.inf], None).to_dict("records"),
+    }, default=float))
+    guardar({"Monitor": hist.reindex(columns=MONITOR_COLS), "Config": cfg})
+
+# Si Sheets falla (cuota, permisos) se avisa y no se reintenta en cada rerun: se anota el
+# intento por libro y día en la sesión. Cualquier otro error es un bug y debe verse.
+_intento_monitor = (SHEET_ID, date.today().isoformat())
+if st.session_state.get("monitor_fallo") != _intento_monitor:
+    try:
+        muestrear_capacidad()
+    except APIError as e:
+        st.session_state.monitor_fallo = _intento_monitor
+        st.toast(f"📏 No se pudo guardar la muestra de capacidad de hoy: {e}")
+
 # ==========================
 #   UI: Refrescar
 # ==========================
-c1, _ = st.columns([1,8])
+c1, c2, _ = st.columns([1,1.4,6.6])
 with c1:
     if st.button("🔄 Actualizar"):
-        st.cache_resource.clear(); st.cache_data.clear(); st.rerun()
+        # Sólo el libro activo: los cálculos en st.cache_data van llaveados por versión de
+        # datos (hash del ledger) o mtime, así que al releer se recalculan sin vaciar los de otros
+        open_sheet.clear(); hojas_libro.clear(); limpiar_cache(); st.rerun()
+with c2:
+    MONEDA = st.selectbox("💱 Moneda", monedas_disponibles(TASAS), key="moneda_reporte",
+                          label_visibility="collapsed", help="Moneda en la que se muestran saldos y reportes.")
+
+# Vista en la moneda de reporte: el ledger se re-expresa al tipo de la fecha de cada
+# movimiento (un searchsorted por moneda, milisegundos) y los saldos al tipo de hoy.
+fx_hoy = float(tasa_asof([pd.Timestamp(date.today())], MONEDA, TASAS)[0])   # MXN por unidad
+if not np.isfinite(fx_hoy):
+    st.warning(f"💱 No hay tipos de cambio de {MONEDA}; se muestra en {MONEDA_BASE}.")
+    MONEDA, fx_hoy = MONEDA_BASE, 1.0
+SIMB = simbolo(MONEDA)
+ledger_vista = a_moneda(ledger, MONEDA, TASAS)
+ver_vista = ver_datos if MONEDA == MONEDA_BASE else f"{ver_datos}|{MONEDA}|{ver_tasas}"
+_sin_fx = sin_tasa(ledger)
+if not _sin_fx.empty:
+    st.warning(f"💱 {len(_sin_fx):,} movimientos en {', '.join(sorted(_sin_fx['moneda'].unique()))} sin tipo de "
+               "cambio: no cuentan en reportes ni gráficas y no se pueden borrar ni editar hasta importar su tipo.")
+
+for _a in filter(None, str(cfg_get("monitor_alertas", "") or "").split(" | ")):
+    st.warning(f"📏 {_a}")
 
 # ==========================
 #   TARJETAS DE SALDO (Apartados/GBM con tap-to-reveal)
 # ==========================
 saldos = get_saldos()
 
+# ---- Ciclos de estado de cuenta (agregados por ciclo vivos en la sesión; ver tarjetas.py)
+from tarjetas import CiclosTarjeta, clave_config, leer_config, resumen as resumen_ciclo
+
+def version_tarjetas() -> tuple:
+    """Lo que determina los ciclos: las tres pestañas de movimientos y los tipos de cambio."""
+    return (BASE_VER.get("Gastos", 0), BASE_VER.get("Traspasos", 0), BASE_VER.get("Ingresos", 0), ver_tasas)
+
+def ciclos_tarjeta(nombre: str) -> CiclosTarjeta:
+    """Motor de ciclos de `nombre`; se reagrupa sólo si algo cambió sin pasar por `tarjetas_tras_escribir`."""
+    conf = leer_config(cfg_get(clave_config(nombre)))
+    motores = st.session_state.setdefault("ciclos_tarjeta", {})
+    c = motores.get((SHEET_ID, nombre))
+    if c is None or c.config != conf or c.vers != version_tarjetas():
+        c = motores[(SHEET_ID, nombre)] = CiclosTarjeta(nombre, conf).reconstruir(ledger)
+        c.vers = version_tarjetas()
+    return c
+
+def tarjetas_tras_escribir(antes: tuple, movs: pd.DataFrame, signo: int):
+    """Suma (`signo`=1) o resta (-1) los movimientos `movs` (formato ledger) a los ciclos vivos.
+
+    Como con los sobres: sólo si la escritura fue la nuestra (una pestaña +1 y
+    nada más cambió); si no, los motores quedan desfasados y se reagrupan al usarse.
+    """
+    ahora = version_tarjetas()
+    dif = [b - a for a, b in zip(antes[:3], ahora[:3])]
+    propia = sorted(dif) == [0, 0, 1] and ahora[3:] == antes[3:]
+    for (sid, _), c in st.session_state.get("ciclos_tarjeta", {}).items():
+        if sid == SHEET_ID and c.vers == antes and propia:
+            c.aplicar(movs, signo)
+            c.vers = ahora
+
 def initials_from(name: str):
     parts = name.replace("BBVA","").strip().split()
     if not parts: return name[:2].upper()
@@ -380,14 +921,24 @@ def initials_from(name: str):
 def is_credit_account(nombre:str)->bool: return nombre=="BBVA Credito"
 
 def card_cuenta_pro(nombre: str, theme: str, sensitive: bool=False):
-    val = saldos.get(nombre, 0.0)
+    val = saldos.get(nombre, 0.0) / fx_hoy
+    helper = "Saldo actualizado desde Google Sheets"
     if is_credit_account(nombre):
-        if val < 0:   titulo = f"Debe: ${abs(val):,.2f}"
-        elif val > 0: titulo = f"A favor: ${val:,.2f}"
-        else:         titulo = "Liquidada: $0.00"
+        if val < 0:   titulo = f"Debe: {SIMB}{abs(val):,.2f}"
+        elif val > 0: titulo = f"A favor: {SIMB}{val:,.2f}"
+        else:         titulo = f"Liquidada: {SIMB}0.00"
         badge_txt = "CRÉDITO"
+        r = resumen_ciclo(ciclos_tarjeta(nombre).estado(saldos.get(nombre, 0.0), date.today()), date.today())
+        if r:
+            cur, cer = r["en_curso"], r["cerrado"]
+            helper = f"Ciclo al {cur['corte']:%d %b}: {SIMB}{cur['cargos']/fx_hoy:,.2f} en cargos"
+            if cer is not None and cer["pendiente"] > 0:
+                helper += (f"<br>{'⚠️ Vencido' if r['vencido'] else 'Pagar antes del ' + format(cer['limite_pago'], '%d %b')}: "
+                           f"{SIMB}{cer['pendiente']/fx_hoy:,.2f} (mín. {SIMB}{cer['minimo_pendiente']/fx_hoy:,.2f})")
+            elif cer is not None:
+                helper += f"<br>Corte del {cer['corte']:%d %b} pagado ✅"
     else:
-        titulo = f"${val:,.2f}"
+        titulo = f"{SIMB}{val:,.2f}"
         badge_txt = "CUENTA"
 
     initials = initials_from(nombre)
@@ -411,7 +962,7 @@ def card_cuenta_pro(nombre: str, theme: str, sensitive: bool=False):
         <h4>{nombre}</h4>
       </div>
       <div class="amount">{amount_html}</div>
-      <div class="helper">Saldo actualizado desde Google Sheets</div>
+      <div class="helper">{helper}</div>
     </div>
     """, unsafe_allow_html=True)
 
@@ -424,6 +975,30 @@ with c3: card_cuenta_pro("Apartados",         "purple",sensitive=True)
 with c4: card_cuenta_pro("GBM",               "dark",  sensitive=True)
 st.markdown('</div>', unsafe_allow_html=True)
 
+with st.expander("💳 Estados de cuenta de BBVA Credito"):
+    cta_tc = "BBVA Credito"
+    motor_tc = ciclos_tarjeta(cta_tc)
+    conf_tc = motor_tc.config
+    with st.form("form_ciclo_tc"):
+        a,b,c,d = st.columns(4)
+        with a: corte_tc = st.number_input("Día de corte", 1, 31, int(conf_tc["corte"]))
+        with b: dias_tc = st.number_input("Días para pagar", 0, 60, int(conf_tc["dias_pago"]))
+        with c: pct_tc = st.number_input("Mínimo (% del saldo)", 0.0, 100.0, float(conf_tc["minimo_pct"])*100, step=0.5)
+        with d: fijo_tc = st.number_input("Mínimo fijo (MXN)", 0.0, value=float(conf_tc["minimo_fijo"]), step=50.0)
+        if st.form_submit_button("Guardar configuración"):
+            cfg_set(clave_config(cta_tc), json.dumps({"corte": int(corte_tc), "dias_pago": int(dias_tc),
+                                                      "minimo_pct": pct_tc/100, "minimo_fijo": fijo_tc}))
+            guardar({"Config": cfg})
+            st.success("✅ Configuración guardada."); st.rerun()
+    est_tc = motor_tc.estado(saldos.get(cta_tc, 0.0), date.today())
+    vista_tc = est_tc.iloc[::-1].head(12)
+    vista_tc = vista_tc.assign(**{c: vista_tc[c].dt.date for c in ["inicio","corte","limite_pago"]},
+                               **{c: vista_tc[c] / fx_hoy for c in vista_tc.columns[3:]})
+    st.dataframe(vista_tc.style.format({c: f"{SIMB}{{:,.2f}}" for c in vista_tc.columns[3:]}),
+                 use_container_width=True, hide_index=True)
+    st.caption("Cargos = gastos y traspasos desde la tarjeta; pagos = traspasos e ingresos a ella. "
+               "Saldo al corte negativo = deuda; `pagado` cuenta sólo lo abonado antes de la fecha límite.")
+
 st.divider()
 
 # ==========================
@@ -435,16 +1010,17 @@ except: objetivo = 1500.0
 try: objetivo_mes = float(cfg_get("objetivo_ahorro_mes","8500"))
 except: objetivo_mes = 8500.0
 
+# Los objetivos se guardan en MXN; se muestran en la moneda de reporte al tipo de hoy
+objetivo, objetivo_mes = objetivo / fx_hoy, objetivo_mes / fx_hoy
+
 # ---- Semana actual
 hoy = date.today()
 inicio_sem = hoy - timedelta(days=hoy.weekday())
 fin_sem = inicio_sem + timedelta(days=6)
 
-g_sem = gastos.copy()
-if not g_sem.empty:
-    g_sem["fecha"] = pd.to_datetime(g_sem["fecha"], errors="coerce").dt.date
-    g_sem = g_sem[(g_sem["fecha"]>=inicio_sem) & (g_sem["fecha"]<=fin_sem)]
-total_sem = float(g_sem["monto"].sum()) if not g_sem.empty else 0.0
+en_rango = lambda a, b: ledger_vista["fecha"].between(pd.Timestamp(a), pd.Timestamp(b)).to_numpy()
+total_sem = float(ledger_vista.loc[en_rango(inicio_sem, fin_sem) & (ledger_vista["tipo"]=="Gasto").to_numpy(),
+                                   "monto"].sum())
 restante_sem = max(0.0, objetivo-total_sem)
 pct_sem = 0.0 if objetivo<=0 else max(0.0, min(1.0, total_sem/objetivo))
 angulo_sem = int(360*pct_sem)
@@ -454,41 +1030,31 @@ inicio_mes = date(hoy.year, hoy.month, 1)
 fin_mes = hoy
 
 def _delta_mes_apartados():
-    total = 0.0
-    # Gastos desde Apartados (negativo)
-    if not gastos.empty:
-        g = gastos.copy()
-        g["fecha"] = pd.to_datetime(g["fecha"], errors="coerce").dt.date
-        g = g[(g["fecha"]>=inicio_mes) & (g["fecha"]<=fin_mes) & (g["cuenta"]=="Apartados")]
-        total += -float(g["monto"].sum()) if not g.empty else 0.0
-    # Traspasos enviados desde Apartados (negativo)
-    if not traspasos.empty:
-        te = traspasos.copy()
-        te["fecha"] = pd.to_datetime(te["fecha"], errors="coerce").dt.date
-        te = te[(te["fecha"]>=inicio_mes) & (te["fecha"]<=fin_mes) & (te["cuenta_emisora"]=="Apartados")]
-        total += -float(te["monto"].sum()) if not te.empty else 0.0
-        # Traspasos recibidos en Apartados (positivo)
-        tr = traspasos.copy()
-        tr["fecha"] = pd.to_datetime(tr["fecha"], errors="coerce").dt.date
-        tr = tr[(tr["fecha"]>=inicio_mes) & (tr["fecha"]<=fin_mes) & (tr["cuenta_receptora"]=="Apartados")]
-        total += +float(tr["monto"].sum()) if not tr.empty else 0.0
-    # Ingresos a Apartados (positivo)
-    if not ingresos.empty:
-        inc = ingresos.copy()
-        inc["fecha"] = pd.to_datetime(inc["fecha"], errors="coerce").dt.date
-        inc = inc[(inc["fecha"]>=inicio_mes) & (inc["fecha"]<=fin_mes) & (inc["cuenta"]=="Apartados")]
-        total += +float(inc["monto"].sum()) if not inc.empty else 0.0
-    return total
+    """Entradas − salidas de Apartados en el mes (gastos, traspasos e ingresos), en una pasada."""
+    x = ledger_vista[en_rango(inicio_mes, fin_mes)]
+    if x.empty:
+        return 0.0
+    fl = flujos_cuenta(x)
+    return float(fl.loc[fl["cuenta"]=="Apartados", "valor"].sum())
 
 avance_mes = _delta_mes_apartados()  # puede ser negativo
 faltante_mes_raw = objetivo_mes - avance_mes
 if faltante_mes_raw >= 0:
-    faltante_mes_txt = f"Faltante: ${faltante_mes_raw:,.2f}"
+    faltante_mes_txt = f"Faltante: {SIMB}{faltante_mes_raw:,.2f}"
 else:
-    faltante_mes_txt = f"Excedente: ${abs(faltante_mes_raw):,.2f}"
+    faltante_mes_txt = f"Excedente: {SIMB}{abs(faltante_mes_raw):,.2f}"
 pct_mes = 0.0 if objetivo_mes<=0 else max(0.0, min(1.0, avance_mes/objetivo_mes))
 angulo_mes = int(360*pct_mes)
 
+# ---- Pronóstico de cierre (en caché por versión de datos)
+pron = pronosticos(ledger_vista, ver_vista, hoy)
+
+def _txt_pron(tabla, grupo, etiqueta):
+    if grupo not in tabla.index or tabla.at[grupo, "periodos"] == 0:
+        return f"{etiqueta}: sin historial suficiente"
+    r = tabla.loc[grupo]
+    return f"{etiqueta}: {SIMB}{r['proyectado']:,.2f} (rango {SIMB}{r['bajo']:,.2f} – {SIMB}{r['alto']:,.2f})"
+
 # ---- UI lado a lado
 colL, colR = st.columns(2, gap="large")
 
@@ -502,9 +1068,10 @@ with colL:
         </div>
         """, unsafe_allow_html=True)
     with lb:
-        st.subheader(f"${total_sem:,.2f} / ${objetivo:,.2f}")
+        st.subheader(f"{SIMB}{total_sem:,.2f} / {SIMB}{objetivo:,.2f}")
         st.caption(f"Semana: {inicio_sem.strftime('%d %b')} – {fin_sem.strftime('%d %b')}")
-        st.caption(f"Restante: ${restante_sem:,.2f}")
+        st.caption(f"Restante: {SIMB}{restante_sem:,.2f}")
+        st.caption(_txt_pron(pron["sem_cuenta"], "Total", "Cierre estimado"))
 
 with colR:
     st.markdown('<div class="section-title">💾 Objetivo de ahorro mensual (Apartados)</div>', unsafe_allow_html=True)
@@ -516,9 +1083,116 @@ with colR:
         </div>
         """, unsafe_allow_html=True)
     with rb:
-        st.subheader(f"${avance_mes:,.2f} / ${objetivo_mes:,.2f}")
+        st.subheader(f"{SIMB}{avance_mes:,.2f} / {SIMB}{objetivo_mes:,.2f}")
         st.caption(f"Mes: {inicio_mes.strftime('%d %b')} – {fin_mes.strftime('%d %b')}")
         st.caption(f"{faltante_mes_txt}")
+        st.caption(_txt_pron(pron["mes_ahorro"], "Apartados", "Cierre estimado"))
+
+# ---- Sobres por categoría (estado en la sesión: O(1) por gasto registrado/borrado)
+from sobres import Sobres, PERIODOS, ARRASTRES
+
+def version_sobres() -> tuple:
+    """Lo que determina los sobres: gastos, definiciones y tipos de cambio."""
+    return (BASE_VER.get("Gastos", 0), BASE_VER.get("Presupuestos", 0), ver_tasas)
+
+def sobres_al_dia() -> Sobres:
+    """Sobres de esta sesión; se reconstruyen sólo si algo cambió sin pasar por `sobres_tras_escribir`."""
+    sob = st.session_state.setdefault("sobres", {}).get(SHEET_ID)
+    if sob is None or sob.vers != version_sobres():
+        sob = Sobres(presupuestos).reconstruir(ledger)
+        sob.vers = version_sobres()
+        st.session_state.sobres[SHEET_ID] = sob
+    return sob
+
+def sobres_tras_escribir(antes: tuple, movs):
+    """Aplica `movs` = [(fecha, categoria, cuenta, monto MXN, ±1)] a los sobres sin recalcular.
+
+    Sólo si la escritura de Gastos fue la nuestra (versión +1 y nada más cambió);
+    si otro dispositivo escribió en medio, se deja desfasado y el siguiente rerun reconstruye.
+    """
+    sob = st.session_state.get("sobres", {}).get(SHEET_ID)
+    ahora = version_sobres()
+    if sob is None or sob.vers != antes or ahora[0] != antes[0] + 1 or ahora[1:] != antes[1:]:
+        return
+    for m in movs:
+        sob.aplicar(*m)
+    sob.vers = ahora
+
+SOBRES = sobres_al_dia()
+est_sobres = SOBRES.estado(hoy)
+if not est_sobres.empty:
+    st.markdown('<div class="section-title">✉️ Sobres</div>', unsafe_allow_html=True)
+    cols_sob = st.columns(min(len(est_sobres), 4), gap="large")
+    for i, r in enumerate(est_sobres.itertuples(index=False)):
+        with cols_sob[i % len(cols_sob)]:
+            rest = r.restante / fx_hoy
+            st.progress(float(min(max(r.uso, 0.0), 1.0)),
+                        text=f"**{r.categoria}** · {r.periodo.lower()}{'' if r.cuenta == 'Todas' else ' · ' + r.cuenta}")
+            st.caption(f"{'Restante' if rest >= 0 else 'Excedido'}: {SIMB}{abs(rest):,.2f} de "
+                       f"{SIMB}{(r.asignado + r.arrastre)/fx_hoy:,.2f}"
+                       + (f" (arrastre {SIMB}{r.arrastre/fx_hoy:,.2f})" if r.arrastre else ""))
+
+with st.expander("✉️ Administrar sobres"):
+    with st.form("form_sobre", clear_on_submit=True):
+        a,b,c = st.columns(3)
+        with a: cat_s = st.selectbox("Categoría", CATEGORIAS["Gasto"])
+        with b: cta_s = st.selectbox("Cuenta", ["Todas"] + cuentas())
+        with c: per_s = st.selectbox("Periodo", list(PERIODOS))
+        d,e,f = st.columns(3)
+        with d: monto_s = st.number_input("Monto por periodo (MXN)", min_value=0.0, step=100.0)
+        with e: arr_s = st.selectbox("Arrastre", ARRASTRES, help="Sobrante: lo no gastado pasa al siguiente periodo. "
+                                                               "Todo: también el exceso (queda negativo).")
+        with f: ini_s = st.date_input("Desde", value=hoy)
+        if st.form_submit_button("Agregar sobre"):
+            if monto_s <= 0:
+                st.error("El monto debe ser mayor a 0.")
+            else:
+                presupuestos = pd.concat([presupuestos, pd.DataFrame([{
+                    "id": f"p{int(time.time()*1000)}", "categoria": cat_s, "cuenta": "" if cta_s == "Todas" else cta_s,
+                    "periodo": per_s, "monto": float(monto_s), "arrastre": arr_s, "inicio": ini_s.isoformat()}])],
+                    ignore_index=True)
+                guardar({"Presupuestos": presupuestos})
+                st.success("✅ Sobre agregado."); st.rerun()
+    if not est_sobres.empty:
+        vis_s = est_sobres.drop(columns=["id","uso"])
+        vis_s = vis_s.assign(desde=vis_s["desde"].dt.date, hasta=vis_s["hasta"].dt.date,
+                             **{c: vis_s[c] / fx_hoy for c in ["asignado","arrastre","gastado","restante"]})
+        st.dataframe(vis_s.style.format({c: f"{SIMB}{{:,.2f}}" for c in ["asignado","arrastre","gastado","restante"]}),
+                     use_container_width=True, hide_index=True)
+        etq_s = {r.id: f"{r.categoria} · {r.periodo} · {r.cuenta}" for r in est_sobres.itertuples(index=False)}
+        x1, x2, x3 = st.columns([3,1,1])
+        with x1: sobre_del = st.selectbox("Sobre", list(etq_s), format_func=etq_s.get, label_visibility="collapsed")
+        with x2:
+            if st.button("🗑️ Eliminar sobre"):
+                presupuestos = presupuestos[presupuestos["id"] != sobre_del].reset_index(drop=True)
+                guardar({"Presupuestos": presupuestos}); st.rerun()
+        with x3:
+            if st.button("🔎 Verificar"):
+                dif = SOBRES.diferencias(ledger)
+                if dif.empty: st.success("Cuadra con el recálculo completo.")
+                else:
+                    st.warning(f"{len(dif)} periodos no cuadran; se reconstruye.")
+                    st.session_state.sobres.pop(SHEET_ID, None)
+                    st.dataframe(dif, use_container_width=True, hide_index=True)
+
+with st.expander("📈 Pronóstico de cierre por cuenta y categoría"):
+    st.caption("Lo registrado a hoy + lo que históricamente ocurre en el resto del periodo "
+               "(últimas 12 semanas / 12 meses). Rango = percentiles 10–90.")
+    cols_pron = ["actual","proyectado","bajo","alto"]
+    fmt_pron = {c: f"{SIMB}{{:,.2f}}" for c in cols_pron}
+    ps, pm = st.tabs(["Semana","Mes"])
+    with ps:
+        st.write("**Gasto por categoría**")
+        st.dataframe(pron["sem_categoria"][cols_pron].style.format(fmt_pron), use_container_width=True)
+        st.write("**Gasto por cuenta**")
+        st.dataframe(pron["sem_cuenta"][cols_pron].style.format(fmt_pron), use_container_width=True)
+    with pm:
+        st.write("**Gasto por categoría**")
+        st.dataframe(pron["mes_categoria"][cols_pron].style.format(fmt_pron), use_container_width=True)
+        st.write("**Gasto por cuenta**")
+        st.dataframe(pron["mes_cuenta"][cols_pron].style.format(fmt_pron), use_container_width=True)
+        st.write("**Ahorro neto por cuenta** (entradas − salidas)")
+        st.dataframe(pron["mes_ahorro"][cols_pron].style.format(fmt_pron), use_container_width=True)
 
 st.divider()
 
@@ -526,45 +1200,55 @@ st.divider()
 #   NUEVO MOVIMIENTO
 # ==========================
 st.markdown('<div class="section-title">➕ Nuevo movimiento</div>', unsafe_allow_html=True)
-tg, tt, ti = st.tabs(["Gasto","Traspaso","Ingresos"])
+tg, tt, ti, tr_ = st.tabs(["Gasto","Traspaso","Ingresos","Recurrentes"])
 
 def now_ts(): return int(time.time()*1000)
 
-def registrar_gasto(fecha, cuenta, monto, categoria, nota):
+def registrar_gasto(fecha, cuenta, monto, categoria, nota, moneda=MONEDA_BASE):
     global gastos, cfg
     row = pd.DataFrame([{
         "ts": now_ts(), "fecha": fecha, "cuenta": cuenta,
-        "monto": float(monto), "categoria": categoria, "nota": nota
+        "monto": float(monto), "categoria": categoria, "nota": nota, "moneda": moneda,
+        "tasa": tasa_de(moneda, fecha),     # la misma con que se mueve el saldo; borrar/editar la reusa
     }])
     gastos = pd.concat([gastos, row], ignore_index=True)
-    s = get_saldos(); s[cuenta] = s.get(cuenta,0.0) - float(monto); set_all_saldos(s)
-    write_df_safe(wsG, gastos); write_df_safe(wsCfg, cfg)
-    st.cache_data.clear()
-
-def registrar_traspaso(fecha, emisora, receptora, monto, comentario):
+    mxn = float(monto) * row["tasa"].iloc[0]
+    s = get_saldos(); s[cuenta] = s.get(cuenta,0.0) - mxn; set_all_saldos(s)
+    antes, antes_tc = version_sobres(), version_tarjetas()
+    guardar({"Gastos": gastos, "Config": cfg})
+    sobres_tras_escribir(antes, [(fecha, categoria, cuenta, mxn, 1)])
+    tarjetas_tras_escribir(antes_tc, ledger_unificado(row, None, None), 1)
+
+def registrar_traspaso(fecha, emisora, receptora, monto, comentario, moneda=MONEDA_BASE):
     global traspasos, cfg
     row = pd.DataFrame([{
         "ts": now_ts(), "fecha": fecha, "cuenta_emisora": emisora,
-        "cuenta_receptora": receptora, "monto": float(monto), "comentario": comentario
+        "cuenta_receptora": receptora, "monto": float(monto), "comentario": comentario, "moneda": moneda,
+        "tasa": tasa_de(moneda, fecha),
     }])
     traspasos = pd.concat([traspasos, row], ignore_index=True)
+    mxn = float(monto) * row["tasa"].iloc[0]
     s = get_saldos()
-    s[emisora]   = s.get(emisora,0.0) - float(monto)
-    s[receptora] = s.get(receptora,0.0) + float(monto)
+    s[emisora]   = s.get(emisora,0.0) - mxn
+    s[receptora] = s.get(receptora,0.0) + mxn
     set_all_saldos(s)
-    write_df_safe(wsT, traspasos); write_df_safe(wsCfg, cfg)
-    st.cache_data.clear()
+    antes_tc = version_tarjetas()
+    guardar({"Traspasos": traspasos, "Config": cfg})
+    tarjetas_tras_escribir(antes_tc, ledger_unificado(None, row, None), 1)
 
-def registrar_ingreso(fecha, cuenta, monto, categoria, nota):
+def registrar_ingreso(fecha, cuenta, monto, categoria, nota, moneda=MONEDA_BASE):
     global ingresos, cfg
     row = pd.DataFrame([{
         "ts": now_ts(), "fecha": fecha, "cuenta": cuenta,
-        "monto": float(monto), "categoria": categoria, "nota": nota
+        "monto": float(monto), "categoria": categoria, "nota": nota, "moneda": moneda,
+        "tasa": tasa_de(moneda, fecha),
     }])
     ingresos = pd.concat([ingresos, row], ignore_index=True)
-    s = get_saldos(); s[cuenta] = s.get(cuenta,0.0) + float(monto); set_all_saldos(s)
-    write_df_safe(wsI, ingresos); write_df_safe(wsCfg, cfg)
-    st.cache_data.clear()
+    mxn = float(monto) * row["tasa"].iloc[0]
+    s = get_saldos(); s[cuenta] = s.get(cuenta,0.0) + mxn; set_all_saldos(s)
+    antes_tc = version_tarjetas()
+    guardar({"Ingresos": ingresos, "Config": cfg})
+    tarjetas_tras_escribir(antes_tc, ledger_unificado(None, None, row), 1)
 
 with tg:
     with st.form("form_gasto", clear_on_submit=True):
@@ -572,12 +1256,16 @@ with tg:
         with a: fecha_g = st.date_input("Fecha", value=date.today())
         with b: cuenta_g = st.selectbox("Cuenta", cuentas())
         with c: monto_g = st.number_input("Monto", min_value=0.0, step=50.0)
-        categoria_g = st.selectbox("Categoría", ["Comida","Gasolina","Ocio","Servicios","Otro"])
+        d,e = st.columns([2,1])
+        with d: categoria_g = st.selectbox("Categoría", CATEGORIAS["Gasto"])
+        with e: moneda_g = st.selectbox("Moneda", monedas_disponibles(TASAS), key="moneda_g")
         nota_g = st.text_input("Nota","")
         if st.form_submit_button("Registrar gasto"):
             if monto_g <= 0: st.error("El monto debe ser mayor a 0.")
+            elif not np.isfinite(a_base(monto_g, moneda_g, fecha_g)):
+                st.error(f"No hay tipo de cambio de {moneda_g} al {fecha_g:%d/%m/%Y}; impórtalo en 💱 Tipos de cambio.")
             else:
-                registrar_gasto(fecha_g, cuenta_g, monto_g, categoria_g, nota_g)
+                registrar_gasto(fecha_g, cuenta_g, monto_g, categoria_g, nota_g, moneda_g)
                 st.success("✅ Gasto registrado."); st.rerun()
 
 with tt:
@@ -586,18 +1274,23 @@ with tt:
         with a: fecha_t = st.date_input("Fecha", value=date.today())
         with b: emisora  = st.selectbox("Cuenta emisora", cuentas())
         with c: receptora= st.selectbox("Cuenta receptora", cuentas(), index=1)
-        monto_t = st.number_input("Monto", min_value=0.0, step=50.0)
-        comentario_t = st.selectbox("Comentario", ["Inversión","Ahorro","Agregar fondos","Otro"])
+        d,e,f = st.columns([2,2,1])
+        with d: monto_t = st.number_input("Monto", min_value=0.0, step=50.0)
+        with e: comentario_t = st.selectbox("Comentario", CATEGORIAS["Traspaso"])
+        with f: moneda_t = st.selectbox("Moneda", monedas_disponibles(TASAS), key="moneda_t")
         saldo_emisora = get_saldos().get(emisora, 0.0)
         if st.form_submit_button("Registrar traspaso"):
+            monto_t_mxn = a_base(monto_t, moneda_t, fecha_t)
             if monto_t <= 0:
                 st.error("El monto debe ser mayor a 0.")
             elif emisora == receptora:
                 st.error("La emisora y receptora deben ser distintas.")
-            elif monto_t > saldo_emisora:
+            elif not np.isfinite(monto_t_mxn):
+                st.error(f"No hay tipo de cambio de {moneda_t} al {fecha_t:%d/%m/%Y}; impórtalo en 💱 Tipos de cambio.")
+            elif monto_t_mxn > saldo_emisora:
                 st.error("No hay fondos suficientes en la cuenta para completar el traspaso.")
             else:
-                registrar_traspaso(fecha_t, emisora, receptora, monto_t, comentario_t)
+                registrar_traspaso(fecha_t, emisora, receptora, monto_t, comentario_t, moneda_t)
                 st.success("✅ Traspaso registrado."); st.rerun()
 
 with ti:
@@ -606,15 +1299,77 @@ with ti:
         with a: fecha_i = st.date_input("Fecha", value=date.today())
         with b: cuenta_i = st.selectbox("Cuenta destino", cuentas())
         with c: monto_i  = st.number_input("Monto", min_value=0.0, step=100.0)
-        categoria_i = st.selectbox("Categoría", ["Semana","Nómina","Intereses","Dividendos","Otro"])
+        d,e = st.columns([2,1])
+        with d: categoria_i = st.selectbox("Categoría", CATEGORIAS["Ingreso"])
+        with e: moneda_i = st.selectbox("Moneda", monedas_disponibles(TASAS), key="moneda_i")
         nota_i = st.text_input("Nota","")
         if st.form_submit_button("Registrar ingreso"):
             if monto_i <= 0:
                 st.error("El monto debe ser mayor a 0.")
+            elif not np.isfinite(a_base(monto_i, moneda_i, fecha_i)):
+                st.error(f"No hay tipo de cambio de {moneda_i} al {fecha_i:%d/%m/%Y}; impórtalo en 💱 Tipos de cambio.")
             else:
-                registrar_ingreso(fecha_i, cuenta_i, monto_i, categoria_i, nota_i)
+                registrar_ingreso(fecha_i, cuenta_i, monto_i, categoria_i, nota_i, moneda_i)
                 st.success("✅ Ingreso registrado."); st.rerun()
 
+def guardar_regla(tipo, frecuencia, monto, cuenta, receptora, categoria, nota, inicio, fin):
+    global recurrentes
+    row = pd.DataFrame([{
+        "id": f"r{now_ts()}", "tipo": tipo, "frecuencia": frecuencia, "monto": float(monto),
+        "cuenta": cuenta, "cuenta_receptora": receptora if tipo=="Traspaso" else "",
+        "categoria": categoria, "nota": nota, "inicio": inicio, "fin": fin or "", "hasta": "",
+    }])
+    recurrentes = pd.concat([recurrentes, row], ignore_index=True)
+    guardar({"Recurrentes": recurrentes})
+
+def eliminar_regla(regla_id):
+    """Borra la regla; los movimientos ya materializados se conservan."""
+    global recurrentes
+    recurrentes = recurrentes[recurrentes["id"]!=regla_id].reset_index(drop=True)
+    guardar({"Recurrentes": recurrentes})
+
+with tr_:
+    tipo_r = st.selectbox("Tipo", TIPOS_MOV, key="rec_tipo")
+    with st.form("form_recurrente", clear_on_submit=True):
+        a,b,c = st.columns(3)
+        with a: frec_r  = st.selectbox("Frecuencia", list(FRECUENCIAS), index=3)
+        with b: cuenta_r = st.selectbox("Cuenta emisora" if tipo_r=="Traspaso" else "Cuenta", cuentas())
+        with c: monto_r = st.number_input("Monto", min_value=0.0, step=50.0)
+        d,e,f = st.columns(3)
+        with d: inicio_r = st.date_input("Primera ocurrencia", value=date.today(),
+                                         help="Si es una fecha pasada se registran también las ocurrencias atrasadas.")
+        with e: fin_r = st.date_input("Termina (opcional)", value=None)
+        with f: receptora_r = st.selectbox("Cuenta receptora", cuentas(), index=2, disabled=tipo_r!="Traspaso")
+        categoria_r = st.selectbox("Comentario" if tipo_r=="Traspaso" else "Categoría", CATEGORIAS[tipo_r])
+        nota_r = st.text_input("Nota","", disabled=tipo_r=="Traspaso")
+        if st.form_submit_button("Guardar regla"):
+            if monto_r <= 0:
+                st.error("El monto debe ser mayor a 0.")
+            elif tipo_r=="Traspaso" and cuenta_r==receptora_r:
+                st.error("La emisora y receptora deben ser distintas.")
+            elif fin_r and fin_r < inicio_r:
+                st.error("La fecha de término es anterior a la primera ocurrencia.")
+            else:
+                guardar_regla(tipo_r, frec_r, monto_r, cuenta_r, receptora_r, categoria_r, nota_r, inicio_r, fin_r)
+                st.success("✅ Regla guardada."); st.rerun()
+
+    if not recurrentes.empty:
+        st.caption("Reglas activas")
+        st.dataframe(recurrentes[["tipo","frecuencia","monto","cuenta","cuenta_receptora","categoria","nota","inicio","fin","hasta"]],
+                     use_container_width=True, hide_index=True)
+        prox = proyectar_recurrentes(date.today() + timedelta(days=1), date.today() + timedelta(days=30))
+        if not prox.empty:
+            st.caption(f"Próximos 30 días: {len(prox)} movimientos")
+            st.dataframe(prox[["fecha","tipo","cuenta","categoria","monto"]].sort_values("fecha"),
+                         use_container_width=True, hide_index=True)
+        etiquetas = {r["id"]: f'{r["tipo"]} · {r["frecuencia"]} · {r["categoria"]} · ${float(r["monto"]):,.2f}'
+                     for _, r in recurrentes.iterrows()}
+        x1, x2 = st.columns([3,1])
+        with x1: regla_del = st.selectbox("Regla", list(etiquetas), format_func=etiquetas.get, label_visibility="collapsed")
+        with x2:
+            if st.button("🗑️ Eliminar regla"):
+                eliminar_regla(regla_del); st.rerun()
+
 st.divider()
 
 # ==========================
@@ -628,16 +1383,28 @@ if "confirm_del" not in st.session_state:
 def pedir_confirm(tipo, ts_int): st.session_state.confirm_del = {"tipo":tipo, "ts":ts_int}
 def clear_confirm(): st.session_state.confirm_del = None
 
+SIN_TASA_FILA = "Ese movimiento no tiene tipo de cambio; impórtalo en 💱 Tipos de cambio antes de borrarlo."
+
+def a_mxn_fila(r) -> float:
+    """Monto de una fila de pestaña en MXN con la `tasa` guardada al capturarla (la que movió el saldo)."""
+    if moneda_de(r.get("moneda")) == MONEDA_BASE:
+        return float(r["monto"])
+    t = pd.to_numeric(r.get("tasa"), errors="coerce")
+    return float(r["monto"]) * float(t) if pd.notna(t) and t > 0 else float("nan")
+
 def eliminar_gasto(ts_id:int):
     global gastos, cfg
     row = gastos.loc[gastos["ts"]==ts_id]
     if row.empty: return False
     r = row.iloc[0]
-    cta = r["cuenta"]; mon = float(r["monto"])
+    cta = r["cuenta"]; mon = a_mxn_fila(r)
+    if not np.isfinite(mon): raise ValueError(SIN_TASA_FILA)
     s = get_saldos(); s[cta] = s.get(cta,0.0) + mon; set_all_saldos(s)
     gastos = gastos[gastos["ts"]!=ts_id].reset_index(drop=True)
-    write_df_safe(wsG, gastos); write_df_safe(wsCfg, cfg)
-    st.cache_data.clear()
+    antes, antes_tc = version_sobres(), version_tarjetas()
+    guardar({"Gastos": gastos, "Config": cfg})
+    sobres_tras_escribir(antes, [(r["fecha"], r["categoria"], cta, mon, -1)])
+    tarjetas_tras_escribir(antes_tc, ledger_unificado(row, None, None, TASAS), -1)
     return True
 
 def eliminar_traspaso(ts_id:int):
@@ -645,14 +1412,16 @@ def eliminar_traspaso(ts_id:int):
     row = traspasos.loc[traspasos["ts"]==ts_id]
     if row.empty: return False
     r = row.iloc[0]
-    emi, rec, mon = r["cuenta_emisora"], r["cuenta_receptora"], float(r["monto"])
+    emi, rec, mon = r["cuenta_emisora"], r["cuenta_receptora"], a_mxn_fila(r)
+    if not np.isfinite(mon): raise ValueError(SIN_TASA_FILA)
     s = get_saldos()
     s[emi] = s.get(emi,0.0) + mon
     s[rec] = s.get(rec,0.0) - mon
     set_all_saldos(s)
     traspasos = traspasos[traspasos["ts"]!=ts_id].reset_index(drop=True)
-    write_df_safe(wsT, traspasos); write_df_safe(wsCfg, cfg)
-    st.cache_data.clear()
+    antes_tc = version_tarjetas()
+    guardar({"Traspasos": traspasos, "Config": cfg})
+    tarjetas_tras_escribir(antes_tc, ledger_unificado(None, row, None, TASAS), -1)
     return True
 
 def eliminar_ingreso(ts_id:int):
@@ -660,11 +1429,13 @@ def eliminar_ingreso(ts_id:int):
     row = ingresos.loc[ingresos["ts"]==ts_id]
     if row.empty: return False
     r = row.iloc[0]
-    cta = r["cuenta"]; mon = float(r["monto"])
+    cta = r["cuenta"]; mon = a_mxn_fila(r)
+    if not np.isfinite(mon): raise ValueError(SIN_TASA_FILA)
     s = get_saldos(); s[cta] = s.get(cta,0.0) - mon; set_all_saldos(s)
     ingresos = ingresos[ingresos["ts"]!=ts_id].reset_index(drop=True)
-    write_df_safe(wsI, ingresos); write_df_safe(wsCfg, cfg)
-    st.cache_data.clear()
+    antes_tc = version_tarjetas()
+    guardar({"Ingresos": ingresos, "Config": cfg})
+    tarjetas_tras_escribir(antes_tc, ledger_unificado(None, None, row, TASAS), -1)
     return True
 
 def unified_last8():
@@ -681,6 +1452,7 @@ def unified_last8():
                 "texto": f"{r.get('cuenta','')} · {r.get('categoria','')}",
                 "detalle": (r.get("nota") or ""),
                 "monto": float(pd.to_numeric(r.get("monto"), errors="coerce") or 0),
+                "moneda": moneda_de(r.get("moneda")),
             })
     if not traspasos.empty:
         t = traspasos.copy()
@@ -694,6 +1466,7 @@ def unified_last8():
                 "texto": f"{r.get('cuenta_emisora','')} → {r.get('cuenta_receptora','')}",
                 "detalle": (r.get("comentario") or ""),
                 "monto": float(pd.to_numeric(r.get("monto"), errors="coerce") or 0),
+                "moneda": moneda_de(r.get("moneda")),
             })
     if not ingresos.empty:
         i = ingresos.copy()
@@ -707,6 +1480,7 @@ def unified_last8():
                 "texto": f"{r.get('cuenta','')} · {r.get('categoria','')}",
                 "detalle": (r.get("nota") or ""),
                 "monto": float(pd.to_numeric(r.get("monto"), errors="coerce") or 0),
+                "moneda": moneda_de(r.get("moneda")),
             })
     if not u:
         return []
@@ -732,6 +1506,7 @@ for idx, item in enumerate(lista8):
     texto  = item["texto"]
     detalle= item["detalle"]
     monto  = item["monto"]
+    simb   = simbolo(item["moneda"])
 
     col = color_for(tipo)
     cont = st.container()
@@ -745,7 +1520,7 @@ for idx, item in enumerate(lista8):
               <span>· {texto}</span>
             </div>
             <div style="display:flex; align-items:center; gap:10px;">
-              <span class="{col}" style="font-weight:800;">${monto:,.2f}</span>
+              <span class="{col}" style="font-weight:800;">{simb}{monto:,.2f}</span>
             </div>
           </div>
           <div style="margin-top:6px; color:#667085;">{detalle}</div>
@@ -762,12 +1537,16 @@ for idx, item in enumerate(lista8):
                 cc1, cc2 = st.columns(2)
                 if cc1.button("Sí, eliminar", key=f"yes_unif_{tipo}_{ts_id}"):
                     ok=False
-                    if tipo=="Gasto": ok = eliminar_gasto(ts_id)
-                    elif tipo=="Traspaso": ok = eliminar_traspaso(ts_id)
-                    elif tipo=="Ingreso": ok = eliminar_ingreso(ts_id)
-                    clear_confirm()
-                    st.success(f"{tipo} eliminado." if ok else "No se encontró el registro.")
-                    st.rerun()
+                    try:
+                        if tipo=="Gasto": ok = eliminar_gasto(ts_id)
+                        elif tipo=="Traspaso": ok = eliminar_traspaso(ts_id)
+                        elif tipo=="Ingreso": ok = eliminar_ingreso(ts_id)
+                    except ValueError as e:
+                        clear_confirm(); st.error(str(e))
+                    else:
+                        clear_confirm()
+                        st.success(f"{tipo} eliminado." if ok else "No se encontró el registro.")
+                        st.rerun()
                 if cc2.button("No, cancelar", key=f"no_unif_{tipo}_{ts_id}"):
                     clear_confirm()
                     st.rerun()
@@ -777,15 +1556,237 @@ for idx, item in enumerate(lista8):
 
 st.divider()
 
+# ==========================
+#   EDICIÓN MASIVA (filtro + selección múltiple, una sola escritura)
+# ==========================
+st.markdown('<div class="section-title">🧰 Edición masiva</div>', unsafe_allow_html=True)
+
+# Columna real de cada pestaña para los campos editables en bloque
+HOJA_TIPO = {"Gasto": "Gastos", "Traspaso": "Traspasos", "Ingreso": "Ingresos"}
+CAMPOS_TABLA = {
+    "Gasto":    {"cuenta":"cuenta",         "categoria":"categoria",  "fecha":"fecha", "nota":"nota"},
+    "Traspaso": {"cuenta":"cuenta_emisora", "categoria":"comentario", "fecha":"fecha"},
+    "Ingreso":  {"cuenta":"cuenta",         "categoria":"categoria",  "fecha":"fecha", "nota":"nota"},
+}
+
+def aplicar_lote(sel: pd.DataFrame, cambios: dict | None = None) -> tuple[int, list]:
+    """Edita (`cambios`) o elimina (`cambios=None`) en bloque los movimientos `sel`.
+
+    `sel` trae `tipo` y `ts` (formato ledger). Los saldos se ajustan con una sola
+    pasada vectorizada (efecto nuevo − efecto anterior) y todas las pestañas
+    tocadas + Config se escriben en una sola llamada. Deja un punto de deshacer
+    con sólo las filas originales del lote (ver `deshacer_lote`).
+    Devuelve (movimientos tocados, avisos de lo que no se pudo aplicar).
+    """
+    global gastos, traspasos, ingresos, cfg
+    tablas = {"Gasto": gastos, "Traspaso": traspasos, "Ingreso": ingresos}
+
+    antes, despues, nuevas, avisos = {}, {}, dict(tablas), []
+    for tipo, df in tablas.items():
+        ids = sel.loc[sel["tipo"]==tipo, "ts"]
+        if df.empty or ids.empty: continue
+        mask = df["ts"].isin(ids)
+        if not mask.any(): continue
+        antes[tipo] = df[mask]
+        if cambios is None:
+            nuevas[tipo]  = df[~mask].reset_index(drop=True)
+            despues[tipo] = df.iloc[0:0]
+            continue
+        df = df.copy()
+        for campo, valor in cambios.items():
+            col = CAMPOS_TABLA[tipo].get(campo)
+            if not col:
+                avisos.append(f"{int(mask.sum())} {HOJA_TIPO[tipo].lower()} sin {campo} (esa pestaña no tiene la columna).")
+                continue
+            m = mask
+            if tipo=="Traspaso" and campo=="cuenta":
+                m = mask & (df["cuenta_receptora"]!=valor)  # emisora ≠ receptora
+                if (mask & ~m).any():
+                    avisos.append(f"{int((mask & ~m).sum())} traspasos conservaron su cuenta: "
+                                  f"{valor} ya es su cuenta receptora.")
+            df.loc[m, col] = valor
+        nuevas[tipo]  = df
+        despues[tipo] = df[mask]
+    if not antes:
+        return 0, avisos
+    sin_fx = sin_tasa(ledger_unificado(antes.get("Gasto"), antes.get("Traspaso"), antes.get("Ingreso"), TASAS))
+    if not sin_fx.empty:
+        # sin su tipo no se sabe cuánto revertir del saldo: nada del lote se aplica
+        return 0, avisos + [f"{len(sin_fx)} movimientos sin tipo de cambio; importa su tipo e inténtalo de nuevo. "
+                            "No se aplicó nada."]
+
+    delta = efecto_saldos(ledger_unificado(despues.get("Gasto"), despues.get("Traspaso"), despues.get("Ingreso"), TASAS)) \
+        .sub(efecto_saldos(ledger_unificado(antes.get("Gasto"), antes.get("Traspaso"), antes.get("Ingreso"), TASAS)), fill_value=0.0)
+    s = get_saldos()
+    for cta, v in delta.items():
+        s[cta] = s.get(cta, 0.0) + float(v)
+    set_all_saldos(s)
+
+    fin = guardar({**{HOJA_TIPO[tipo]: nuevas[tipo] for tipo in antes}, "Config": cfg})
+    gastos    = fin.get("Gastos", nuevas["Gasto"])
+    traspasos = fin.get("Traspasos", nuevas["Traspaso"])
+    ingresos  = fin.get("Ingresos", nuevas["Ingreso"])
+    cfg = fin["Config"]
+    st.session_state.undo_lote = {"sheet_id": SHEET_ID, "filas": {t: df.copy() for t, df in antes.items()}}
+    return int(sum(len(v) for v in antes.values())), avisos
+
+def deshacer_lote():
+    """Revierte sólo las filas del último lote y su efecto en saldos (una sola escritura).
+
+    Lo registrado después (otros movimientos, recurrentes, tasas fijadas) se
+    conserva: las filas del lote vuelven a su estado original por `ts` y los
+    saldos se mueven por efecto(original) − efecto(como están ahora).
+    """
+    global gastos, traspasos, ingresos, cfg
+    snap = st.session_state.get("undo_lote")
+    if not snap or snap.get("sheet_id") != SHEET_ID: return False
+    st.session_state.pop("undo_lote")
+    tablas = {"Gasto": gastos, "Traspaso": traspasos, "Ingreso": ingresos}
+    ahora, nuevas = {}, {}
+    for tipo, orig in snap["filas"].items():
+        nuevas[tipo], ahora[tipo] = restaurar_filas(tablas[tipo], orig)
+    delta = efecto_saldos(ledger_unificado(*(snap["filas"].get(t) for t in TIPOS_MOV), TASAS)) \
+        .sub(efecto_saldos(ledger_unificado(*(ahora.get(t) for t in TIPOS_MOV), TASAS)), fill_value=0.0)
+    s = get_saldos()
+    for cta, v in delta.items():
+        s[cta] = s.get(cta, 0.0) + float(v)
+    set_all_saldos(s)
+    fin = guardar({**{HOJA_TIPO[t]: df for t, df in nuevas.items()}, "Config": cfg})
+    gastos    = fin.get("Gastos", gastos)
+    traspasos = fin.get("Traspasos", traspasos)
+    ingresos  = fin.get("Ingresos", ingresos)
+    cfg = fin["Config"]
+    return True
+
+SIN_CAMBIO = "— sin cambio —"
+
+with st.expander("Filtrar, seleccionar y editar/eliminar en bloque",
+                 expanded="aviso_lote" in st.session_state):
+    if "aviso_lote" in st.session_state:   # el resultado del lote sobrevive al rerun
+        hecho, avisos = st.session_state.pop("aviso_lote")
+        st.success(hecho)
+        for a in avisos: st.warning(f"⚠️ {a}")
+    led = ledger
+    if led.empty:
+        st.info("Sin movimientos.")
+    else:
+        f1, f2, f3 = st.columns(3)
+        with f1: tipos_f = st.multiselect("Tipo", TIPOS_MOV, default=TIPOS_MOV)
+        with f2: ctas_f  = st.multiselect("Cuenta", cuentas())
+        with f3: cats_f  = st.multiselect("Categoría", sorted(c for c in led["categoria"].unique() if c))
+        fechas_ok = led["fecha"].dropna()
+        f_min = fechas_ok.min().date() if not fechas_ok.empty else date.today()
+        f_max = fechas_ok.max().date() if not fechas_ok.empty else date.today()
+        f4, f5 = st.columns(2)
+        with f4: rango_f = st.date_input("Rango de fechas", value=(f_min, f_max))
+        with f5: texto_f = st.text_input("Nota contiene", "")
+
+        m = led["tipo"].isin(tipos_f)
+        if ctas_f: m &= led["cuenta"].isin(ctas_f) | led["cuenta_receptora"].isin(ctas_f)
+        if cats_f: m &= led["categoria"].isin(cats_f)
+        if isinstance(rango_f, (list, tuple)) and len(rango_f)==2:
+            m &= led["fecha"].between(pd.Timestamp(rango_f[0]), pd.Timestamp(rango_f[1]))
+        if texto_f.strip():
+            m &= led["nota"].str.contains(texto_f.strip(), case=False, regex=False)
+
+        vista = led[m].sort_values(["fecha","ts"], ascending=[False, False])
+        vista.insert(0, "sel", st.checkbox(f"Seleccionar los {len(vista)} filtrados"))
+        ed = st.data_editor(
+            vista, hide_index=True, use_container_width=True, height=320,
+            disabled=[c for c in vista.columns if c!="sel"],
+            column_config={
+                "sel":   st.column_config.CheckboxColumn("✔"),
+                "ts":    None,
+                "fecha": st.column_config.DateColumn("fecha", format="DD/MM/YYYY"),
+                "monto": st.column_config.NumberColumn("monto", format="$%.2f"),
+            },
+        )
+        sel = ed[ed["sel"]]
+        st.caption(f"{len(sel)} de {len(vista)} movimientos seleccionados")
+
+        if not sel.empty:
+            tipos_sel = sel["tipo"].unique().tolist()
+            e1, e2, e3, e4 = st.columns(4)
+            with e1:
+                cats_opts = CATEGORIAS.get(tipos_sel[0], []) if len(tipos_sel)==1 else []
+                new_cat = st.selectbox("Nueva categoría", [SIN_CAMBIO]+cats_opts, disabled=len(tipos_sel)!=1,
+                                       help="Disponible cuando la selección es de un solo tipo.")
+            with e2: new_cta = st.selectbox("Nueva cuenta", [SIN_CAMBIO]+cuentas())
+            with e3:
+                cambiar_fecha = st.checkbox("Cambiar fecha")
+                new_fecha = st.date_input("Nueva fecha", value=date.today(), disabled=not cambiar_fecha)
+            with e4: new_nota = st.text_input("Nueva nota", "", placeholder="(sin cambio)")
+
+            b1, b2 = st.columns(2)
+            with b1:
+                if st.button(f"✏️ Aplicar a {len(sel)} movimientos"):
+                    cambios = {}
+                    if new_cat != SIN_CAMBIO: cambios["categoria"] = new_cat
+                    if new_cta != SIN_CAMBIO: cambios["cuenta"] = new_cta
+                    if cambiar_fecha:         cambios["fecha"] = new_fecha
+                    if new_nota.strip():      cambios["nota"] = new_nota.strip()
+                    if not cambios:
+                        st.warning("No hay cambios que aplicar.")
+                    else:
+                        n, avisos = aplicar_lote(sel, cambios)
+                        st.session_state.aviso_lote = (f"✅ {n} movimientos actualizados.", avisos)
+                        st.rerun()
+            with b2:
+                ok_del = st.checkbox(f"Confirmo eliminar {len(sel)} movimientos")
+                if st.button("🗑️ Eliminar seleccionados", disabled=not ok_del):
+                    n, avisos = aplicar_lote(sel)
+                    st.session_state.aviso_lote = (f"✅ {n} movimientos eliminados.", avisos)
+                    st.rerun()
+
+    if (st.session_state.get("undo_lote") or {}).get("sheet_id") == SHEET_ID:
+        if st.button("↩️ Deshacer último lote"):
+            deshacer_lote(); st.rerun()
+
+st.divider()
+
 # ==========================
 #   DETALLE POR CUENTA
 # ==========================
 st.markdown('<div class="section-title">📊 Detalle por cuenta</div>', unsafe_allow_html=True)
-rango = st.radio("Rango", ["7 días","30 días"], horizontal=True)
-dias = 7 if rango=="7 días" else 30
-desde = date.today() - timedelta(days=dias)
-
 from plotly import graph_objects as go
+from muestreo import PUNTOS, reducir
+
+RANGOS = {"7 días": 7, "30 días": 30, "90 días": 90, "1 año": 365, "Todo": None, "Personalizado": -1}
+
+def elegir_rango(key: str, default: str = "30 días"):
+    """(desde, hasta) a partir de un selector de rango; "Todo" arranca en el primer movimiento."""
+    hoy_ = date.today()
+    op = st.radio("Rango", list(RANGOS), horizontal=True, index=list(RANGOS).index(default), key=key)
+    if op == "Personalizado":
+        sel = st.date_input("Desde / hasta", value=(hoy_ - timedelta(days=90), hoy_), key=f"{key}_fechas")
+        d1, d2 = (tuple(sel) + (hoy_,))[:2] if isinstance(sel, (tuple, list)) else (sel, hoy_)
+        return min(d1, d2), max(d1, d2)
+    if RANGOS[op] is None:
+        primera = ledger["fecha"].min()
+        return (primera.date() if pd.notna(primera) else hoy_), hoy_
+    return hoy_ - timedelta(days=RANGOS[op]), hoy_
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def serie_saldo(_led: pd.DataFrame, version: str, cuenta: str, desde_: date, hasta_: date,
+                saldo_actual: float, puntos: int = PUNTOS, moneda: str = MONEDA_BASE) -> pd.Series:
+    """Saldo al cierre de cada día en [desde_, hasta_], reducido a `puntos` (LTTB).
+
+    Saldo(d) = saldo actual − Σ movimientos posteriores a d; todo con un cumsum.
+    Se calcula en MXN y cada día se divide entre el tipo de `moneda` vigente ese día.
+    En caché por (cuenta, rango, moneda, versión de datos): el costo no crece con el rango.
+    """
+    f = flujos_cuenta(_led)
+    f = f[(f["cuenta"]==cuenta) & f["fecha"].notna()]
+    diario = f.groupby(f["fecha"].dt.normalize())["valor"].sum().sort_index()
+    dias_ = pd.date_range(desde_, hasta_, freq="D")
+    acum = diario.cumsum()
+    acum = acum.reindex(acum.index.union(dias_)).ffill().fillna(0.0).reindex(dias_)
+    serie = (saldo_actual - diario.sum() + acum).rename("saldo")
+    if moneda != MONEDA_BASE:
+        serie = serie / tasa_asof(serie.index, moneda, TASAS)
+    return reducir(serie, puntos)
+
+desde, hasta = elegir_rango("rango_detalle")
 
 # AgGrid opcional
 try:
@@ -802,28 +1803,28 @@ def detalle(nombre):
     if not g.empty:
         g["ts"]     = pd.to_numeric(g["ts"], errors="coerce").astype("Int64")
         g["fecha_dt"]= pd.to_datetime(g["fecha"], errors="coerce")
-        g = g[(g["fecha_dt"].dt.date>=desde)&(g["cuenta"]==nombre)]
+        g = g[(g["fecha_dt"].dt.date>=desde)&(g["fecha_dt"].dt.date<=hasta)&(g["cuenta"]==nombre)]
 
     te = traspasos.copy()
     if not te.empty:
         te["ts"]     = pd.to_numeric(te["ts"], errors="coerce").astype("Int64")
         te["fecha_dt"]= pd.to_datetime(te["fecha"], errors="coerce")
-        te = te[(te["fecha_dt"].dt.date>=desde)&(te["cuenta_emisora"]==nombre)]
+        te = te[(te["fecha_dt"].dt.date>=desde)&(te["fecha_dt"].dt.date<=hasta)&(te["cuenta_emisora"]==nombre)]
 
     tr = traspasos.copy()
     if not tr.empty:
         tr["ts"]     = pd.to_numeric(tr["ts"], errors="coerce").astype("Int64")
         tr["fecha_dt"]= pd.to_datetime(tr["fecha"], errors="coerce")
-        tr = tr[(tr["fecha_dt"].dt.date>=desde)&(tr["cuenta_receptora"]==nombre)]
+        tr = tr[(tr["fecha_dt"].dt.date>=desde)&(tr["fecha_dt"].dt.date<=hasta)&(tr["cuenta_receptora"]==nombre)]
 
     inc = ingresos.copy()
     if not inc.empty:
         inc["ts"]     = pd.to_numeric(inc["ts"], errors="coerce").astype("Int64")
         inc["fecha_dt"]= pd.to_datetime(inc["fecha"], errors="coerce")
-        inc = inc[(inc["fecha_dt"].dt.date>=desde)&(inc["cuenta"]==nombre)]
+        inc = inc[(inc["fecha_dt"].dt.date>=desde)&(inc["fecha_dt"].dt.date<=hasta)&(inc["cuenta"]==nombre)]
 
     # --- NUEVA TABLA ÚNICA: últimos 7 por fecha desc (y ts) ---
-    cols = ["fecha","tipo","monto","detalle"]
+    cols = ["fecha","tipo","monto","moneda","detalle"]
     df_u = pd.DataFrame(columns=cols)
 
     if not g.empty:
@@ -834,6 +1835,7 @@ def detalle(nombre):
             "detalle": g["categoria"].fillna("").astype(str) + g["nota"].fillna("").map(lambda n: f" — {n}" if str(n).strip() else "")
         })
         x["ts"] = g["ts"]
+        x["moneda"] = g.get("moneda", pd.Series("", index=g.index)).map(moneda_de)
         df_u = pd.concat([df_u, x], ignore_index=True)
 
     if not te.empty:
@@ -844,6 +1846,7 @@ def detalle(nombre):
             "detalle": "→ " + te["cuenta_receptora"].astype(str) + te["comentario"].fillna("").map(lambda c: f" ({c})" if str(c).strip() else "")
         })
         x["ts"] = te["ts"]
+        x["moneda"] = te.get("moneda", pd.Series("", index=te.index)).map(moneda_de)
         df_u = pd.concat([df_u, x], ignore_index=True)
 
     if not tr.empty:
@@ -854,6 +1857,7 @@ def detalle(nombre):
             "detalle": "← " + tr["cuenta_emisora"].astype(str) + tr["comentario"].fillna("").map(lambda c: f" ({c})" if str(c).strip() else "")
         })
         x["ts"] = tr["ts"]
+        x["moneda"] = tr.get("moneda", pd.Series("", index=tr.index)).map(moneda_de)
         df_u = pd.concat([df_u, x], ignore_index=True)
 
     if not inc.empty:
@@ -864,6 +1868,7 @@ def detalle(nombre):
             "detalle": inc["categoria"].fillna("").astype(str) + inc["nota"].fillna("").map(lambda n: f" — {n}" if str(n).strip() else "")
         })
         x["ts"] = inc["ts"]
+        x["moneda"] = inc.get("moneda", pd.Series("", index=inc.index)).map(moneda_de)
         df_u = pd.concat([df_u, x], ignore_index=True)
 
     # Ordenar por fecha desc y ts desc; tomar sólo los últimos 7
@@ -873,50 +1878,36 @@ def detalle(nombre):
 
         st.caption("Últimos 7 movimientos (más recientes arriba)")
         if AG_OK:
-            gb = GridOptionsBuilder.from_dataframe(df_u[["fecha","tipo","monto","detalle"]])
+            gb = GridOptionsBuilder.from_dataframe(df_u[cols])
             gb.configure_default_column(resizable=True, filter=True, sortable=True)
-            gb.configure_column("monto", type=["numericColumn"], valueFormatter="x.toLocaleString('es-MX',{style:'currency',currency:'MXN'})")
-            AgGrid(df_u[["fecha","tipo","monto","detalle"]],
+            # cada fila en su propia moneda (la capturada), no siempre MXN
+            gb.configure_column("monto", type=["numericColumn"],
+                                valueFormatter=f"x.toLocaleString('es-MX',{{style:'currency',currency:(data.moneda||'{MONEDA_BASE}')}})")
+            gb.configure_column("moneda", hide=True)
+            AgGrid(df_u[cols],
                    gridOptions=gb.build(),
                    fit_columns_on_grid_load=True,
                    update_mode=GridUpdateMode.NO_UPDATE,
                    height=260, theme="streamlit")
         else:
             df_fmt = df_u.copy()
-            df_fmt["monto"] = df_fmt["monto"].map(lambda x: f"${x:,.2f}")
+            df_fmt["monto"] = [f"{simbolo(m)}{x:,.2f}" for x, m in zip(df_fmt["monto"], df_fmt["moneda"])]
             st.dataframe(df_fmt[["fecha","tipo","monto","detalle"]], use_container_width=True, hide_index=True)
     else:
         st.info("Sin movimientos en el rango seleccionado.")
 
-    # --- Curva de saldo reconstruida (sin cambios) ---
+    # --- Curva de saldo (vectorizada, reducida a PUNTOS sin importar el rango) ---
     s = get_saldos(); saldo_actual = s.get(nombre, 0.0)
-    movs=[]
-    for dframe, sign in [
-        (g,  lambda v:-abs(float(v))),
-        (te, lambda v:-abs(float(v))),
-        (tr, lambda v:+abs(float(v))),
-        (inc,lambda v:+abs(float(v))),
-    ]:
-        if not dframe.empty:
-            for _, row in dframe.iterrows():
-                try: movs.append((pd.to_datetime(row["fecha_dt"]).date(), sign(row["monto"])))
-                except: pass
-    if movs:
-        dfm = pd.DataFrame(movs, columns=["fecha","delta"]).groupby("fecha", as_index=False)["delta"].sum().sort_values("fecha")
-        saldo_ini = saldo_actual - dfm["delta"].sum()
-        fechas = pd.date_range(desde, date.today(), freq="D")
-        pts=[]; j=0; running=saldo_ini
-        for f in fechas:
-            while j<len(dfm) and dfm.iloc[j]["fecha"]<=f.date():
-                running += dfm.iloc[j]["delta"]; j+=1
-            pts.append({"fecha":f.date(), "saldo":running})
-        serie = pd.DataFrame(pts)
+    if not (g.empty and te.empty and tr.empty and inc.empty):
+        serie = serie_saldo(ledger, f"{ver_datos}|{ver_tasas}", nombre, desde, hasta, saldo_actual,
+                            moneda=MONEDA).reset_index()
+        serie.columns = ["fecha","saldo"]
 
         fig = go.Figure()
         fig.add_trace(go.Scatter(
             x=serie["fecha"], y=serie["saldo"], mode="lines",
             line=dict(width=3, color=PRIMARY),
-            hovertemplate="<b>%{x}</b><br>Saldo: $%{y:,.2f}<extra></extra>"
+            hovertemplate=f"<b>%{{x}}</b><br>Saldo: {SIMB}%{{y:,.2f}}<extra></extra>"
         ))
         fig.update_layout(margin=dict(l=10,r=10,t=10,b=10), height=260, template="simple_white",
                           xaxis=dict(title="", showgrid=False),
@@ -925,9 +1916,9 @@ def detalle(nombre):
 
         delta = float(serie["saldo"].iloc[-1] - serie["saldo"].iloc[0])
         if delta >= 0:
-            st.success(f"Subió ${delta:,.2f} en el período.")
+            st.success(f"Subió {SIMB}{delta:,.2f} en el período.")
         else:
-            st.warning(f"Bajó ${abs(delta):,.2f} en el período.")
+            st.warning(f"Bajó {SIMB}{abs(delta):,.2f} en el período.")
     else:
         st.info("Sin movimientos para graficar.")
 
@@ -937,6 +1928,105 @@ with st.expander("Apartados"):          detalle("Apartados")
 with st.expander("GBM"):                detalle("GBM")
 
 
+# ==========================
+#   CONCILIACIÓN CON ESTADO DE CUENTA
+# ==========================
+st.divider()
+st.markdown('<div class="section-title">🧾 Conciliación con estado de cuenta</div>', unsafe_allow_html=True)
+
+from conciliacion import a_numero, conciliar
+
+def movimientos_cuenta(nombre: str) -> pd.DataFrame:
+    """Movimientos del ledger que afectan a `nombre`, con monto firmado desde esa cuenta."""
+    led = ledger[ledger["fecha"].notna()]
+    led = led.assign(detalle=(led["categoria"] + " " + led["nota"]).str.strip())
+    fl = flujos_cuenta(led, extra=("tipo","ts","detalle"))
+    return fl[fl["cuenta"]==nombre].rename(columns={"valor":"monto"}).reset_index(drop=True)
+
+def saldo_ledger_al(nombre: str, al: pd.Timestamp) -> float:
+    """Saldo de `nombre` al cierre de `al`: saldo actual menos lo registrado después."""
+    m = movimientos_cuenta(nombre)
+    return float(get_saldos().get(nombre, 0.0) - m.loc[m["fecha"] > al, "monto"].sum())
+
+with st.expander("Conciliar un estado de cuenta (CSV / XLSX)"):
+    k1, k2, k3 = st.columns(3)
+    with k1: cta_conc = st.selectbox("Cuenta", cuentas(), key="conc_cta")
+    with k2: tol_conc = st.slider("Tolerancia de fecha (días)", 0, 10, 3, key="conc_tol")
+    with k3: dayfirst_conc = st.checkbox("Fechas día/mes/año", value=True, key="conc_dayfirst")
+    arch = st.file_uploader("Estado de cuenta", type=["csv","xlsx"], key="conc_file")
+    if arch is not None:
+        try:
+            raw = pd.read_excel(arch) if arch.name.lower().endswith(".xlsx") else pd.read_csv(arch)
+        except Exception as e:
+            st.error("No pude leer el archivo."); st.exception(e); raw = pd.DataFrame()
+        if not raw.empty:
+            raw.columns = [str(c).strip() for c in raw.columns]
+            cols_raw = list(raw.columns)
+            NINGUNA = "—"
+            m1, m2, m3, m4 = st.columns(4)
+            with m1: c_fecha = st.selectbox("Columna fecha", cols_raw, key="conc_c_fecha")
+            with m2: c_monto = st.selectbox("Monto (con signo)", [NINGUNA]+cols_raw, key="conc_c_monto")
+            with m3: c_cargo = st.selectbox("…o Cargo", [NINGUNA]+cols_raw, key="conc_c_cargo")
+            with m4: c_abono = st.selectbox("…y Abono", [NINGUNA]+cols_raw, key="conc_c_abono")
+            n1, n2, n3 = st.columns(3)
+            with n1: c_desc = st.selectbox("Descripción", [NINGUNA]+cols_raw, key="conc_c_desc")
+            with n2: invertir = st.checkbox("Invertir signo (cargos positivos)", key="conc_inv")
+            with n3: saldo_final = st.number_input("Saldo final del estado", value=None, step=100.0, key="conc_saldo",
+                                                   help="Opcional; para tarjeta de crédito usa negativo si es deuda.")
+
+            if c_monto != NINGUNA:
+                monto_e = a_numero(raw[c_monto])
+            elif c_cargo != NINGUNA or c_abono != NINGUNA:
+                cargo = a_numero(raw[c_cargo]).fillna(0.0) if c_cargo != NINGUNA else 0.0
+                abono = a_numero(raw[c_abono]).fillna(0.0) if c_abono != NINGUNA else 0.0
+                monto_e = abono - cargo
+            else:
+                monto_e = None
+
+            if monto_e is None:
+                st.info("Elige la columna de monto, o las de cargo/abono.")
+            else:
+                estado = pd.DataFrame({
+                    "fecha": pd.to_datetime(raw[c_fecha], errors="coerce", dayfirst=dayfirst_conc).dt.normalize(),
+                    "monto": (-1 if invertir else 1) * monto_e,
+                    "descripcion": raw[c_desc].astype(str) if c_desc != NINGUNA else "",
+                }).dropna(subset=["fecha","monto"]).reset_index(drop=True)
+                if estado.empty:
+                    st.warning("No encontré renglones con fecha y monto válidos.")
+                else:
+                    f_ini, f_fin = estado["fecha"].min(), estado["fecha"].max()
+                    movs = movimientos_cuenta(cta_conc)
+                    movs = movs[movs["fecha"].between(f_ini - pd.Timedelta(days=tol_conc),
+                                                      f_fin + pd.Timedelta(days=tol_conc))].reset_index(drop=True)
+                    t0 = time.perf_counter()
+                    pares, solo_e, solo_l = conciliar(estado, movs, tol_conc)
+                    ms = (time.perf_counter() - t0) * 1000
+
+                    q1, q2, q3, q4 = st.columns(4)
+                    q1.metric("Emparejados", f"{len(pares):,}")
+                    q2.metric("Sólo en estado", f"{len(solo_e):,}", f"${solo_e['monto'].sum():,.2f}", delta_color="off")
+                    q3.metric("Sólo en la app", f"{len(solo_l):,}", f"${solo_l['monto'].sum():,.2f}", delta_color="off")
+                    if saldo_final is not None:
+                        saldo_app = saldo_ledger_al(cta_conc, f_fin)
+                        q4.metric(f"Diferencia al {f_fin:%d %b %Y}", f"${saldo_final - saldo_app:,.2f}",
+                                  f"App: ${saldo_app:,.2f}", delta_color="off")
+                    st.caption(f"{len(estado):,} renglones vs {len(movs):,} movimientos · {ms:.0f} ms")
+
+                    st.write("**Sólo en el estado de cuenta** (faltan en la app)")
+                    st.dataframe(solo_e[["fecha","monto","descripcion"]].assign(fecha=solo_e["fecha"].dt.date),
+                                 use_container_width=True, hide_index=True)
+                    st.write("**Sólo en la app** (no aparecen en el estado)")
+                    st.dataframe(solo_l[["fecha","tipo","monto","detalle"]].assign(fecha=solo_l["fecha"].dt.date),
+                                 use_container_width=True, hide_index=True)
+                    if not pares.empty:
+                        with st.popover(f"Ver {len(pares):,} emparejados"):
+                            vis = pares.merge(estado, left_on="eid", right_index=True) \
+                                       .merge(movs[["fecha","detalle"]], left_on="lid", right_index=True, suffixes=("","_app"))
+                            st.dataframe(vis[["fecha","fecha_app","monto","descripcion","detalle","dias"]]
+                                         .assign(fecha=vis["fecha"].dt.date, fecha_app=vis["fecha_app"].dt.date),
+                                         use_container_width=True, hide_index=True)
+
+
 # ============================================================
 #   📊 REPORTE SEMANAL / MENSUAL (NUEVO BLOQUE)
 # ============================================================
@@ -944,33 +2034,10 @@ st.divider()
 st.markdown('<div class="section-title">📊 Reporte semanal / mensual</div>', unsafe_allow_html=True)
 
 def calcular_reporte_periodo(inicio: date, fin: date):
-    """Calcula gasto, ingreso, ahorro e inversión en el rango indicado."""
-    # --- Gastos totales ---
-    g = gastos.copy()
-    g["fecha"] = pd.to_datetime(g["fecha"], errors="coerce").dt.date
-    gasto = g[(g["fecha"]>=inicio) & (g["fecha"]<=fin)]["monto"].sum()
-
-    # --- Ingresos (solo BBVA Concentradora) ---
-    i = ingresos.copy()
-    i["fecha"] = pd.to_datetime(i["fecha"], errors="coerce").dt.date
-    ingreso = i[(i["fecha"]>=inicio) & (i["fecha"]<=fin) & (i["cuenta"]=="BBVA Concentradora")]["monto"].sum()
-
-    # --- Ahorro (movimientos netos en Apartados) ---
-    t = traspasos.copy()
-    t["fecha"] = pd.to_datetime(t["fecha"], errors="coerce").dt.date
-    entra_ap = t[(t["fecha"]>=inicio) & (t["fecha"]<=fin) & (t["cuenta_receptora"]=="Apartados")]["monto"].sum()
-    sale_ap  = t[(t["fecha"]>=inicio) & (t["fecha"]<=fin) & (t["cuenta_emisora"]=="Apartados")]["monto"].sum()
-    ahorro = entra_ap - sale_ap
-
-    # --- Inversión (todo lo que se traspasa a GBM) ---
-    inv = t[(t["fecha"]>=inicio) & (t["fecha"]<=fin) & (t["cuenta_receptora"]=="GBM")]["monto"].sum()
-
-    return {
-        "Gasto": float(gasto),
-        "Ingreso": float(ingreso),
-        "Ahorro": float(ahorro),
-        "Inversión": float(inv)
-    }
+    """Calcula gasto, ingreso, ahorro e inversión en el rango indicado (moneda de reporte)."""
+    x = ledger_vista[ledger_vista["fecha"].between(pd.Timestamp(inicio), pd.Timestamp(fin))]
+    tot = reporte_periodos(x, "D").sum()      # mismas reglas que el reporte por periodos
+    return {c: float(tot.get(c, 0.0)) for c in ["Gasto","Ingreso","Ahorro","Inversión"]}
 
 # --- Fechas de referencia ---
 hoy = date.today()
@@ -1007,6 +2074,375 @@ with col2:
         st.plotly_chart(fig, use_container_width=True)
 
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def serie_reporte(_led: pd.DataFrame, version: str, desde_: date, hasta_: date, puntos: int = PUNTOS) -> dict:
+    """Acumulado diario de cada concepto del reporte en el rango, cada uno reducido con LTTB."""
+    x = _led[(_led["fecha"] >= pd.Timestamp(desde_)) & (_led["fecha"] <= pd.Timestamp(hasta_))]
+    dias_ = pd.date_range(desde_, hasta_, freq="D")
+    acum = reporte_periodos(x, "D").reindex(dias_, fill_value=0.0).cumsum()
+    return {c: reducir(acum[c], puntos) for c in acum.columns}
+
+with st.expander("📈 Cualquier rango"):
+    r_desde, r_hasta = elegir_rango("rango_reporte", default="1 año")
+    data = calcular_reporte_periodo(r_desde, r_hasta)
+    st.write(f"**Del {r_desde.strftime('%d %b %Y')} al {r_hasta.strftime('%d %b %Y')}** · "
+             + " · ".join(f"{k}: {SIMB}{v:,.2f}" for k, v in data.items()))
+    fig = go.Figure()
+    for (concepto, serie), color in zip(serie_reporte(ledger_vista, ver_vista, r_desde, r_hasta).items(),
+                                        ["#D7263D","#0A8A4E","#7A43F0","#2F2F2F"]):
+        fig.add_trace(go.Scatter(x=serie.index, y=serie.to_numpy(), name=concepto, mode="lines",
+                                 line=dict(color=color),
+                                 hovertemplate=f"%{{x|%d %b %Y}}<br>{SIMB}%{{y:,.2f}}<extra></extra>"))
+    fig.update_layout(height=320, margin=dict(l=10,r=10,t=10,b=10), template="simple_white",
+                      legend=dict(orientation="h", y=1.1))
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"Acumulado diario; cada curva se reduce a ≤ {PUNTOS} puntos (LTTB).")
+
+
+# ============================================================
+#   🏷️ ANÁLISIS POR CATEGORÍA
+# ============================================================
+st.divider()
+st.markdown('<div class="section-title">🏷️ Análisis por categoría</div>', unsafe_allow_html=True)
+
+Z_ATIPICO = 3.5   # umbral de z robusto (Iglewicz–Hoaglin)
+
+def z_robusto(x, med: pd.Series, mad: pd.Series):
+    """z = 0.6745·(x − mediana)/MAD; NaN donde el MAD es 0 (no hay dispersión)."""
+    return 0.6745 * (x - med) / mad.where(mad > 0)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def analitica_categorias(_led: pd.DataFrame, version: str, tipo: str = "Gasto") -> dict:
+    """Pivote mes × categoría, promedios móviles, participación y atípicos.
+
+    Todo con operaciones agrupadas sobre el historial completo; en caché por
+    versión de datos y tipo.
+    """
+    x = _led[(_led["tipo"]==tipo) & _led["fecha"].notna()]
+    if x.empty:
+        return {}
+    x = x.assign(mes=x["fecha"].to_numpy().astype("datetime64[M]"))
+    piv = x.pivot_table(index="mes", columns="categoria", values="monto", aggfunc="sum", fill_value=0.0)
+    piv = piv.reindex(pd.date_range(piv.index.min(), piv.index.max(), freq="MS"), fill_value=0.0)
+    piv.index.name = "mes"
+
+    total = piv.sum(axis=1)
+    share = piv.div(total.where(total > 0), axis=0).fillna(0.0)
+    moviles = {n: piv.rolling(n, min_periods=1).mean() for n in (3, 6, 12)}
+
+    # Meses atípicos: z robusto de cada mes contra la historia de su categoría
+    med = piv.median()
+    z_mes = z_robusto(piv, med, (piv - med).abs().median())
+    atip_mes = z_mes.stack().rename("z").reset_index()
+    atip_mes = atip_mes[atip_mes["z"].abs() >= Z_ATIPICO]
+    atip_mes["monto"] = piv.stack().reindex(pd.MultiIndex.from_frame(atip_mes[["mes","categoria"]])).to_numpy()
+    atip_mes["mediana"] = med.reindex(atip_mes["categoria"]).to_numpy()
+
+    # Movimientos atípicos: z robusto del log-monto dentro de su categoría
+    # (los montos son asimétricos; en escala log la cola larga no lo marca todo)
+    lm = np.log1p(x["monto"].clip(lower=0))
+    med_m = lm.groupby(x["categoria"]).transform("median")
+    mad_m = (lm - med_m).abs().groupby(x["categoria"]).transform("median")
+    atip_mov = x.assign(z=z_robusto(lm, med_m, mad_m), mediana=np.expm1(med_m))
+    atip_mov = atip_mov[atip_mov["z"] >= Z_ATIPICO]       # sólo montos inusualmente altos
+
+    return {
+        "pivote": piv, "moviles": moviles, "participacion": share,
+        "atipicos_mes": atip_mes.sort_values("mes", ascending=False).reset_index(drop=True),
+        "atipicos_mov": atip_mov.sort_values("fecha", ascending=False)[
+            ["fecha","cuenta","categoria","monto","mediana","z","nota"]].reset_index(drop=True),
+    }
+
+with st.expander("Ver análisis"):
+    tipo_an = st.radio("Tipo", ["Gasto","Ingreso"], horizontal=True, key="an_tipo")
+    an = analitica_categorias(ledger_vista, ver_vista, tipo_an)
+    fmt_m = f"{SIMB}{{:,.2f}}"
+    if not an:
+        st.info("Sin movimientos para analizar.")
+    else:
+        import plotly.express as px
+        fmt_mes = lambda df: df.set_axis(df.index.strftime("%Y-%m"), axis=0).sort_index(ascending=False)
+        ta, tb, tc, td = st.tabs(["Mes × categoría","Promedios móviles","Participación","Atípicos"])
+        with ta:
+            piv = an["pivote"]
+            largo = piv.tail(12).reset_index().melt(id_vars="mes", var_name="categoria", value_name="monto")
+            fig = px.bar(largo, x="mes", y="monto", color="categoria")
+            fig.update_layout(height=320, margin=dict(l=10,r=10,t=10,b=10), legend_title_text="")
+            st.plotly_chart(fig, use_container_width=True)
+            st.dataframe(fmt_mes(piv.assign(Total=piv.sum(axis=1))).style.format(fmt_m),
+                         use_container_width=True)
+        with tb:
+            n_mov = st.radio("Ventana", [3, 6, 12], horizontal=True, format_func=lambda n: f"{n} meses", key="an_ventana")
+            mov = an["moviles"][n_mov]
+            fig = px.line(mov.reset_index().melt(id_vars="mes", var_name="categoria", value_name="promedio"),
+                          x="mes", y="promedio", color="categoria")
+            fig.update_layout(height=320, margin=dict(l=10,r=10,t=10,b=10), legend_title_text="")
+            st.plotly_chart(fig, use_container_width=True)
+            st.dataframe(fmt_mes(mov).style.format(fmt_m), use_container_width=True)
+        with tc:
+            st.dataframe(fmt_mes(an["participacion"]).style.format("{:.1%}"), use_container_width=True)
+        with td:
+            st.caption(f"Meses con |z robusto| ≥ {Z_ATIPICO} y movimientos con z ≥ {Z_ATIPICO} "
+                       "respecto a la mediana de su categoría.")
+            st.write("**Meses atípicos**")
+            if an["atipicos_mes"].empty: st.info("Ninguno.")
+            else:
+                st.dataframe(an["atipicos_mes"].assign(mes=an["atipicos_mes"]["mes"].dt.strftime("%Y-%m"))
+                             .style.format({"monto":fmt_m,"mediana":fmt_m,"z":"{:.1f}"}),
+                             use_container_width=True, hide_index=True)
+            st.write("**Movimientos atípicos**")
+            if an["atipicos_mov"].empty: st.info("Ninguno.")
+            else:
+                st.dataframe(an["atipicos_mov"].assign(fecha=an["atipicos_mov"]["fecha"].dt.date)
+                             .style.format({"monto":fmt_m,"mediana":fmt_m,"z":"{:.1f}"}),
+                             use_container_width=True, hide_index=True)
+
+
+# ============================================================
+#   📈 PORTAFOLIO GBM (operaciones + precios diarios locales)
+# ============================================================
+st.divider()
+st.markdown('<div class="section-title">📈 Portafolio GBM</div>', unsafe_allow_html=True)
+
+from portafolio import (PRECIOS_DEFAULT, leer_archivo, leer_precios, normalizar_precios,
+                        importar_precios, valuacion, titulos_disponibles, twr_anualizado)
+
+RUTA_PRECIOS = str(st.secrets.get("PRECIOS_PATH", PRECIOS_DEFAULT))
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def precios_locales(ruta: str, mtime: float) -> pd.DataFrame:
+    """Histórico de precios del disco; se vuelve a leer sólo si el archivo cambió."""
+    return leer_precios(ruta)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def portafolio_gbm(_ops: pd.DataFrame, _precios: pd.DataFrame, version: str, mtime: float, hoy_: date,
+                   moneda: str, _tasas: pd.DataFrame, ver_tasas_: str) -> dict:
+    """Valuación diaria en `moneda`; en caché por versión de operaciones, precios, tipos y día."""
+    return valuacion(_ops, _precios, hoy_, moneda, _tasas)
+
+def registrar_operacion(fecha, ticker, operacion, titulos, precio, comision, nota):
+    global operaciones
+    row = pd.DataFrame([{
+        "ts": now_ts(), "fecha": fecha, "ticker": ticker.strip().upper(), "operacion": operacion,
+        "titulos": float(titulos), "precio": float(precio), "comision": float(comision), "nota": nota
+    }])
+    operaciones = guardar({"Operaciones": pd.concat([operaciones, row], ignore_index=True)})["Operaciones"]
+
+operaciones = leer_pestaña(HOJAS["Operaciones"])
+if operaciones.empty:
+    operaciones = pd.DataFrame(columns=OPERACIONES_COLS)
+mtime_precios = os.path.getmtime(RUTA_PRECIOS) if os.path.exists(RUTA_PRECIOS) else 0.0
+
+with st.expander("Valor, aportaciones y rendimiento"):
+    pa, pb, pc = st.tabs(["Resumen","Registrar operación","Importar precios"])
+    with pa:
+        precios = precios_locales(RUTA_PRECIOS, mtime_precios)
+        args_pf = (operaciones, precios, version_pestaña("Operaciones"), mtime_precios, date.today())
+        moneda_pf = MONEDA
+        try:
+            pf = portafolio_gbm(*args_pf, MONEDA, TASAS, ver_tasas)
+        except ValueError as e:        # tipos que no cubren todo el historial: se muestra en MXN
+            st.caption(f"💱 {e} El portafolio se muestra en {MONEDA_BASE}.")
+            pf, moneda_pf = portafolio_gbm(*args_pf, MONEDA_BASE, TASAS, ver_tasas), MONEDA_BASE
+        simb_pf = simbolo(moneda_pf)
+        dia = pf["diario"]
+        if dia.empty:
+            st.info("Registra compras/ventas de GBM para ver el valor del portafolio.")
+        else:
+            u = dia.iloc[-1]
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Valor de mercado", f"{simb_pf}{u['valor']:,.2f}")
+            m2.metric("Aportado neto", f"{simb_pf}{u['aportado']:,.2f}")
+            m3.metric("Ganancia de mercado", f"{simb_pf}{u['ganancia']:,.2f}",
+                      f"{u['ganancia']/u['aportado']:.1%}" if u["aportado"] > 0 else None)
+            m4.metric("Rendimiento (TWR)", f"{u['twr']:.1%}", f"{twr_anualizado(dia):.1%} anual", delta_color="off")
+
+            fig = go.Figure()
+            for col, nombre_, linea in [("valor","Valor",dict(color=DARK)), ("aportado","Aportado",dict(dash="dot"))]:
+                serie = reducir(dia[col])
+                fig.add_trace(go.Scatter(x=serie.index, y=serie.to_numpy(), name=nombre_, line=linea))
+            fig.update_layout(height=300, margin=dict(l=10,r=10,t=10,b=10), template="simple_white",
+                              legend=dict(orientation="h", y=1.1))
+            st.plotly_chart(fig, use_container_width=True)
+
+            tk = pf["tickers"]
+            viejos = tk.index[tk["fecha_precio"].isna() | (tk["fecha_precio"] < pd.Timestamp(date.today()) - pd.Timedelta(days=7))]
+            if len(viejos):
+                st.caption("⚠️ Sin precio reciente (se usa el último conocido): " + ", ".join(viejos))
+            st.dataframe(tk.assign(fecha_precio=tk["fecha_precio"].dt.date)
+                           .style.format({"titulos":"{:,.4g}","precio":simb_pf+"{:,.2f}",
+                                          "valor":simb_pf+"{:,.2f}","peso":"{:.1%}"}),
+                         use_container_width=True)
+            # el ledger en la moneda del portafolio: cada traspaso al tipo de su fecha
+            led_pf = ledger_vista if moneda_pf == MONEDA else ledger
+            neto_ledger = flujos_cuenta(led_pf).query("cuenta=='GBM'")["valor"].sum()
+            st.caption(f"Traspasos netos a GBM en el ledger: {simb_pf}{neto_ledger:,.2f} · "
+                       f"{len(precios):,} precios locales en `{RUTA_PRECIOS}`.")
+    with pb:
+        with st.form("form_operacion", clear_on_submit=True):
+            a,b,c = st.columns(3)
+            with a: fecha_o = st.date_input("Fecha", value=date.today())
+            with b: ticker_o = st.text_input("Ticker", "")
+            with c: oper_o = st.selectbox("Operación", ["Compra","Venta"])
+            a,b,c = st.columns(3)
+            with a: titulos_o = st.number_input("Títulos", min_value=0.0, step=1.0)
+            with b: precio_o = st.number_input("Precio", min_value=0.0, step=1.0)
+            with c: comision_o = st.number_input("Comisión", min_value=0.0, step=1.0)
+            nota_o = st.text_input("Nota", "")
+            if st.form_submit_button("Registrar operación"):
+                disp = titulos_disponibles(operaciones, ticker_o, fecha_o) if oper_o == "Venta" else np.inf
+                if not ticker_o.strip() or titulos_o <= 0 or precio_o <= 0:
+                    st.error("Ticker, títulos y precio son obligatorios.")
+                elif titulos_o > disp + 1e-9:
+                    st.error(f"Sólo hay {disp:,.4g} títulos de {ticker_o.strip().upper()} para vender al "
+                             f"{fecha_o:%d/%m/%Y} (contando las operaciones posteriores).")
+                else:
+                    registrar_operacion(fecha_o, ticker_o, oper_o, titulos_o, precio_o, comision_o, nota_o)
+                    st.success("✅ Operación registrada."); st.rerun()
+    with pc:
+        st.caption("CSV o Parquet con columnas fecha/date, ticker/symbol y precio/cierre/close. "
+                   "También sin abrir la app: `python portafolio.py importar precios.csv`")
+        arch_p = st.file_uploader("Archivo de precios", type=["csv","parquet"], key="precios_arch")
+        ticker_p = st.text_input("Ticker (si el archivo es de un solo activo)", "", key="precios_ticker")
+        if arch_p is not None and st.button("Importar precios"):
+            try:
+                n = importar_precios(normalizar_precios(leer_archivo(arch_p, arch_p.name), ticker_p.strip().upper() or None),
+                                     RUTA_PRECIOS)
+                st.success(f"✅ Histórico con {n:,} precios."); st.rerun()
+            except (ValueError, RuntimeError) as e:
+                st.error(str(e))
+
+
+# ============================================================
+#   💱 TIPOS DE CAMBIO (tabla diaria local)
+# ============================================================
+st.divider()
+st.markdown('<div class="section-title">💱 Tipos de cambio</div>', unsafe_allow_html=True)
+
+with st.expander(f"MXN por unidad de cada moneda · {len(TASAS):,} registros"):
+    if TASAS.empty:
+        st.info("Sin tipos de cambio: todo se muestra en MXN.")
+    else:
+        ult_fx = TASAS.groupby("moneda").agg(fecha=("fecha","max"), tasa=("tasa","last"), dias=("fecha","size"))
+        st.dataframe(ult_fx.assign(fecha=ult_fx["fecha"].dt.date), use_container_width=True)
+    fx_a, fx_b = st.tabs(["Importar archivo","Capturar tipo"])
+    with fx_a:
+        st.caption("CSV o Parquet con fecha, moneda y tasa/fix/close (MXN por unidad). "
+                   "También sin abrir la app: `python divisas.py importar fix.csv --moneda USD`")
+        arch_fx = st.file_uploader("Archivo de tipos de cambio", type=["csv","parquet"], key="tasas_arch")
+        moneda_fx = st.text_input("Moneda (si el archivo es de una sola)", "", key="tasas_moneda")
+        if arch_fx is not None and st.button("Importar tipos de cambio"):
+            try:
+                n = importar_tasas(normalizar_tasas(leer_archivo(arch_fx, arch_fx.name), moneda_fx.strip().upper() or None),
+                                   RUTA_TASAS)
+                st.success(f"✅ Tabla con {n:,} tipos de cambio."); st.rerun()
+            except (ValueError, RuntimeError) as e:
+                st.error(str(e))
+    with fx_b:
+        with st.form("form_tasa", clear_on_submit=True):
+            a,b,c = st.columns(3)
+            with a: fecha_fx = st.date_input("Fecha", value=date.today())
+            with b: mon_fx = st.text_input("Moneda", "USD")
+            with c: tasa_fx = st.number_input("MXN por unidad", min_value=0.0, step=0.01, format="%.4f")
+            if st.form_submit_button("Guardar tipo"):
+                if tasa_fx <= 0 or not mon_fx.strip():
+                    st.error("Moneda y tasa son obligatorias.")
+                else:
+                    importar_tasas(pd.DataFrame({"fecha": [fecha_fx], "moneda": [mon_fx], "tasa": [tasa_fx]}), RUTA_TASAS)
+                    st.success("✅ Tipo guardado."); st.rerun()
+
+
+# ============================================================
+#   ⬇️ EXPORTAR (CSV / Parquet / XLSX)
+# ============================================================
+st.divider()
+st.markdown('<div class="section-title">⬇️ Exportar</div>', unsafe_allow_html=True)
+
+import glob, tempfile
+from exportar import FORMATOS, PARQUET_OK, exportar
+
+EXPORT_PREFIJO = "finanzas_exp_"
+EXPORT_VIDA_MIN = 30      # un temporal más viejo que esto es de una sesión que ya no descargó
+
+def soltar_exportacion():
+    """Borra el archivo temporal de la exportación y lo olvida (tras descargar o al preparar otro)."""
+    previo = st.session_state.pop("exp_archivo", None)
+    if previo and os.path.exists(previo[1]):
+        os.remove(previo[1])
+
+def barrer_exportaciones():
+    """Borra los temporales de exportación de cualquier sesión con más de EXPORT_VIDA_MIN minutos.
+
+    `soltar_exportacion` sólo corre si se descarga o se prepara otro; si la sesión se
+    cierra antes, su archivo quedaría en disco para siempre.
+    """
+    limite = time.time() - EXPORT_VIDA_MIN * 60
+    for ruta in glob.glob(os.path.join(tempfile.gettempdir(), f"{EXPORT_PREFIJO}*")):
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:           # otra sesión lo borró primero
+            pass
+
+with st.expander("Descargar ledger o reportes"):
+    st.caption("También sin abrir la app: `python exportar.py ledger --formato parquet --salida ledger.parquet`")
+    x1, x2 = st.columns(2)
+    with x1:
+        que_exp = st.selectbox("Qué", ["ledger","mensual","semanal"], key="exp_que",
+                               format_func={"ledger":"Ledger completo (con saldos)",
+                                            "mensual":"Reporte mensual","semanal":"Reporte semanal"}.get)
+    with x2:
+        fmt_exp = st.selectbox("Formato", [f for f in FORMATOS if f!="parquet" or PARQUET_OK], key="exp_fmt")
+    if st.button("Preparar archivo"):
+        soltar_exportacion(); barrer_exportaciones()
+        # A disco, no a memoria: entre reruns la sesión sólo guarda la ruta, y el archivo se borra
+        # al descargarlo (o lo barre la siguiente exportación de cualquier sesión). download_button
+        # lo lee completo al servirlo de todos modos; la escritura por partes de exportar.py es
+        # lo que acota la memoria en la CLI.
+        fd, ruta_exp = tempfile.mkstemp(suffix=f".{fmt_exp}", prefix=EXPORT_PREFIJO)
+        os.close(fd)
+        try:
+            with st.spinner("Generando…"):
+                exportar(que_exp, fmt_exp, ruta_exp, gastos, traspasos, ingresos, get_saldos(), tasas=TASAS)
+        except ValueError as e:
+            os.remove(ruta_exp); st.error(f"💱 {e}")
+        else:
+            st.session_state.exp_archivo = (f"finanzas_{que_exp}_{date.today():%Y%m%d}.{fmt_exp}", ruta_exp,
+                                            FORMATOS[fmt_exp])
+    if st.session_state.get("exp_archivo"):
+        nombre, ruta_exp, mime = st.session_state.exp_archivo
+        if os.path.exists(ruta_exp):
+            with open(ruta_exp, "rb") as fh:
+                st.download_button(f"⬇️ {nombre} ({os.path.getsize(ruta_exp)/1024:,.0f} KB)", fh,
+                                   file_name=nombre, mime=mime, on_click=soltar_exportacion)
+        else:
+            st.session_state.pop("exp_archivo")
+
+
+# ============================================================
+#   📏 CAPACIDAD DEL LIBRO
+# ============================================================
+with st.expander("📏 Capacidad del libro y latencias"):
+    try:
+        resumen = json.loads(cfg_get("monitor_resumen", "") or "{}")
+    except ValueError:
+        resumen = {}
+    tot = resumen.get("total") or {}
+    if tot:
+        dl = tot.get("dias_limite")
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Celdas asignadas", f"{tot['celdas']:,.0f}", f"{tot['uso']:.1%} de {LIMITE_CELDAS:,}", delta_color="off")
+        m2.metric("Crecimiento", f"{tot['celdas_dia']:+,.0f} celdas/día")
+        m3.metric("Límite en", f"{dl:,.0f} días" if dl not in (None, float("inf")) else "—")
+        st.dataframe(pd.DataFrame(resumen.get("pestañas", [])), use_container_width=True, hide_index=True)
+    st.caption(f"Muestra diaria (última: {cfg_get('monitor_fecha', '—')}). "
+               f"Presupuestos: lectura {presupuesto_latencia()['lectura_ms']:,.0f} ms, "
+               f"escritura {presupuesto_latencia()['escritura_ms']:,.0f} ms "
+               "(claves `presupuesto_lectura_ms` / `presupuesto_escritura_ms` en Config).")
+    if st.button("Medir ahora"):
+        muestrear_capacidad(forzar=True); st.rerun()
+
+
 # ==========================
 #   Bottom nav (móvil)
 # ==========================
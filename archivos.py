@@ -0,0 +1,26 @@
+# archivos.py — lectura de archivos locales (CSV / Parquet) para los módulos sin interfaz
+#
+# No depende de ningún otro módulo del proyecto: precios (portafolio.py), tipos de
+# cambio (divisas.py) y exportaciones (exportar.py) lo usan sin importarse entre sí.
+from __future__ import annotations
+
+import pandas as pd
+
+# Parquet opcional (pyarrow ya viene con Streamlit, pero no en todos lados)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_OK = True
+except Exception:
+    pa = pq = None
+    PARQUET_OK = False
+
+
+def leer_archivo(ruta_o_archivo, nombre: str = "") -> pd.DataFrame:
+    """CSV o Parquet según la extensión de `nombre` (o de la ruta); acepta archivos subidos."""
+    nombre = (nombre or str(ruta_o_archivo)).lower()
+    if nombre.endswith(".parquet"):
+        if not PARQUET_OK:
+            raise RuntimeError("Para Parquet instala `pyarrow`.")
+        return pd.read_parquet(ruta_o_archivo)
+    return pd.read_csv(ruta_o_archivo)
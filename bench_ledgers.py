@@ -0,0 +1,163 @@
+# bench_ledgers.py — cómo escala un proceso al servir muchos libros
+#
+#   python bench_ledgers.py [--cache-mb 256] [--accesos 5000]
+#   python bench_ledgers.py --escenario app [--credenciales cuenta.json] [--escrituras 0.02]
+#
+# Simula N libros de tamaños distintos (Gastos/Traspasos/Ingresos sintéticos) y
+# un tráfico con popularidad tipo Zipf (pocos libros "calientes", muchos "fríos").
+# Mide memoria residente de la caché, tasa de aciertos, lecturas a Sheets que
+# se habrían hecho y latencia de consulta, para N = 1 … 50.
+#
+# El escenario "cache" mide sólo la política LRU (un valor por libro). El
+# escenario "app" repite lo que hace cada rerun de app.py: sonda de Versiones
+# (TTL corto), una entrada por (libro, pestaña, versión), huella por versión,
+# ledger unificado y el cliente del pool por cuenta de servicio; algunas
+# corridas escriben y suben la versión de Gastos. Cada N corre en un proceso
+# nuevo para que la memoria residente (RSS) sea sólo la suya.
+from __future__ import annotations
+
+import argparse, hashlib, json, os, resource, time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from ledgers import CacheLRU, ClientPool, SCOPES, tamano_bytes
+from movimientos import ledger_unificado
+
+CUENTAS = ["BBVA Concentradora","BBVA Credito","Apartados","GBM"]
+CATEGORIAS = ["Comida","Gasolina","Ocio","Servicios","Otro"]
+
+
+def libro_sintetico(filas: int, rng) -> tuple:
+    fechas = (pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 365*5, filas), unit="D")).date
+    g = pd.DataFrame({"ts": np.arange(filas), "fecha": fechas, "cuenta": rng.choice(CUENTAS, filas),
+                      "monto": rng.gamma(2, 150, filas).round(2), "categoria": rng.choice(CATEGORIAS, filas),
+                      "nota": ""})
+    t = g.iloc[: filas // 10].rename(columns={"cuenta": "cuenta_emisora", "categoria": "comentario"}) \
+         .assign(cuenta_receptora="Apartados").drop(columns="nota")
+    i = g.iloc[: filas // 8].copy()
+    cfg = pd.DataFrame({"clave": [f"saldo_{c}" for c in CUENTAS], "valor": "0"})
+    return cfg, g, t, i
+
+
+def correr(n_libros: int, cache_mb: int, accesos: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    filas = rng.integers(2_000, 40_000, n_libros)          # cada familiar con su historial
+    datos = {f"sheet{k}": libro_sintetico(int(f), rng) for k, f in enumerate(filas)}
+    total_mb = sum(tamano_bytes(v) for v in datos.values()) / 2**20
+
+    cache = CacheLRU(max_bytes=cache_mb * 2**20)
+    lecturas = 0
+    def loader(sid):
+        nonlocal lecturas
+        lecturas += 1
+        return datos[sid]
+
+    pesos = 1.0 / np.arange(1, n_libros + 1)               # Zipf s=1
+    trafico = rng.choice(list(datos), size=accesos, p=pesos / pesos.sum())
+    t0 = time.perf_counter()
+    for sid in trafico:
+        cache.get((sid, "tablas"), lambda sid=sid: loader(sid))
+    us = (time.perf_counter() - t0) / accesos * 1e6
+
+    st_ = cache.stats()
+    return {"libros": n_libros, "datos_MB": round(total_mb, 1), "cache_MB": round(st_["MB"], 1),
+            "en_cache": st_["libros"], "hit_rate": round(st_["hit_rate"], 3),
+            "lecturas_sheets": lecturas, "expulsiones": st_["expulsiones"], "us_por_acceso": round(us, 1)}
+
+
+# ==========================
+#   Escenario "app": las mismas llaves y entradas que app.py
+# ==========================
+PESTAÑAS = ["Config","Gastos","Traspasos","Ingresos"]
+
+
+def rss_mb() -> tuple:
+    """(RSS actual, pico) del proceso en MB; el actual sale de /proc (Linux) o queda NaN."""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024     # KB en Linux
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, pico
+    except OSError:
+        return float("nan"), pico
+
+
+def _huella(df: pd.DataFrame) -> str:
+    h = hashlib.blake2b(digest_size=8)
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def correr_app(n_libros: int, cache_mb: int, accesos: int, escrituras: float,
+               credenciales: str | None = None, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    filas = {f"sheet{k}": int(f) for k, f in enumerate(rng.integers(2_000, 40_000, n_libros))}
+    version = {(sid, t): 1 for sid in filas for t in PESTAÑAS}
+    rss0, _ = rss_mb()
+
+    # Pool real: los libros se reparten entre las cuentas de servicio del archivo (una o varias)
+    pool, cuentas = ClientPool(SCOPES), []
+    if credenciales:
+        with open(credenciales) as fh:
+            datos = json.load(fh)
+        cuentas = datos if isinstance(datos, list) else [datos]
+
+    cache = CacheLRU(max_bytes=cache_mb * 2**20)
+    lecturas = 0
+    def leer(sid, t):
+        # una "descarga": la tabla se arma de nuevo (como get_df), no se comparte con otra versión
+        nonlocal lecturas
+        lecturas += 1
+        v = version[(sid, t)]
+        libro = libro_sintetico(filas[sid], np.random.default_rng([int(sid[5:]), v]))
+        return libro[PESTAÑAS.index(t)]
+
+    pesos = 1.0 / np.arange(1, n_libros + 1)
+    trafico = rng.choice(list(filas), size=accesos, p=pesos / pesos.sum())
+    escribe = rng.random(accesos) < escrituras
+    t_acceso = np.empty(accesos)
+    for k, sid in enumerate(trafico):
+        t0 = time.perf_counter()
+        if cuentas:
+            pool.get(cuentas[int(sid[5:]) % len(cuentas)])
+        cache.get((sid, "versiones"), lambda: {t: version[(sid, t)] for t in PESTAÑAS}, ttl=2.0)
+        tablas = {t: cache.get((sid, t, version[(sid, t)]), lambda t=t: leer(sid, t)) for t in PESTAÑAS}
+        for t in ("Gastos","Traspasos","Ingresos"):
+            cache.get((sid, "huella", t, version[(sid, t)]), lambda t=t: _huella(tablas[t]))
+        ledger_unificado(tablas["Gastos"], tablas["Traspasos"], tablas["Ingresos"])
+        if escribe[k]:                  # guardar: sube la versión y descarta la sonda
+            version[(sid, "Gastos")] += 1
+            cache.quitar((sid, "versiones"))
+        t_acceso[k] = time.perf_counter() - t0
+
+    rss, pico = rss_mb()
+    st_ = cache.stats()
+    return {"libros": n_libros, "cache_MB": round(st_["MB"], 1), "entradas": st_["entradas"],
+            "hit_rate": round(st_["hit_rate"], 3), "lecturas_sheets": lecturas,
+            "expulsiones": st_["expulsiones"], "clientes": len(pool) if cuentas else "-",
+            "ms_p50": round(float(np.median(t_acceso)) * 1e3, 1),
+            "ms_p95": round(float(np.percentile(t_acceso, 95)) * 1e3, 1),
+            "rss_MB": round(rss - rss0, 1), "rss_pico_MB": round(pico, 1)}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Escalamiento de la caché con muchos libros")
+    ap.add_argument("--escenario", choices=["cache","app"], default="cache")
+    ap.add_argument("--cache-mb", type=int, default=256)
+    ap.add_argument("--accesos", type=int, default=None,
+                    help="Corridas simuladas (5000 en cache; 800 en app, que arma el ledger en cada una).")
+    ap.add_argument("--escrituras", type=float, default=0.02, help="Fracción de corridas que escriben (app).")
+    ap.add_argument("--credenciales", default=None,
+                    help="JSON de cuenta(s) de servicio para medir el ClientPool real (app; sin red).")
+    args = ap.parse_args()
+    args.accesos = args.accesos or (5000 if args.escenario == "cache" else 800)
+    if args.escenario == "cache":
+        filas = [correr(n, args.cache_mb, args.accesos) for n in (1, 5, 10, 25, 50)]
+    else:
+        filas = []
+        for n in (1, 5, 10, 25, 50):
+            with ProcessPoolExecutor(1, mp_context=mp.get_context("spawn")) as ex:
+                filas.append(ex.submit(correr_app, n, args.cache_mb, args.accesos, args.escrituras,
+                                       args.credenciales).result())
+    print(pd.DataFrame(filas).to_string(index=False))
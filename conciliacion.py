@@ -0,0 +1,49 @@
+# conciliacion.py — emparejar un estado de cuenta del banco con el ledger
+#
+# Ambos lados traen `fecha` y `monto` firmado desde la óptica de la cuenta. Un
+# renglón del estado y un movimiento se emparejan 1 a 1 si el monto coincide al
+# centavo y las fechas difieren a lo más `tolerancia_dias` (el banco aplica
+# cargos un par de días después de la compra).
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+def a_numero(serie: pd.Series) -> pd.Series:
+    """'$1,234.50' / '-1,234.50' / 1234.5 -> float (vectorizado)."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+    limpio = serie.astype(str).str.replace(r"[^0-9.\-]", "", regex=True)
+    return pd.to_numeric(limpio, errors="coerce")
+
+
+def conciliar(estado: pd.DataFrame, movs: pd.DataFrame, tolerancia_dias: int = 3):
+    """Empareja 1 a 1 renglones del estado con movimientos del ledger.
+
+    Ambos traen `fecha` y `monto` con signo desde la óptica de la cuenta. Se
+    empareja por monto exacto (en centavos) y fecha dentro de la tolerancia. Los
+    dos lados se ordenan por (monto, fecha) y se recorren una sola vez con dos
+    punteros —sin comparar todos contra todos—; con una ventana de ancho fijo,
+    tomar siempre el par más temprano posible da el máximo de emparejados.
+
+    Devuelve (pares, solo_estado, solo_ledger); `pares` trae los índices `eid`/`lid`.
+    """
+    e = estado.assign(key=np.round(estado["monto"]*100).astype("int64"), eid=np.arange(len(estado)))
+    l = movs.assign(key=np.round(movs["monto"]*100).astype("int64"), lid=np.arange(len(movs)))
+    es = e.sort_values(["key","fecha"]); ls = l.sort_values(["key","fecha"])
+    ek, ed, ei = es["key"].tolist(), es["fecha"].to_numpy("datetime64[D]").astype("int64").tolist(), es["eid"].tolist()
+    lk, ld, li = ls["key"].tolist(), ls["fecha"].to_numpy("datetime64[D]").astype("int64").tolist(), ls["lid"].tolist()
+    tol = int(tolerancia_dias)
+    pe, pl = [], []
+    i = j = 0
+    while i < len(ek) and j < len(lk):
+        if lk[j] < ek[i] or (lk[j]==ek[i] and ld[j] < ed[i]-tol):
+            j += 1          # movimiento sin pareja posible
+        elif lk[j] > ek[i] or ld[j] > ed[i]+tol:
+            i += 1          # renglón del estado sin pareja posible
+        else:
+            pe.append(ei[i]); pl.append(li[j]); i += 1; j += 1
+    pares = pd.DataFrame({"eid": pe, "lid": pl}, dtype="int64")
+    pares["dias"] = np.abs(e["fecha"].to_numpy()[pares["eid"]] - l["fecha"].to_numpy()[pares["lid"]]) // np.timedelta64(1, "D")
+    return pares, e[~e["eid"].isin(pares["eid"])], l[~l["lid"].isin(pares["lid"])]
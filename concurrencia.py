@@ -0,0 +1,109 @@
+# concurrencia.py — versiones por pestaña y fusión de escrituras entre dispositivos
+#
+# La pestaña "Versiones" guarda, por pestaña del libro:
+#   version      contador que sube en cada escritura desde la app
+#   reescritura  última versión que NO fue sólo agregar filas al final
+#   filas        filas de datos tras esa escritura
+# Leerla es una sola llamada chica: si nada cambió, la sesión reutiliza sus
+# tablas en caché. Si al escribir la versión remota ya no es la que se leyó,
+# se fusiona (base, nuestra, suya) por llave en lugar de pisar al otro.
+from __future__ import annotations
+
+import time
+
+import pandas as pd
+
+VERSIONES_COLS = ["pestaña","version","reescritura","filas","escritor","ts"]
+
+
+def parse_versiones(valores) -> dict:
+    """Filas de la pestaña Versiones (sin encabezado) -> {pestaña: {version, reescritura, filas}}."""
+    def num(v):
+        x = pd.to_numeric(str(v).strip() or "0", errors="coerce")
+        return 0 if pd.isna(x) else int(x)
+
+    out = {}
+    for fila in valores or []:
+        fila = list(fila) + [""] * (len(VERSIONES_COLS) - len(fila))
+        if not str(fila[0]).strip():
+            continue
+        out[str(fila[0]).strip()] = {"version": num(fila[1]), "reescritura": num(fila[2]),
+                                     "filas": num(fila[3]), "escritor": str(fila[4])}
+    return out
+
+
+def tabla_versiones(versiones: dict) -> pd.DataFrame:
+    return pd.DataFrame([{"pestaña": k, **{c: v.get(c, "") for c in VERSIONES_COLS[1:]}}
+                         for k, v in sorted(versiones.items())], columns=VERSIONES_COLS)
+
+
+def _llave(df: pd.DataFrame, llave) -> pd.Index:
+    cols = [llave] if isinstance(llave, str) else list(llave)
+    if len(cols) == 1:
+        return pd.Index(df[cols[0]].astype(str))
+    return pd.MultiIndex.from_frame(df[cols].astype(str))
+
+
+def solo_agrega(antes: pd.DataFrame, despues: pd.DataFrame) -> bool:
+    """¿`despues` es `antes` con filas agregadas al final (mismas columnas y contenido)?"""
+    if antes is None or antes.empty:
+        return True
+    if len(despues) < len(antes) or list(despues.columns[:len(antes.columns)]) != list(antes.columns):
+        return False
+    a = antes.astype(str).reset_index(drop=True)
+    d = despues.iloc[:len(antes)][list(antes.columns)].astype(str).reset_index(drop=True)
+    return bool(a.equals(d))
+
+
+def fusionar(base: pd.DataFrame, nuestra: pd.DataFrame, suya: pd.DataFrame, llave, sumar=None):
+    """Fusión de tres vías por `llave` (columna o lista de columnas).
+
+    Parte de `suya` (lo que hay en Sheets), le quita lo que borramos, le aplica
+    nuestras ediciones y agrega al final nuestras filas nuevas. `sumar=(columna,
+    prefijo)` marca las llaves cuyo valor es un acumulado (p. ej. saldos): ahí se
+    suma nuestra diferencia contra la base en lugar de reemplazar el valor.
+    Devuelve (tabla, n_ajenas) con n_ajenas = filas nuevas del otro dispositivo.
+    """
+    base = base if base is not None else nuestra.iloc[0:0]
+    kb, kn, ks = _llave(base, llave), _llave(nuestra, llave), _llave(suya, llave)
+    cols = list(nuestra.columns) + [c for c in suya.columns if c not in nuestra.columns]
+
+    borradas = kb.difference(kn)
+    nuevas   = ~kn.isin(kb) & ~kn.isin(ks)
+    comunes  = kn.isin(kb)
+
+    # Ediciones nuestras: filas comunes cuyo contenido cambió respecto a la base
+    bi = base.set_axis(kb).loc[lambda d: ~d.index.duplicated(keep="last")]
+    ni = nuestra.set_axis(kn)[comunes]
+    ni = ni[~ni.index.duplicated(keep="last")]
+    comp = [c for c in ni.columns if c in bi.columns]
+    editadas = ni[(ni[comp].astype(str) != bi.loc[ni.index, comp].astype(str)).any(axis=1)]
+
+    out = suya.set_axis(ks)
+    out = out[~out.index.isin(borradas)].reindex(columns=cols)
+    n_ajenas = int((~ks.isin(kb)).sum())
+
+    if sumar and not editadas.empty:
+        col, prefijo = sumar
+        acum = editadas.index.astype(str).str.startswith(prefijo) & editadas.index.isin(out.index)
+        if acum.any():
+            k = editadas.index[acum]
+            dif = pd.to_numeric(editadas.loc[k, col], errors="coerce").fillna(0.0) \
+                - pd.to_numeric(bi.loc[k, col], errors="coerce").fillna(0.0)
+            out.loc[k, col] = (pd.to_numeric(out.loc[k, col], errors="coerce").fillna(0.0) + dif).astype(str)
+            editadas = editadas[~acum]
+    ed = editadas[editadas.index.isin(out.index)]
+    if not ed.empty:
+        out.loc[ed.index, ed.columns] = ed.values
+
+    out = pd.concat([out, nuestra[nuevas].set_axis(kn[nuevas]).reindex(columns=cols)])
+    return out.reset_index(drop=True), n_ajenas
+
+
+def marcar(versiones: dict, pestaña: str, previo: pd.DataFrame, final: pd.DataFrame, escritor: str) -> dict:
+    """Nueva entrada de versión para `pestaña` tras escribir `final` encima de `previo`."""
+    r = versiones.get(pestaña, {"version": 0, "reescritura": 0, "filas": 0})
+    v = int(r["version"]) + 1
+    return {"version": v,
+            "reescritura": int(r["reescritura"]) if solo_agrega(previo, final) else v,
+            "filas": len(final), "escritor": escritor, "ts": int(time.time() * 1000)}
@@ -0,0 +1,151 @@
+# divisas.py — tipos de cambio diarios locales y conversión vectorizada
+#
+# Los saldos del libro (Config) están en la moneda base (MXN). Cada movimiento
+# puede traer su `moneda`; el ledger lo lleva a MXN con el tipo de cambio de su
+# fecha y la vista lo pasa a la moneda de reporte elegida. La tabla de tipos es
+# un archivo local (como los precios de GBM) que se importa a mano:
+#   python divisas.py importar fix.csv --moneda USD [--destino datos/tasas.parquet]
+from __future__ import annotations
+
+import argparse, os, sys
+
+import numpy as np
+import pandas as pd
+
+from archivos import PARQUET_OK, leer_archivo
+
+BASE = "MXN"
+MONEDAS = ["MXN","USD","EUR"]
+SIMBOLOS = {"MXN": "$", "USD": "US$", "EUR": "€"}
+TASAS_COLS = ["fecha","moneda","tasa"]
+TASAS_DEFAULT = os.path.join("datos", "tasas.parquet" if PARQUET_OK else "tasas.csv")
+
+_ALIAS = {"fecha": ["fecha","date","dia","día"],
+          "moneda": ["moneda","divisa","currency","codigo","código"],
+          "tasa": ["tasa","tipo_cambio","tipo de cambio","fix","rate","close","cierre"]}
+
+
+def simbolo(moneda: str) -> str:
+    return SIMBOLOS.get(moneda, f"{moneda} ")
+
+
+# ==========================
+#   Tabla local de tipos de cambio (MXN por unidad de `moneda`)
+# ==========================
+def normalizar_tasas(df: pd.DataFrame, moneda: str | None = None) -> pd.DataFrame:
+    cols = {str(c).strip().lower(): c for c in df.columns}
+    ren = {}
+    for dest, alias in _ALIAS.items():
+        src = next((cols[a] for a in alias if a in cols), None)
+        if src is not None:
+            ren[src] = dest
+    df = df.rename(columns=ren)
+    if "moneda" not in df.columns and moneda:
+        df["moneda"] = moneda
+    faltan = [c for c in TASAS_COLS if c not in df.columns]
+    if faltan:
+        raise ValueError(f"Faltan columnas en tipos de cambio: {', '.join(faltan)}")
+    out = pd.DataFrame({
+        "fecha":  pd.to_datetime(df["fecha"], errors="coerce", dayfirst=False).dt.normalize(),
+        "moneda": df["moneda"].astype(str).str.strip().str.upper(),
+        "tasa":   pd.to_numeric(df["tasa"], errors="coerce"),
+    })
+    return out[out["fecha"].notna() & (out["tasa"] > 0) & (out["moneda"] != BASE)].reset_index(drop=True)
+
+
+def leer_tasas(ruta: str) -> pd.DataFrame:
+    if not os.path.exists(ruta):
+        return pd.DataFrame({"fecha": pd.Series(dtype="datetime64[ns]"),
+                             "moneda": pd.Series(dtype=str), "tasa": pd.Series(dtype=float)})
+    return (normalizar_tasas(leer_archivo(ruta))
+            .sort_values(["moneda","fecha"], kind="stable").reset_index(drop=True))
+
+
+def importar_tasas(nuevas: pd.DataFrame, ruta: str) -> int:
+    """Agrega `nuevas` a la tabla local (lo importado gana en fechas repetidas). Devuelve filas totales."""
+    todo = pd.concat([leer_tasas(ruta), normalizar_tasas(nuevas)], ignore_index=True)
+    todo = (todo.drop_duplicates(["fecha","moneda"], keep="last")
+                .sort_values(["moneda","fecha"], kind="stable").reset_index(drop=True))
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    if ruta.lower().endswith(".parquet"):
+        todo.to_parquet(ruta, index=False)
+    else:
+        todo.to_csv(ruta, index=False)
+    return len(todo)
+
+
+def monedas_disponibles(tasas: pd.DataFrame) -> list:
+    """La base más las monedas con tipos importados: sin tabla no hay con qué convertir."""
+    return [BASE] + sorted(set(tasas["moneda"]) - {BASE})
+
+
+# ==========================
+#   Conversión (as-of por fecha, sin bucles por fila)
+# ==========================
+def _curva(tasas: pd.DataFrame, moneda: str):
+    """(fechas, tasas) de una moneda, ordenadas por fecha, para `searchsorted`."""
+    t = tasas[tasas["moneda"] == moneda]
+    f = t["fecha"].to_numpy("datetime64[ns]")
+    orden = np.argsort(f, kind="stable")
+    return f[orden], t["tasa"].to_numpy(dtype=float)[orden]
+
+
+def _asof(curva, fechas: np.ndarray) -> np.ndarray:
+    f, v = curva
+    if len(v) == 0:
+        return np.full(len(fechas), np.nan)
+    i = np.searchsorted(f, fechas, side="right") - 1
+    return np.where(i >= 0, v[np.maximum(i, 0)], np.nan)   # antes del primer dato: sin tipo
+
+
+def tasa_asof(fechas, monedas, tasas: pd.DataFrame) -> np.ndarray:
+    """MXN por unidad de `monedas[i]` vigente en `fechas[i]` (último tipo publicado ≤ fecha).
+
+    Un `searchsorted` por moneda (son pocas) sobre la tabla ordenada: es un
+    as-of join vectorizado. Moneda base = 1; moneda sin tabla o fecha anterior a su
+    primer dato = NaN (no se extrapola hacia atrás; quien llama decide). `monedas`
+    puede ser una sola moneda.
+    """
+    fechas = pd.DatetimeIndex(fechas).to_numpy("datetime64[ns]")
+    if isinstance(monedas, str):
+        return np.ones(len(fechas)) if monedas == BASE else _asof(_curva(tasas, monedas), fechas)
+    monedas = pd.Series(monedas, dtype=object).fillna("").astype(str).str.upper().replace("", BASE).to_numpy()
+    out = np.where(monedas == BASE, 1.0, np.nan)
+    for mon in set(tasas["moneda"]) & set(monedas):
+        m = monedas == mon
+        out[m] = _asof(_curva(tasas, mon), fechas[m])
+    return out
+
+
+def convertir(montos, monedas, fechas, destino: str, tasas: pd.DataFrame) -> np.ndarray:
+    """`montos` en `monedas` -> `destino`, cada uno al tipo de su fecha (vía MXN)."""
+    montos = np.asarray(montos, dtype=float)
+    a_base = tasa_asof(fechas, monedas, tasas)
+    if destino != BASE:
+        a_base = a_base / tasa_asof(fechas, destino, tasas)
+    return montos * a_base
+
+
+def a_moneda(led: pd.DataFrame, destino: str, tasas: pd.DataFrame) -> pd.DataFrame:
+    """Ledger (montos en MXN) re-expresado en `destino` al tipo de la fecha de cada movimiento."""
+    if destino == BASE or led.empty:
+        return led
+    return led.assign(monto=led["monto"].to_numpy() / tasa_asof(led["fecha"], destino, tasas))
+
+
+# ==========================
+#   Modo sin interfaz
+# ==========================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Importa tipos de cambio diarios a la tabla local.")
+    ap.add_argument("accion", choices=["importar"])
+    ap.add_argument("archivo", help="CSV o Parquet con fecha, moneda y tasa (MXN por unidad).")
+    ap.add_argument("--moneda", default=None, help="Para archivos de una sola moneda (p. ej. el FIX de Banxico).")
+    ap.add_argument("--destino", default=TASAS_DEFAULT)
+    args = ap.parse_args(argv)
+    n = importar_tasas(normalizar_tasas(leer_archivo(args.archivo), args.moneda), args.destino)
+    print(f"✅ {n:,} tipos de cambio en {args.destino}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
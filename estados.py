@@ -0,0 +1,271 @@
+# estados.py — estados de cuenta mensuales y anuales como archivos estáticos (HTML / XLSX)
+#
+# Sin interfaz (para cron o a mano):
+#   python estados.py [--libro Nombre] [--salida estados] [--formatos html,xlsx] [--procesos N] [--todo]
+#
+# Un estado por mes cerrado (`2025-09.html`) y uno por año (`2025.html`, con los
+# meses cerrados de ese año). El ledger se ordena y parte por mes UNA vez; saldos,
+# totales y categorías de todos los periodos salen de groupby sobre ese mismo
+# orden. Cada periodo lleva una huella de sus movimientos y saldos; en
+# `manifiesto.json` queda la última generada y sólo se regeneran los periodos
+# cuya huella cambió (o cuyo archivo falta). La escritura va en paralelo.
+from __future__ import annotations
+
+import argparse, hashlib, html, json, os, sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from divisas import TASAS_DEFAULT, leer_tasas
+from exportar import abrir_libro, leer_libro, saldos_de
+from movimientos import ledger_unificado, flujos_cuenta, reporte_periodos, exigir_tasas
+
+FORMATOS_ESTADO = ["html","xlsx"]
+MANIFIESTO = "manifiesto.json"
+VERSION_FORMATO = 1          # subirla cuando cambie el contenido: obliga a regenerar todo
+TOP_N = 10
+AHORRO = "Apartados"         # mismas reglas que los anillos de objetivos de la app
+OBJETIVOS_DEFAULT = {"objetivo_semana": 1500.0, "objetivo_ahorro_mes": 8500.0}
+_MESES = ["Enero","Febrero","Marzo","Abril","Mayo","Junio","Julio","Agosto",
+          "Septiembre","Octubre","Noviembre","Diciembre"]
+
+
+def objetivos_de(cfg: pd.DataFrame) -> dict:
+    """Objetivos de Config (MXN); lo que falte o no sea número toma el default de la app."""
+    out = dict(OBJETIVOS_DEFAULT)
+    if cfg.empty:
+        return out
+    v = dict(zip(cfg["clave"].astype(str), pd.to_numeric(cfg["valor"], errors="coerce")))
+    out.update({k: float(v[k]) for k in out if pd.notna(v.get(k))})
+    return out
+
+
+# ==========================
+#   Una pasada: partir, agregar y firmar todos los periodos
+# ==========================
+def _huella(*partes) -> str:
+    h = hashlib.sha1()
+    for p in partes:
+        h.update(p if isinstance(p, bytes) else json.dumps(p, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def periodos(led: pd.DataFrame, saldos: dict, objetivos: dict, hoy=None) -> dict:
+    """{clave: datos del estado} para cada mes cerrado y cada año con meses cerrados.
+
+    Saldo al cierre de un mes = saldo actual − flujos posteriores (acumulado
+    inverso por cuenta), así no depende de que el historial empiece en cero.
+    Los meses sin movimientos también tienen estado (saldos sin cambio).
+    ValueError si hay movimientos sin tipo de cambio (saldos y totales saldrían mal).
+    """
+    exigir_tasas(led)
+    mes_actual = pd.Timestamp(hoy or date.today()).to_period("M")
+    con_fecha = led[led["fecha"].notna()]
+    x = con_fecha[con_fecha["fecha"].dt.to_period("M") < mes_actual] \
+        .sort_values(["fecha","ts"], kind="stable").reset_index(drop=True)
+    if x.empty:
+        return {}
+    mes = x["fecha"].dt.to_period("M")
+    meses = pd.period_range(mes.iloc[0], mes_actual - 1, freq="M")
+    # filas [a, b) de cada mes en el ledger ordenado
+    ordinal = ((x["fecha"].dt.year - 1970) * 12 + x["fecha"].dt.month - 1).to_numpy()   # = Period("M").ordinal
+    cortes = np.searchsorted(ordinal, np.r_[meses.asi8, meses.asi8[-1] + 1])
+
+    # Saldos de cierre por (mes × cuenta), anclados en el saldo actual
+    fl = flujos_cuenta(con_fecha)
+    fl_mes = fl.groupby([fl["fecha"].dt.to_period("M").rename("mes"), "cuenta"])["valor"].sum().unstack(fill_value=0.0)
+    cuentas = sorted(set(fl_mes.columns) | set(saldos))
+    fl_mes = fl_mes.reindex(index=pd.period_range(min(fl_mes.index.min(), meses[0]),
+                                                  max(fl_mes.index.max(), mes_actual), freq="M"),
+                            columns=cuentas, fill_value=0.0)
+    actual = pd.Series({c: float(saldos.get(c, 0.0)) for c in cuentas})
+    cierre = actual - (fl_mes.iloc[::-1].cumsum().iloc[::-1] - fl_mes)   # después del mes
+    apertura = cierre - fl_mes
+
+    # Totales por tipo (reglas de reporte_periodos) y por categoría, todos los meses a la vez
+    rep = reporte_periodos(x, "M")
+    rep = rep.set_axis(rep.index.to_period("M")).reindex(meses, fill_value=0.0)
+    cat = x.groupby([mes.rename("mes"), "tipo", x["categoria"].fillna("").replace("", "(sin categoría)")])["monto"] \
+           .agg(["sum","count"])
+    vacio = cat.iloc[0:0].droplevel(0)
+    huellas = pd.util.hash_pandas_object(x, index=False).to_numpy()
+
+    out, por_anio = {}, {}
+    for m, a, b in zip(meses, cortes[:-1], cortes[1:]):
+        out[str(m)] = por_anio.setdefault(m.year, {})[str(m)] = {
+            "titulo": f"{_MESES[m.month - 1]} {m.year}", "desde": m.start_time, "hasta": m.end_time,
+            "meses": 1, "dias": m.days_in_month, "filas": (a, b),
+            "apertura": apertura.loc[m], "cierre": cierre.loc[m], "flujo": fl_mes.loc[m], "totales": rep.loc[m],
+            "categorias": cat.loc[m] if a < b else vacio,
+            "huella": _huella(VERSION_FORMATO, huellas[a:b].tobytes(), cierre.loc[m].round(2).to_dict(), objetivos),
+        }
+    for anio, ms in por_anio.items():
+        ms = list(ms.values())
+        out[str(anio)] = {
+            "titulo": f"Año {anio}", "desde": ms[0]["desde"], "hasta": ms[-1]["hasta"],
+            "meses": len(ms), "dias": sum(m["dias"] for m in ms), "filas": (ms[0]["filas"][0], ms[-1]["filas"][1]),
+            "apertura": ms[0]["apertura"], "cierre": ms[-1]["cierre"],
+            "flujo": sum(m["flujo"] for m in ms), "totales": sum(m["totales"] for m in ms),
+            "categorias": pd.concat([m["categorias"] for m in ms]).groupby(level=[0, 1]).sum(),
+            "huella": _huella(*[m["huella"] for m in ms]),
+        }
+    for p in out.values():
+        a, b = p.pop("filas")
+        p["movimientos"] = x.iloc[a:b]
+    return out
+
+
+# ==========================
+#   Contenido de un estado (lo que se escribe)
+# ==========================
+def tablas(p: dict, objetivos: dict) -> dict:
+    """Tablas del estado: resumen, saldos, objetivos, categorías y top de movimientos."""
+    saldos = pd.DataFrame({"apertura": p["apertura"], "movimientos": p["flujo"], "cierre": p["cierre"]})
+    saldos = saldos[(saldos != 0).any(axis=1)].rename_axis("cuenta").reset_index()
+    tot = p["totales"]
+    resumen = pd.DataFrame({"concepto": list(tot.index) + ["Neto (ingreso − gasto)"],
+                            "monto": list(tot.to_numpy(float)) + [float(tot.get("Ingreso", 0) - tot.get("Gasto", 0))]})
+    meta_gasto = objetivos["objetivo_semana"] * p["dias"] / 7
+    meta_ahorro = objetivos["objetivo_ahorro_mes"] * p["meses"]
+    ahorro = float(p["flujo"].get(AHORRO, 0.0))
+    metas = pd.DataFrame([
+        {"objetivo": "Gasto (objetivo semanal prorrateado)", "meta": meta_gasto, "real": float(tot.get("Gasto", 0)),
+         "cumplimiento": float(tot.get("Gasto", 0)) / meta_gasto if meta_gasto > 0 else np.nan,
+         "cumplido": float(tot.get("Gasto", 0)) <= meta_gasto},
+        {"objetivo": f"Ahorro neto en {AHORRO}", "meta": meta_ahorro, "real": ahorro,
+         "cumplimiento": ahorro / meta_ahorro if meta_ahorro > 0 else np.nan, "cumplido": ahorro >= meta_ahorro},
+    ])
+    cats = (p["categorias"].rename(columns={"sum": "monto", "count": "movimientos"}).reset_index()
+            .sort_values(["tipo","monto"], ascending=[True, False], kind="stable"))
+    mov = p["movimientos"]
+    cols = ["fecha","tipo","cuenta","cuenta_receptora","categoria","nota","monto"]
+    top = pd.concat([mov[mov["tipo"] == t].nlargest(TOP_N, "monto")[cols] for t in ("Gasto","Ingreso","Traspaso")],
+                    ignore_index=True)
+    top["fecha"] = top["fecha"].dt.date
+    return {"Resumen": resumen, "Saldos": saldos, "Objetivos": metas, "Categorías": cats,
+            "Top movimientos": top}
+
+
+_CSS = """body{font-family:system-ui,-apple-system,Segoe UI,Roboto,sans-serif;margin:32px;color:#1f2937}
+h1{margin:0 0 4px}h2{margin:28px 0 8px;font-size:18px}.sub{color:#6b7280;margin-bottom:16px}
+table{border-collapse:collapse;font-size:14px}th,td{padding:4px 10px;border-bottom:1px solid #e5e7eb;text-align:left}
+td.n{text-align:right;font-variant-numeric:tabular-nums}th{background:#f3f4f6}.neg{color:#b91c1c}"""
+
+
+def _html_tabla(df: pd.DataFrame) -> str:
+    filas = []
+    for r in df.itertuples(index=False, name=None):
+        celdas = []
+        for c, v in zip(df.columns, r):
+            if c == "cumplimiento":
+                celdas.append(f'<td class="n">{"—" if pd.isna(v) else f"{v:.0%}"}</td>')
+            elif isinstance(v, (bool, np.bool_)):
+                celdas.append(f"<td>{'✅' if v else '❌'}</td>")
+            elif isinstance(v, (int, np.integer)):
+                celdas.append(f'<td class="n">{v:,}</td>')
+            elif isinstance(v, (float, np.floating)):
+                celdas.append(f'<td class="n{" neg" if v < 0 else ""}">{"-" if v < 0 else ""}${abs(v):,.2f}</td>')
+            else:
+                celdas.append(f"<td>{html.escape('' if pd.isna(v) else str(v))}</td>")
+        filas.append("<tr>" + "".join(celdas) + "</tr>")
+    cab = "".join(f"<th>{html.escape(str(c))}</th>" for c in df.columns)
+    return f"<table><thead><tr>{cab}</tr></thead><tbody>{''.join(filas)}</tbody></table>"
+
+
+def escribir_html(ruta: str, p: dict, tbs: dict):
+    """Un solo archivo, sin recursos externos (CSS en línea)."""
+    cuerpo = "".join(f"<h2>{html.escape(n)}</h2>{_html_tabla(df)}" for n, df in tbs.items())
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(f"<!doctype html><html lang=\"es\"><head><meta charset=\"utf-8\"><title>{html.escape(p['titulo'])}"
+                f"</title><style>{_CSS}</style></head><body><h1>Estado de cuenta · {html.escape(p['titulo'])}</h1>"
+                f"<div class=\"sub\">{p['desde']:%d/%m/%Y} – {p['hasta']:%d/%m/%Y} · montos en MXN · "
+                f"{len(p['movimientos']):,} movimientos</div>{cuerpo}</body></html>")
+
+
+def escribir_xlsx(ruta: str, p: dict, tbs: dict):
+    """Una hoja por tabla más "Movimientos"; openpyxl en modo sólo escritura, como `exportar.escribir`."""
+    from openpyxl import Workbook
+    mov = p["movimientos"].assign(fecha=p["movimientos"]["fecha"].dt.date)
+    wb = Workbook(write_only=True)
+    for nombre, df in [*tbs.items(), ("Movimientos", mov)]:
+        ws = wb.create_sheet(nombre[:31])
+        ws.append(list(map(str, df.columns)))
+        for fila in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+            ws.append(fila)
+    wb.save(ruta)
+
+
+def generar(clave: str, p: dict, objetivos: dict, salida: str, formatos) -> str:
+    """Escribe un periodo (corre en un proceso aparte)."""
+    tbs = tablas(p, objetivos)
+    for fmt in formatos:
+        (escribir_html if fmt == "html" else escribir_xlsx)(os.path.join(salida, f"{clave}.{fmt}"), p, tbs)
+    return clave
+
+
+# ==========================
+#   Lote incremental
+# ==========================
+def leer_manifiesto(salida: str) -> dict:
+    try:
+        with open(os.path.join(salida, MANIFIESTO), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def pendientes(per: dict, manifiesto: dict, salida: str, formatos) -> list:
+    """Periodos cuya huella cambió, que no estaban, o a los que les falta algún archivo."""
+    return [k for k, p in per.items()
+            if manifiesto.get(k) != p["huella"]
+            or not all(os.path.exists(os.path.join(salida, f"{k}.{f}")) for f in formatos)]
+
+
+def generar_estados(led: pd.DataFrame, saldos: dict, objetivos: dict, salida: str, formatos=FORMATOS_ESTADO,
+                    procesos: int | None = None, todo: bool = False, hoy=None) -> tuple[list, int]:
+    """Genera lo que haga falta; devuelve (periodos regenerados, periodos al día sin tocar)."""
+    os.makedirs(salida, exist_ok=True)
+    per = periodos(led, saldos, objetivos, hoy)
+    man = {} if todo else leer_manifiesto(salida)
+    hacer = pendientes(per, man, salida, formatos)
+    procesos = procesos or os.cpu_count() or 1
+    if procesos > 1 and len(hacer) > 1:
+        with ProcessPoolExecutor(max_workers=min(procesos, len(hacer))) as ex:
+            hechos = list(ex.map(generar, hacer, [per[k] for k in hacer], [objetivos] * len(hacer),
+                                 [salida] * len(hacer), [list(formatos)] * len(hacer)))
+    else:
+        hechos = [generar(k, per[k], objetivos, salida, formatos) for k in hacer]
+    # Manifiesto al final: si algo falla a medias, la siguiente corrida lo vuelve a intentar
+    with open(os.path.join(salida, MANIFIESTO), "w", encoding="utf-8") as f:
+        json.dump({k: p["huella"] for k, p in per.items()}, f, indent=1, sort_keys=True)
+    return hechos, len(per) - len(hechos)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Genera estados de cuenta mensuales y anuales (HTML/XLSX).")
+    ap.add_argument("--salida", default="estados")
+    ap.add_argument("--formatos", default=",".join(FORMATOS_ESTADO), help="html, xlsx o ambos separados por coma.")
+    ap.add_argument("--procesos", type=int, default=None, help="Procesos en paralelo (por defecto, uno por CPU).")
+    ap.add_argument("--todo", action="store_true", help="Regenera todos los periodos aunque no hayan cambiado.")
+    ap.add_argument("--libro", default=None, help="Nombre en [ledgers]; por defecto el primero.")
+    ap.add_argument("--secrets", default=".streamlit/secrets.toml")
+    ap.add_argument("--tasas", default=None, help="Tipos de cambio locales (por defecto los de divisas.py).")
+    args = ap.parse_args(argv)
+    formatos = [f.strip() for f in args.formatos.split(",") if f.strip()]
+    if not formatos or set(formatos) - set(FORMATOS_ESTADO):
+        ap.error(f"--formatos: usa {', '.join(FORMATOS_ESTADO)}")
+
+    cfg, g, t, i = leer_libro(abrir_libro(args.secrets, args.libro))
+    led = ledger_unificado(g, t, i, leer_tasas(args.tasas or TASAS_DEFAULT))
+    try:
+        hechos, igual = generar_estados(led, saldos_de(cfg), objetivos_de(cfg), args.salida, formatos,
+                                        args.procesos, args.todo)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    print(f"✅ {len(hechos)} estados generados, {igual} sin cambios → {args.salida}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# exportar.py — exportación por partes del ledger y de los reportes (CSV / Parquet / XLSX)
+#
+# Desde la app: botón "Exportar". Sin interfaz:
+#   python exportar.py ledger  --formato parquet --salida ledger.parquet [--libro Nombre]
+#   python exportar.py mensual --formato xlsx    --salida reporte.xlsx
+#
+# El ledger se arma una sola vez en memoria; cada formato lo escribe en bloques de
+# `filas_por_parte` filas, así la memoria extra no crece con el historial. Eso es lo
+# que importa en la CLI (escribe directo a `--salida`); en la app el archivo va a un
+# temporal, pero st.download_button lo carga completo para servirlo.
+from __future__ import annotations
+
+import argparse, io, sys
+import pandas as pd
+
+from archivos import PARQUET_OK, pa, pq
+from divisas import TASAS_DEFAULT, leer_tasas
+from ledgers import SCOPES, ClientPool, ledgers_configurados
+from movimientos import ledger_unificado, con_saldos, reporte_periodos, exigir_tasas
+
+FORMATOS = {"csv": "text/csv",
+            "parquet": "application/vnd.apache.parquet",
+            "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+FILAS_XLSX = 1_048_575   # límite de Excel por hoja (sin encabezado)
+
+
+
+def _partes(frames, filas_por_parte):
+    """Bloques de filas; si hay varios frames alineados se unen por columnas sólo bloque a bloque."""
+    n = len(frames[0])
+    for i in range(0, max(n, 1), filas_por_parte):
+        yield pd.concat([f.iloc[i:i + filas_por_parte] for f in frames], axis=1)
+
+
+def escribir(frames, destino, formato: str, filas_por_parte: int = 50_000, hoja: str = "Movimientos"):
+    """Escribe `frames` (uno o varios DataFrames alineados por índice) en `destino`.
+
+    `destino` es una ruta o un archivo binario (p. ej. BytesIO para descargar).
+    """
+    frames = frames if isinstance(frames, (list, tuple)) else [frames]
+    partes = _partes(frames, filas_por_parte)
+
+    if formato == "csv":
+        fh = open(destino, "wb") if isinstance(destino, str) else destino
+        txt = io.TextIOWrapper(fh, encoding="utf-8", newline="")
+        for j, parte in enumerate(partes):
+            parte.to_csv(txt, index=False, header=(j == 0))
+        txt.flush(); txt.detach()
+        if isinstance(destino, str): fh.close()
+
+    elif formato == "parquet":
+        if not PARQUET_OK:
+            raise RuntimeError("Para Parquet instala `pyarrow`.")
+        writer = None
+        for parte in partes:
+            if writer is None:
+                tabla = pa.Table.from_pandas(parte, preserve_index=False)
+                writer = pq.ParquetWriter(destino, tabla.schema)
+            else:
+                tabla = pa.Table.from_pandas(parte, schema=writer.schema, preserve_index=False)
+            writer.write_table(tabla)
+        writer.close()
+
+    elif formato == "xlsx":
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)   # filas directo a disco, memoria constante
+        ws, filas_hoja, n_hoja, columnas = None, FILAS_XLSX, 0, []
+        for parte in partes:
+            columnas = list(map(str, parte.columns))
+            parte = parte.astype(object).where(parte.notna(), None)
+            for fila in parte.itertuples(index=False, name=None):
+                if filas_hoja >= FILAS_XLSX:
+                    n_hoja += 1
+                    ws = wb.create_sheet(hoja if n_hoja == 1 else f"{hoja} ({n_hoja})")
+                    ws.append(columnas)
+                    filas_hoja = 0
+                ws.append(fila)
+                filas_hoja += 1
+        if ws is None:
+            wb.create_sheet(hoja).append(columnas)
+        wb.save(destino)
+
+    else:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+
+def ledger_exportable(g, t, i, saldos: dict, tasas: pd.DataFrame | None = None):
+    """(ledger, saldos derivados) listos para `escribir`; los saldos van aparte para no copiar el ledger."""
+    led = ledger_unificado(g, t, i, tasas).sort_values(["fecha","ts"], kind="stable").reset_index(drop=True)
+    exigir_tasas(led)
+    return [led, con_saldos(led, saldos)]
+
+
+def exportar(que: str, formato: str, destino, g, t, i, saldos: dict, filas_por_parte: int = 50_000,
+             tasas: pd.DataFrame | None = None):
+    """que = "ledger" | "mensual" | "semanal"; montos en MXN (`monto_orig`/`moneda` conservan lo capturado).
+
+    ValueError si hay movimientos sin tipo de cambio, antes de escribir nada.
+    """
+    if que == "ledger":
+        frames, hoja = ledger_exportable(g, t, i, saldos, tasas), "Movimientos"
+    else:
+        led = ledger_unificado(g, t, i, tasas)
+        exigir_tasas(led)
+        rep = reporte_periodos(led, "W" if que == "semanal" else "M")
+        frames, hoja = [rep.reset_index()], ("Semanas" if que == "semanal" else "Meses")
+    escribir(frames, destino, formato, filas_por_parte, hoja=hoja)
+
+
+# ==========================
+#   Modo sin interfaz
+# ==========================
+def leer_libro(sh):
+    """Config y las tres pestañas de movimientos en UNA llamada (values:batchGet)."""
+    titulos = ["Config","Gastos","Traspasos","Ingresos"]
+    resp = sh.values_batch_get([f"'{t}'" for t in titulos])
+    tablas = []
+    for vr in resp.get("valueRanges", []):
+        vals = vr.get("values", [])
+        if not vals:
+            tablas.append(pd.DataFrame()); continue
+        cols = [str(c).strip() for c in vals[0]]
+        filas = [r + [""] * (len(cols) - len(r)) for r in vals[1:]]
+        df = pd.DataFrame(filas, columns=cols)
+        df = df[(df != "").any(axis=1)].reset_index(drop=True)
+        if "monto" in df.columns:
+            df["monto"] = pd.to_numeric(df["monto"], errors="coerce").fillna(0.0)
+        tablas.append(df)
+    return tuple(tablas)
+
+
+def saldos_de(cfg: pd.DataFrame) -> dict:
+    if cfg.empty:
+        return {}
+    s = cfg[cfg["clave"].astype(str).str.startswith("saldo_")]
+    return dict(zip(s["clave"].str.slice(len("saldo_")), pd.to_numeric(s["valor"], errors="coerce").fillna(0.0)))
+
+
+def abrir_libro(secrets_path: str, libro: str | None = None):
+    import tomllib
+    with open(secrets_path, "rb") as f:
+        secrets = tomllib.load(f)
+    libros = ledgers_configurados(secrets)
+    if not libros:
+        raise SystemExit("Falta SHEET_ID (o [ledgers]) en " + secrets_path)
+    if libro and libro not in libros:
+        raise SystemExit(f"No existe el libro {libro!r}; opciones: {', '.join(libros)}")
+    sheet_id = libros[libro] if libro else next(iter(libros.values()))
+    return ClientPool(SCOPES).get(dict(secrets["gcp_service_account"])).open_by_key(sheet_id)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Exporta el ledger o los reportes sin abrir la app.")
+    ap.add_argument("que", choices=["ledger","mensual","semanal"])
+    ap.add_argument("--formato", choices=list(FORMATOS), default="csv")
+    ap.add_argument("--salida", required=True)
+    ap.add_argument("--libro", default=None, help="Nombre en [ledgers]; por defecto el primero.")
+    ap.add_argument("--secrets", default=".streamlit/secrets.toml")
+    ap.add_argument("--filas-por-parte", type=int, default=50_000)
+    ap.add_argument("--tasas", default=None, help="Tipos de cambio locales (por defecto los de divisas.py).")
+    args = ap.parse_args(argv)
+
+    cfg, g, t, i = leer_libro(abrir_libro(args.secrets, args.libro))
+    try:
+        exportar(args.que, args.formato, args.salida, g, t, i, saldos_de(cfg), args.filas_por_parte,
+                 tasas=leer_tasas(args.tasas or TASAS_DEFAULT))
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    print(f"✅ {args.que} → {args.salida}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
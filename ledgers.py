@@ -0,0 +1,129 @@
+# ledgers.py — varios libros (SHEET_IDs) servidos desde un mismo proceso
+from __future__ import annotations
+
+import sys, time, threading
+from collections import OrderedDict
+
+import pandas as pd
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+def ledgers_configurados(secrets) -> dict:
+    """{nombre: SHEET_ID} desde la tabla `[ledgers]` de secrets.
+
+    Si no existe, se usa el `SHEET_ID` único de siempre con el nombre "Principal".
+    """
+    libros = dict(secrets.get("ledgers", {}) or {})
+    if not libros and "SHEET_ID" in secrets:
+        libros = {"Principal": secrets["SHEET_ID"]}
+    return {str(k): str(v) for k, v in libros.items()}
+
+
+class ClientPool:
+    """Un cliente gspread autorizado por service account, compartido por todos los libros.
+
+    Autorizar cuesta un intercambio de tokens; el cliente (y su sesión HTTP) se
+    reutiliza entre sesiones y libros, así agregar un libro no agrega clientes.
+    """
+
+    def __init__(self, scopes):
+        self.scopes = list(scopes)
+        self._clientes = {}
+        self._lock = threading.Lock()
+
+    def get(self, info: dict):
+        import gspread
+        from google.oauth2.service_account import Credentials
+
+        key = info.get("client_email") or info.get("private_key_id")
+        with self._lock:
+            if key not in self._clientes:
+                creds = Credentials.from_service_account_info(info, scopes=self.scopes)
+                self._clientes[key] = gspread.authorize(creds)
+            return self._clientes[key]
+
+    def __len__(self):
+        return len(self._clientes)
+
+
+def tamano_bytes(valor) -> int:
+    """Memoria aproximada de un valor cacheado (DataFrames con `deep=True`)."""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(index=True, deep=True))
+    if isinstance(valor, (tuple, list)):
+        return sum(tamano_bytes(v) for v in valor)
+    if isinstance(valor, dict):
+        return sum(tamano_bytes(v) for v in valor.values())
+    return sys.getsizeof(valor)
+
+
+class CacheLRU:
+    """Caché por libro acotada en bytes, con expulsión LRU y TTL opcional.
+
+    Las llaves son tuplas cuyo primer elemento es el SHEET_ID, para poder
+    invalidar un libro sin tocar a los demás. La carga (`loader`) corre fuera
+    del candado: una lectura lenta de Sheets no bloquea a otros libros.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float | None = None):
+        self.max_bytes = int(max_bytes)
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = self.misses = self.expulsiones = 0
+        self._d = OrderedDict()   # key -> (t_carga, bytes, valor)
+        self._lock = threading.RLock()
+
+    def _quitar(self, key):
+        item = self._d.pop(key, None)
+        if item:
+            self.bytes -= item[1]
+
+    def get(self, key, loader, ttl: float | None = None):
+        """`ttl` permite una vida más corta para llaves baratas (p. ej. la sonda de versiones)."""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            item = self._d.get(key)
+            if item and (ttl is None or time.monotonic() - item[0] < ttl):
+                self._d.move_to_end(key)
+                self.hits += 1
+                return item[2]
+        valor = loader()
+        size = tamano_bytes(valor)
+        with self._lock:
+            self.misses += 1
+            self._quitar(key)
+            if size <= self.max_bytes:
+                self._d[key] = (time.monotonic(), size, valor)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    viejo = next(iter(self._d))
+                    self._quitar(viejo)
+                    self.expulsiones += 1
+        return valor
+
+    def quitar(self, key):
+        with self._lock:
+            self._quitar(key)
+
+    def invalidar(self, sheet_id):
+        """Descarta todo lo cacheado de un libro."""
+        with self._lock:
+            for k in [k for k in self._d if k[0] == sheet_id]:
+                self._quitar(k)
+
+    def stats(self) -> dict:
+        with self._lock:
+            libros = {k[0] for k in self._d}
+            total = self.hits + self.misses
+            return {
+                "libros": len(libros), "entradas": len(self._d),
+                "MB": self.bytes / 2**20, "max_MB": self.max_bytes / 2**20,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "expulsiones": self.expulsiones,
+            }
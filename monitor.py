@@ -0,0 +1,120 @@
+# monitor.py — capacidad del libro: celdas, filas y latencias a lo largo del tiempo
+#
+# Una muestra diaria por pestaña (pestaña "Monitor") con lo que ya se sabe sin
+# descargar nada extra: tamaño de la cuadrícula (metadatos, una llamada), filas
+# de datos y bytes de lo ya leído, y cuánto tardaron las lecturas/escrituras.
+# Con el historial se proyecta cuándo se llega al límite de celdas de Google
+# Sheets o al presupuesto de latencia por pestaña.
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+LIMITE_CELDAS = 10_000_000          # límite de Google Sheets por archivo
+MONITOR_COLS = ["fecha","pestaña","filas_grid","cols_grid","celdas",
+                "filas_datos","bytes","lectura_ms","escritura_ms"]
+CAMPOS_METADATOS = "sheets.properties(title,gridProperties(rowCount,columnCount))"
+
+
+@contextmanager
+def medir(metricas: dict, llave, op: str):
+    """Guarda en `metricas[llave][op]` los ms que tarda el bloque (op = "lectura_ms" | "escritura_ms").
+
+    La app usa llave = (libro, pestaña); `muestras` recibe ya las de un solo libro por pestaña.
+    """
+    t0 = time.perf_counter()
+    yield                     # si la llamada falla no se registra: el reintento medirá la buena
+    metricas.setdefault(llave, {})[op] = round((time.perf_counter() - t0) * 1000, 1)
+
+
+def muestras(meta: dict, hoy: date, filas_datos: dict, metricas: dict) -> pd.DataFrame:
+    """Una fila por pestaña a partir de `fetch_sheet_metadata` (sin datos de celdas)."""
+    filas = []
+    for s in meta.get("sheets", []):
+        p = s.get("properties", {})
+        gp = p.get("gridProperties", {})
+        t = p.get("title", "")
+        m = metricas.get(t, {})
+        r, c = int(gp.get("rowCount", 0)), int(gp.get("columnCount", 0))
+        filas.append({"fecha": hoy.isoformat(), "pestaña": t, "filas_grid": r, "cols_grid": c,
+                      "celdas": r * c, "filas_datos": filas_datos.get(t, np.nan),
+                      "bytes": m.get("bytes", np.nan), "lectura_ms": m.get("lectura_ms", np.nan),
+                      "escritura_ms": m.get("escritura_ms", np.nan)})
+    return pd.DataFrame(filas, columns=MONITOR_COLS)
+
+
+def _pendientes(df: pd.DataFrame, grupo: str, x: str, y: str) -> pd.Series:
+    """Pendiente de mínimos cuadrados de y contra x por grupo (cov/var, sin bucles)."""
+    d = df[[grupo, x, y]].dropna()
+    g = d.groupby(grupo)
+    dx = d[x] - g[x].transform("mean")
+    dy = d[y] - g[y].transform("mean")
+    num = (dx * dy).groupby(d[grupo]).sum()
+    den = (dx * dx).groupby(d[grupo]).sum()
+    return (num / den.where(den > 0)).fillna(0.0)
+
+
+def proyectar(hist: pd.DataFrame, hoy: date, presupuesto: dict,
+              limite_celdas: int = LIMITE_CELDAS, horizonte: int = 90, dias_hist: int = 90):
+    """(resumen por pestaña, total del libro, alertas) a partir del historial de muestras.
+
+    Crecimiento = pendiente lineal de los últimos `dias_hist` días. La latencia se
+    modela como a + b·filas por pestaña; con el ritmo de filas/día se estima
+    cuándo cruza `presupuesto` ({"lectura_ms": .., "escritura_ms": ..}).
+    Se alerta lo que ya se pasó o se pasaría dentro de `horizonte` días.
+    """
+    h = hist.copy()
+    h["fecha"] = pd.to_datetime(h["fecha"], errors="coerce")
+    for c in MONITOR_COLS[2:]:
+        h[c] = pd.to_numeric(h[c], errors="coerce")
+    hoy_ = pd.Timestamp(hoy)
+    h = h[h["fecha"].notna() & (h["fecha"] >= hoy_ - pd.Timedelta(days=dias_hist))]
+    h = h.sort_values("fecha", kind="stable")    # el historial se concatena; "últimas 7" es por fecha
+    if h.empty:
+        return pd.DataFrame(), {}, []
+    h["dia"] = (h["fecha"] - hoy_).dt.days.astype(float)
+
+    # ---- Libro completo: celdas asignadas vs límite
+    tot = h.groupby("dia", as_index=False)["celdas"].sum().assign(libro="libro")
+    celdas_dia = float(_pendientes(tot, "libro", "dia", "celdas").get("libro", 0.0))
+    celdas = float(tot["celdas"].iloc[-1])
+    dias_limite = (limite_celdas - celdas) / celdas_dia if celdas_dia > 0 else np.inf
+    total = {"celdas": celdas, "uso": celdas / limite_celdas,
+             "celdas_dia": celdas_dia, "dias_limite": dias_limite}
+
+    # ---- Por pestaña: filas/día y latencia proyectada
+    ult = h.groupby("pestaña").last()
+    res = pd.DataFrame({"filas_datos": ult["filas_datos"], "celdas": ult["celdas"],
+                        "filas_dia": _pendientes(h, "pestaña", "dia", "filas_datos")})
+    res["filas_dia"] = res["filas_dia"].reindex(ult.index).fillna(0.0)
+    for op in ("lectura_ms", "escritura_ms"):
+        ms_fila = _pendientes(h, "pestaña", "filas_datos", op).reindex(ult.index).fillna(0.0).clip(lower=0.0)
+        recientes = h.dropna(subset=[op]).groupby("pestaña")[op].apply(lambda s: s.tail(7).median())
+        res[op] = recientes.reindex(ult.index)
+        ritmo = ms_fila * res["filas_dia"]                       # ms que se agregan por día
+        falta = presupuesto.get(op, np.inf) - res[op]
+        res[f"dias_{op}"] = np.where(falta <= 0, 0.0,
+                                     np.where(ritmo > 0, falta / ritmo.where(ritmo > 0), np.inf))
+        res.loc[res[op].isna(), f"dias_{op}"] = np.inf
+
+    alertas = []
+    if total["uso"] >= 0.8:
+        alertas.append(f"El libro usa {total['uso']:.0%} del límite de {limite_celdas:,} celdas.")
+    elif dias_limite <= horizonte:
+        alertas.append(f"Al ritmo actual (+{celdas_dia:,.0f} celdas/día) el libro llega al límite "
+                       f"de celdas hacia el {hoy_ + pd.Timedelta(days=int(dias_limite)):%d/%m/%Y}.")
+    nombres = {"lectura_ms": "leer", "escritura_ms": "escribir"}
+    for pest, r in res.iterrows():
+        for op, verbo in nombres.items():
+            d, ms = r[f"dias_{op}"], r[op]
+            if d == 0:
+                alertas.append(f"{verbo.capitalize()} '{pest}' ya tarda ~{ms/1000:.1f} s "
+                               f"(presupuesto {presupuesto[op]/1000:.1f} s).")
+            elif d <= horizonte:
+                alertas.append(f"{verbo.capitalize()} '{pest}' pasaría de {presupuesto[op]/1000:.1f} s "
+                               f"hacia el {hoy_ + pd.Timedelta(days=int(d)):%d/%m/%Y}.")
+    return res, total, alertas
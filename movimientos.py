@@ -0,0 +1,169 @@
+# movimientos.py — ledger unificado y cálculos vectorizados sin dependencia de Streamlit
+# (los usa app.py y también los comandos sin interfaz, p. ej. exportar.py)
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from divisas import BASE as MONEDA_BASE, tasa_asof
+
+LEDGER_COLS = ["tipo","ts","fecha","cuenta","cuenta_receptora","categoria","monto","nota",
+               "moneda","monto_orig","tasa"]
+
+def ledger_unificado(g, t, i, tasas: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Une Gastos/Traspasos/Ingresos en una sola tabla tipada (sin iterrows).
+
+    En traspasos `cuenta` es la emisora y `categoria` el comentario. Cada pestaña
+    puede traer `moneda` (vacía = MXN) y `tasa`: los MXN por unidad con que se
+    ajustó el saldo al capturar. `monto_orig` conserva lo capturado y `monto`
+    queda en MXN con esa misma `tasa`, así borrar/editar revierte exactamente lo
+    que se sumó. Sólo las filas sin `tasa` (anteriores a la columna o escritas a
+    mano) toman el tipo de su fecha de `tasas` (as-of vectorizado). Si tampoco
+    hay tipo, `tasa` y `monto` quedan NaN: no se inventa un 1:1 (ver `sin_tasa`).
+    """
+    partes = []
+    if g is not None and not g.empty:
+        partes.append(pd.DataFrame({
+            "tipo": "Gasto", "ts": g["ts"], "fecha": g["fecha"], "cuenta": g["cuenta"],
+            "cuenta_receptora": "", "categoria": g.get("categoria", ""),
+            "monto": g["monto"], "nota": g.get("nota", ""), "moneda": g.get("moneda", ""),
+            "tasa": g.get("tasa", np.nan),
+        }))
+    if t is not None and not t.empty:
+        partes.append(pd.DataFrame({
+            "tipo": "Traspaso", "ts": t["ts"], "fecha": t["fecha"], "cuenta": t["cuenta_emisora"],
+            "cuenta_receptora": t["cuenta_receptora"], "categoria": t.get("comentario", ""),
+            "monto": t["monto"], "nota": "", "moneda": t.get("moneda", ""),
+            "tasa": t.get("tasa", np.nan),
+        }))
+    if i is not None and not i.empty:
+        partes.append(pd.DataFrame({
+            "tipo": "Ingreso", "ts": i["ts"], "fecha": i["fecha"], "cuenta": i["cuenta"],
+            "cuenta_receptora": "", "categoria": i.get("categoria", ""),
+            "monto": i["monto"], "nota": i.get("nota", ""), "moneda": i.get("moneda", ""),
+            "tasa": i.get("tasa", np.nan),
+        }))
+    if not partes:
+        return pd.DataFrame(columns=LEDGER_COLS).astype({"ts":"int64", "fecha":"datetime64[ns]",
+                                                         "monto":float, "monto_orig":float, "tasa":float})
+    led = pd.concat(partes, ignore_index=True)
+    led["ts"]    = pd.to_numeric(led["ts"], errors="coerce").fillna(0).astype("int64")
+    led["fecha"] = pd.to_datetime(led["fecha"], errors="coerce").dt.normalize()
+    led["monto_orig"] = pd.to_numeric(led["monto"], errors="coerce").fillna(0.0).astype(float)
+    for c in ["cuenta","cuenta_receptora","categoria","nota","moneda"]:
+        led[c] = led[c].fillna("").astype(str).replace("nan", "")
+    led["moneda"] = led["moneda"].str.strip().str.upper().replace("", MONEDA_BASE)
+    ajenas = (led["moneda"] != MONEDA_BASE).to_numpy()
+    tasa = pd.to_numeric(led["tasa"], errors="coerce").to_numpy(dtype=float)
+    tasa[~ajenas] = 1.0
+    falta = ajenas & ~(tasa > 0)
+    if falta.any() and tasas is not None:
+        tasa[falta] = tasa_asof(led["fecha"].to_numpy()[falta], led["moneda"].to_numpy()[falta], tasas)
+    led["tasa"] = tasa
+    led["monto"] = led["monto_orig"] * led["tasa"]
+    return led[LEDGER_COLS]
+
+def sin_tasa(led: pd.DataFrame) -> pd.DataFrame:
+    """Movimientos en otra moneda sin tipo de cambio (su `monto` en MXN es NaN)."""
+    return led[led["monto"].isna()]
+
+def exigir_tasas(led: pd.DataFrame):
+    """ValueError si algún movimiento no tiene tipo de cambio: saldos y totales saldrían mal."""
+    x = sin_tasa(led)
+    if not x.empty:
+        raise ValueError(f"{len(x):,} movimientos en {', '.join(sorted(x['moneda'].unique()))} sin tipo de cambio; "
+                         "importa sus tipos (python divisas.py importar …) o usa --tasas.")
+
+def flujos_cuenta(led: pd.DataFrame, extra=()) -> pd.DataFrame:
+    """Un renglón (fecha, cuenta, valor con signo) por cada pata de cada movimiento.
+
+    Gasto: −monto en `cuenta`; Ingreso: +monto; Traspaso: −monto en la emisora y
+    +monto en la receptora. Las columnas de `extra` se copian a ambas patas.
+    """
+    m = led["monto"].to_numpy(dtype=float)
+    signo = np.where(led["tipo"].to_numpy()=="Ingreso", 1.0, -1.0)
+    es_t = (led["tipo"]=="Traspaso").to_numpy()
+    sale  = pd.DataFrame({"fecha": led["fecha"].to_numpy(), "cuenta": led["cuenta"].to_numpy(), "valor": signo*m,
+                          **{c: led[c].to_numpy() for c in extra}})
+    entra = pd.DataFrame({"fecha": led["fecha"].to_numpy()[es_t], "cuenta": led["cuenta_receptora"].to_numpy()[es_t], "valor": m[es_t],
+                          **{c: led[c].to_numpy()[es_t] for c in extra}})
+    return pd.concat([sale, entra], ignore_index=True)
+
+def efecto_saldos(led: pd.DataFrame) -> pd.Series:
+    """Efecto neto por cuenta de un conjunto de movimientos (formato ledger)."""
+    if led.empty:
+        return pd.Series(dtype=float)
+    return flujos_cuenta(led).groupby("cuenta")["valor"].sum()
+
+def ledger_a_tabla(led: pd.DataFrame, tipo: str) -> pd.DataFrame:
+    """Inverso de `ledger_unificado` para un tipo: filas con las columnas de su pestaña."""
+    x = led[led["tipo"]==tipo]
+    fecha = x["fecha"].dt.date
+    monto = x["monto_orig"] if "monto_orig" in x.columns else x["monto"]
+    moneda = {c: x[c] for c in ("moneda","tasa") if c in x.columns}
+    if tipo=="Traspaso":
+        return pd.DataFrame({"ts": x["ts"], "fecha": fecha, "cuenta_emisora": x["cuenta"],
+                             "cuenta_receptora": x["cuenta_receptora"], "monto": monto,
+                             "comentario": x["categoria"], **moneda}).reset_index(drop=True)
+    return pd.DataFrame({"ts": x["ts"], "fecha": fecha, "cuenta": x["cuenta"], "monto": monto,
+                         "categoria": x["categoria"], "nota": x["nota"], **moneda}).reset_index(drop=True)
+
+
+def restaurar_filas(tabla: pd.DataFrame, originales: pd.DataFrame, llave: str = "ts") -> tuple:
+    """`tabla` con `originales` de vuelta por `llave` (deshacer un lote sin tocar lo demás).
+
+    Las que siguen en la tabla recuperan su contenido en su lugar; las que ya no
+    están se agregan al final; filas ajenas al lote quedan igual. Devuelve
+    (tabla restaurada, cómo estaban en `tabla` las filas del lote), para que
+    quien llama mueva los saldos por efecto(originales) − efecto(esas filas).
+    """
+    df = tabla.copy()
+    presente = df[llave].isin(originales[llave])
+    antes = df[presente]
+    o = originales.set_index(llave)
+    cols = [c for c in o.columns if c in df.columns]
+    df.loc[presente, cols] = o.loc[df.loc[presente, llave], cols].to_numpy()
+    faltan = originales[~originales[llave].isin(df[llave])]
+    return pd.concat([df, faltan], ignore_index=True), antes
+
+def con_saldos(led: pd.DataFrame, saldos: dict) -> pd.DataFrame:
+    """Saldo de cada cuenta justo después de cada movimiento.
+
+    Se ancla en el saldo actual (`saldos`, el de Config) y se reconstruye hacia
+    atrás con una suma acumulada por cuenta en orden (fecha, ts). Devuelve sólo
+    las columnas `saldo_cuenta` y `saldo_receptora` (ésta únicamente para
+    traspasos), alineadas con `led`, para no copiar el ledger completo.
+    """
+    fl = flujos_cuenta(led, extra=("ts",))
+    fl["fila"] = np.concatenate([np.arange(len(led)), np.flatnonzero((led["tipo"]=="Traspaso").to_numpy())])
+    fl["pata"] = np.repeat([0, 1], [len(led), len(fl) - len(led)])
+    fl = fl.sort_values(["fecha","ts","pata"], kind="stable", na_position="first")
+    acum  = fl.groupby("cuenta")["valor"].cumsum()
+    total = fl.groupby("cuenta")["valor"].transform("sum")
+    actual = fl["cuenta"].map(lambda c: float(saldos.get(c, 0.0)))
+    fl["saldo"] = actual - (total - acum)
+    out = pd.DataFrame({"saldo_cuenta": np.nan, "saldo_receptora": np.nan}, index=led.index)
+    emisora = fl[fl["pata"]==0]; receptora = fl[fl["pata"]==1]
+    out.iloc[emisora["fila"].to_numpy(), 0] = emisora["saldo"].to_numpy()
+    out.iloc[receptora["fila"].to_numpy(), 1] = receptora["saldo"].to_numpy()
+    return out
+
+def reporte_periodos(led: pd.DataFrame, freq: str = "M", cuenta_ingreso: str = "BBVA Concentradora",
+                     ahorro: str = "Apartados", inversion: str = "GBM") -> pd.DataFrame:
+    """Gasto / Ingreso / Ahorro / Inversión por día ("D"), semana ("W") o mes ("M").
+
+    Mismas reglas que `calcular_reporte_periodo` de la app, pero para todos los
+    periodos del historial en un solo groupby.
+    """
+    x = led[led["fecha"].notna()]
+    tipo, m = x["tipo"].to_numpy(), x["monto"].to_numpy(dtype=float)
+    es_t = tipo=="Traspaso"
+    rec, emi = x["cuenta_receptora"].to_numpy(), x["cuenta"].to_numpy()
+    cols = pd.DataFrame({
+        "Gasto":     np.where(tipo=="Gasto", m, 0.0),
+        "Ingreso":   np.where((tipo=="Ingreso") & (emi==cuenta_ingreso), m, 0.0),
+        "Ahorro":    np.where(es_t & (rec==ahorro), m, 0.0) - np.where(es_t & (emi==ahorro), m, 0.0),
+        "Inversión": np.where(es_t & (rec==inversion), m, 0.0),
+    }, index=x.index)
+    periodo = x["fecha"].dt.to_period({"W": "W-SUN", "D": "D"}.get(freq, "M")).dt.start_time.rename("periodo")
+    return cols.groupby(periodo).sum()
@@ -0,0 +1,47 @@
+# muestreo.py — reducción de series para gráficas (LTTB)
+#
+# Una curva de años de historial diario se manda al navegador con un número fijo
+# de puntos, así el peso de la página y el tiempo de dibujo no dependen del rango.
+# LTTB (Largest-Triangle-Three-Buckets, Steinarsson 2013) conserva picos, valles
+# y escalones mejor que promediar o tomar cada n-ésimo punto.
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+PUNTOS = 400   # presupuesto de puntos por trazo
+
+
+def lttb(x, y, n: int) -> np.ndarray:
+    """Índices (ordenados) de los `n` puntos que LTTB conserva de (x, y).
+
+    El ciclo es por cubeta (n − 2 vueltas), no por punto: cada vuelta es numpy
+    sobre su cubeta, así que el costo total es O(len(x)) con n iteraciones de Python.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    N = len(x)
+    if n >= N or n < 3:
+        return np.arange(N)
+    bordes = (np.arange(n - 1) * ((N - 2) / (n - 2))).astype(int) + 1   # inicio de cada cubeta
+    bordes[-1] = N - 1
+    idx = np.empty(n, dtype=int)
+    idx[0], idx[-1] = 0, N - 1
+    a = 0
+    for i in range(n - 2):
+        ini, fin = bordes[i], bordes[i + 1]
+        sig_fin = bordes[i + 2] if i + 2 < len(bordes) else N
+        cx, cy = x[fin:sig_fin].mean(), y[fin:sig_fin].mean()      # promedio de la cubeta siguiente
+        area = np.abs((x[a] - cx) * (y[ini:fin] - y[a]) - (x[a] - x[ini:fin]) * (cy - y[a]))
+        a = ini + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+
+def reducir(serie: pd.Series, puntos: int = PUNTOS) -> pd.Series:
+    """La serie (índice de fechas o números) reducida a ≤ `puntos` con LTTB."""
+    serie = serie.dropna()
+    if len(serie) <= puntos:
+        return serie
+    x = serie.index.asi8 if isinstance(serie.index, pd.DatetimeIndex) else serie.index.to_numpy()
+    return serie.iloc[lttb(x, serie.to_numpy(), puntos)]
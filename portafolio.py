@@ -0,0 +1,239 @@
+# portafolio.py — valuación diaria del portafolio GBM (posiciones × precios)
+#
+# Operaciones (compras/ventas por ticker) viven en la pestaña "Operaciones";
+# los precios diarios son un archivo local (CSV o Parquet) que se importa a mano:
+#   python portafolio.py importar precios.csv [--destino datos/precios.parquet]
+#
+# Todo es vectorizado sobre una matriz (día × ticker): las posiciones son el
+# acumulado de un pivot reindexado a cada día (ffill); los precios se dispersan
+# con numpy en su celda y el "as-of" (último dato conocido a cada fecha) sale de
+# un np.maximum.accumulate sobre el índice de la última fila con dato.
+from __future__ import annotations
+
+import argparse, os, sys
+
+import numpy as np
+import pandas as pd
+
+from archivos import PARQUET_OK, leer_archivo
+from divisas import BASE as MONEDA_BASE, tasa_asof
+
+OPERACIONES_COLS = ["ts","fecha","ticker","operacion","titulos","precio","comision","nota"]
+PRECIOS_COLS = ["fecha","ticker","precio"]
+PRECIOS_DEFAULT = os.path.join("datos", "precios.parquet" if PARQUET_OK else "precios.csv")
+
+# Nombres de columna aceptados al importar (exportaciones típicas de brokers / Yahoo)
+_ALIAS = {"fecha": ["fecha","date","dia","día"],
+          "ticker": ["ticker","emisora","symbol","simbolo","símbolo"],
+          "precio": ["precio","cierre","close","adj close","adj_close","price"]}
+
+
+# ==========================
+#   Precios locales
+# ==========================
+def normalizar_precios(df: pd.DataFrame, ticker: str | None = None) -> pd.DataFrame:
+    """Columnas fecha/ticker/precio a partir de nombres comunes; `ticker` para archivos de un solo activo."""
+    cols = {str(c).strip().lower(): c for c in df.columns}
+    ren = {}
+    for dest, alias in _ALIAS.items():
+        src = next((cols[a] for a in alias if a in cols), None)
+        if src is not None:
+            ren[src] = dest
+    df = df.rename(columns=ren)
+    if "ticker" not in df.columns and ticker:
+        df["ticker"] = ticker
+    faltan = [c for c in PRECIOS_COLS if c not in df.columns]
+    if faltan:
+        raise ValueError(f"Faltan columnas en precios: {', '.join(faltan)}")
+    out = pd.DataFrame({
+        "fecha":  pd.to_datetime(df["fecha"], errors="coerce").dt.normalize(),
+        "ticker": df["ticker"].astype(str).str.strip().str.upper(),
+        "precio": pd.to_numeric(df["precio"], errors="coerce"),
+    })
+    out = out[out["fecha"].notna() & (out["precio"] > 0)]
+    return out.assign(ticker=out["ticker"].astype("category")).reset_index(drop=True)
+
+
+def leer_precios(ruta: str) -> pd.DataFrame:
+    if not os.path.exists(ruta):
+        return pd.DataFrame({"fecha": pd.Series(dtype="datetime64[ns]"),
+                             "ticker": pd.Series(dtype="category"), "precio": pd.Series(dtype=float)})
+    return normalizar_precios(leer_archivo(ruta))
+
+
+def importar_precios(nuevos: pd.DataFrame, ruta: str) -> int:
+    """Agrega `nuevos` al histórico local (lo importado gana en fechas repetidas). Devuelve filas totales."""
+    todo = pd.concat([leer_precios(ruta).astype({"ticker": str}),
+                      normalizar_precios(nuevos).astype({"ticker": str})], ignore_index=True)
+    todo = (todo.drop_duplicates(["fecha","ticker"], keep="last")
+                .sort_values(["ticker","fecha"], kind="stable").reset_index(drop=True))
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    if ruta.lower().endswith(".parquet"):
+        todo.to_parquet(ruta, index=False)
+    else:
+        todo.to_csv(ruta, index=False)
+    return len(todo)
+
+
+# ==========================
+#   Motor de valuación
+# ==========================
+def _indices_ticker(serie: pd.Series, tickers: pd.Index) -> np.ndarray:
+    """Columna de cada fila en `tickers` (−1 si no está); con categorías sólo se buscan las distintas."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        mapa = np.append(tickers.get_indexer(serie.cat.categories), -1)
+        return mapa[serie.cat.codes.to_numpy()]      # código −1 (nulo) -> última entrada = −1
+    return tickers.get_indexer(serie)
+
+
+def _ultimos(filas: np.ndarray, cols: np.ndarray, n_cols: int) -> np.ndarray:
+    """Posiciones (en el orden dado) del último valor de cada celda (fila, col).
+
+    Con índices repetidos, `a[i, j] = v` no garantiza cuál gana; se asigna sólo el último.
+    """
+    celda = filas.astype(np.int64) * n_cols + cols
+    _, i = np.unique(celda[::-1], return_index=True)
+    return len(celda) - 1 - i
+
+
+def _operaciones(ops: pd.DataFrame) -> pd.DataFrame:
+    o = pd.DataFrame({
+        "fecha":  pd.to_datetime(ops["fecha"], errors="coerce").dt.normalize(),
+        "ticker": ops["ticker"].astype(str).str.strip().str.upper(),
+        "signo":  np.where(ops["operacion"].astype(str).str.lower().str.startswith("v"), -1.0, 1.0),
+        "titulos": pd.to_numeric(ops["titulos"], errors="coerce").fillna(0.0),
+        "precio":  pd.to_numeric(ops["precio"], errors="coerce").fillna(0.0),
+        "comision": pd.to_numeric(ops.get("comision", 0.0), errors="coerce"),
+    }).dropna(subset=["fecha"])
+    o["comision"] = o["comision"].fillna(0.0)
+    o["delta"] = o["signo"] * o["titulos"]
+    # efectivo que entra al portafolio: compra = importe + comisión; venta = −(importe − comisión)
+    o["flujo"] = o["delta"] * o["precio"] + o["comision"]
+    return o
+
+
+def valuacion(ops: pd.DataFrame, precios: pd.DataFrame, hasta,
+              moneda: str = MONEDA_BASE, tasas: pd.DataFrame | None = None) -> dict:
+    """Serie diaria del portafolio y resumen por ticker, en `moneda`.
+
+    - valor:     Σ títulos(as-of) × precio(as-of) por día
+    - flujo:     aportaciones netas del día (compras − ventas, con comisiones)
+    - aportado:  flujo acumulado; ganancia = valor − aportado
+    - r, twr:    rendimiento diario con aportaciones al inicio del día y retiros al
+                 cierre, r = (V_t + retiro_t)/(V_{t−1} + aporte_t) − 1, encadenado
+                 (time-weighted) para aislarlo de cuándo y cuánto se aportó
+    El precio de cada operación también cuenta como observación, así un ticker
+    sin histórico importado se valúa a su último precio de compra/venta.
+    `fecha_precio` es el día del último precio conocido (el día 0 si es anterior).
+    Fuera de MXN cada día va a su tipo de `tasas` (valor, flujos y precios), así el
+    TWR es el de esa moneda; si a algún día le falta tipo se lanza ValueError.
+    """
+    vacio = {"diario": pd.DataFrame(columns=["valor","flujo","aportado","ganancia","r","twr"]),
+             "tickers": pd.DataFrame(columns=["titulos","precio","valor","peso","fecha_precio"])}
+    if ops is None or ops.empty:
+        return vacio
+    o = _operaciones(ops)
+    if o.empty:
+        return vacio
+    hasta = pd.Timestamp(hasta).normalize()
+    dias = pd.date_range(o["fecha"].min(), max(hasta, o["fecha"].max()), freq="D")
+    tickers = pd.Index(sorted(o["ticker"].unique()))
+
+    # Posiciones: cambio neto por (día, ticker) -> acumulado -> as-of a cada día
+    pos = (o.pivot_table(index="fecha", columns="ticker", values="delta", aggfunc="sum")
+             .reindex(columns=tickers).fillna(0.0).cumsum()
+             .reindex(dias, method="ffill").fillna(0.0))
+
+    # Precios as-of en una matriz (día × ticker): los de operación y encima el
+    # histórico local (el cierre gana el mismo día); luego arrastre hacia adelante.
+    # Lo anterior al primer día cae en la fila 0 en orden de fecha (gana el más reciente)
+    # y antes que las operaciones, que sí son del día.
+    px = np.full((len(dias), len(tickers)), np.nan)
+    d0 = dias[0].to_datetime64()
+    col = _indices_ticker(precios["ticker"], tickers)
+    fila = (precios["fecha"].to_numpy() - d0).astype("timedelta64[D]").astype(int)
+    ok = (col >= 0) & (fila < len(dias))
+    antes = np.flatnonzero(ok & (fila < 0))
+    antes = antes[np.argsort(fila[antes], kind="stable")]
+    antes = antes[_ultimos(np.zeros(len(antes), dtype=int), col[antes], len(tickers))]
+    px[0, col[antes]] = precios["precio"].to_numpy()[antes]
+    op = o[o["precio"] > 0]
+    f_op, c_op = (op["fecha"].to_numpy() - d0).astype("timedelta64[D]").astype(int), tickers.get_indexer(op["ticker"])
+    u = _ultimos(f_op, c_op, len(tickers))          # la última operación del día fija el precio
+    px[f_op[u], c_op[u]] = op["precio"].to_numpy()[u]
+    dentro = np.flatnonzero(ok & (fila >= 0))
+    dentro = dentro[_ultimos(fila[dentro], col[dentro], len(tickers))]
+    px[fila[dentro], col[dentro]] = precios["precio"].to_numpy()[dentro]
+    ultimo = np.where(np.isnan(px), 0, np.arange(len(dias))[:, None])
+    np.maximum.accumulate(ultimo, axis=0, out=ultimo)
+    px = px[ultimo, np.arange(len(tickers))]
+
+    if moneda != MONEDA_BASE:
+        fx = tasa_asof(dias, moneda, tasas)
+        if np.isnan(fx).any():
+            raise ValueError(f"No hay tipo de cambio de {moneda} al {dias[np.isnan(fx)][0]:%d/%m/%Y}.")
+        px = px / fx[:, None]
+    pos_v, px_v = pos.to_numpy(), np.nan_to_num(px)
+    valor = (pos_v * px_v).sum(axis=1)
+    flujo = o.groupby("fecha")["flujo"].sum().reindex(dias, fill_value=0.0).to_numpy()
+    if moneda != MONEDA_BASE:
+        flujo = flujo / fx
+
+    previo = np.concatenate([[0.0], valor[:-1]])
+    entra, sale = np.clip(flujo, 0, None), np.clip(-flujo, 0, None)
+    base = previo + entra
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = np.where(base > 0, (valor + sale) / base - 1.0, 0.0)
+    diario = pd.DataFrame({"valor": valor, "flujo": flujo}, index=pd.DatetimeIndex(dias, name="fecha"))
+    diario["aportado"] = diario["flujo"].cumsum()
+    diario["ganancia"] = diario["valor"] - diario["aportado"]
+    diario["r"] = r
+    diario["twr"] = np.cumprod(1.0 + r) - 1.0
+
+    # Resumen al último día
+    ult_pos, ult_px = pos.iloc[-1], pd.Series(px[-1], index=tickers)
+    tk = pd.DataFrame({"titulos": ult_pos, "precio": ult_px, "valor": ult_pos * ult_px.fillna(0.0),
+                       "fecha_precio": pd.Series(dias[ultimo[-1]], index=tickers).where(ult_px.notna())})
+    tk = tk[tk["titulos"].abs() > 1e-9]
+    tk["peso"] = tk["valor"] / tk["valor"].sum() if tk["valor"].sum() else 0.0
+    return {"diario": diario, "tickers": tk.sort_values("valor", ascending=False)}
+
+
+def titulos_disponibles(ops: pd.DataFrame, ticker: str, fecha) -> float:
+    """Cuánto de `ticker` se puede vender en `fecha` sin que la posición quede negativa ese día ni después."""
+    if ops is None or ops.empty:
+        return 0.0
+    o = _operaciones(ops)
+    o = o[o["ticker"] == str(ticker).strip().upper()]
+    pos = o.groupby("fecha")["delta"].sum().sort_index().cumsum()
+    f = pd.Timestamp(fecha).normalize()
+    al_dia = pos[pos.index <= f]
+    return max(min([float(al_dia.iloc[-1]) if len(al_dia) else 0.0, *pos[pos.index > f]]), 0.0)
+
+
+def twr_anualizado(diario: pd.DataFrame) -> float:
+    if diario.empty:
+        return 0.0
+    anos = max((diario.index[-1] - diario.index[0]).days, 1) / 365.25
+    return float((1.0 + diario["twr"].iloc[-1]) ** (1.0 / anos) - 1.0) if anos >= 1 else float(diario["twr"].iloc[-1])
+
+
+# ==========================
+#   Modo sin interfaz
+# ==========================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Importa precios diarios al histórico local de GBM.")
+    ap.add_argument("accion", choices=["importar"])
+    ap.add_argument("archivo", help="CSV o Parquet con fecha, ticker y precio (o cierre/close).")
+    ap.add_argument("--ticker", default=None, help="Para archivos de un solo activo sin columna ticker.")
+    ap.add_argument("--destino", default=PRECIOS_DEFAULT)
+    args = ap.parse_args(argv)
+    df = leer_archivo(args.archivo)
+    if args.ticker:
+        df = normalizar_precios(df, args.ticker)
+    n = importar_precios(df, args.destino)
+    print(f"✅ {n:,} precios en {args.destino}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# recurrentes.py — reglas de movimientos recurrentes y sus ocurrencias
+#
+# Cada regla (pestaña "Recurrentes") genera un movimiento cada `frecuencia` desde
+# `inicio` hasta `fin` (vacío = sin fin). La app materializa en un solo lote lo
+# vencido desde la marca `hasta` de cada regla; el pronóstico usa las futuras.
+from __future__ import annotations
+
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from movimientos import LEDGER_COLS
+
+REC_COLS = ["id","tipo","frecuencia","monto","cuenta","cuenta_receptora","categoria","nota","inicio","fin","hasta"]
+
+# frecuencia -> (unidad, paso): "D" avanza días, "M" avanza meses (con día recortado a fin de mes)
+FRECUENCIAS = {
+    "Diaria":    ("D", 1),
+    "Semanal":   ("D", 7),
+    "Quincenal": ("D", 14),
+    "Mensual":   ("M", 1),
+    "Bimestral": ("M", 2),
+    "Anual":     ("M", 12),
+}
+DIA_MS = 86_400_000
+
+
+def ts_recurrente(regla_id, fechas) -> np.ndarray:
+    """ID determinista de una ocurrencia: medianoche de la fecha (ms) + desfase estable por regla.
+
+    Así la misma (regla, fecha) produce siempre el mismo `ts`, sin importar la sesión.
+    """
+    offs = np.array([zlib.crc32(str(r).encode()) % DIA_MS for r in regla_id], dtype="int64")
+    return fechas.astype("datetime64[ms]").astype("int64") + offs
+
+
+def ocurrencias_recurrentes(reglas: pd.DataFrame, desde, hasta) -> pd.DataFrame:
+    """Todas las ocurrencias de `reglas` con fecha en [desde, hasta], en formato ledger (+ `regla`).
+
+    `desde` puede ser una fecha o una Serie alineada con `reglas` (límite por regla).
+    Se calcula en una sola pasada vectorizada: por cada regla sólo se generan los
+    pasos k que caen dentro de la ventana.
+    """
+    cols = LEDGER_COLS + ["regla"]
+    if reglas is None or reglas.empty:
+        return pd.DataFrame(columns=cols)
+    r = reglas[reglas["frecuencia"].isin(FRECUENCIAS.keys())].copy()
+    r["inicio"] = pd.to_datetime(r["inicio"], errors="coerce").dt.normalize()
+    r["fin"]    = pd.to_datetime(r["fin"], errors="coerce").dt.normalize()
+    r = r[r["inicio"].notna()]
+    if r.empty:
+        return pd.DataFrame(columns=cols)
+
+    hasta = pd.Timestamp(hasta).normalize()
+    if isinstance(desde, pd.Series):
+        lo = pd.to_datetime(desde.reindex(r.index), errors="coerce").dt.normalize()
+    else:
+        lo = pd.Series(pd.Timestamp(desde).normalize(), index=r.index)
+    lo = lo.where(lo > r["inicio"], r["inicio"])   # NaT (regla nunca corrida) -> inicio
+    hi = r["fin"].where(r["fin"] < hasta, hasta).fillna(hasta)
+
+    unidad = r["frecuencia"].map(lambda f: FRECUENCIAS[f][0]).to_numpy()
+    paso   = r["frecuencia"].map(lambda f: FRECUENCIAS[f][1]).to_numpy()
+    es_d   = unidad=="D"
+    ini    = r["inicio"].to_numpy("datetime64[D]")
+    meses  = lambda a, b: (a.dt.year - b.dt.year)*12 + (a.dt.month - b.dt.month)
+    k0 = np.where(es_d, -(-(lo - r["inicio"]).dt.days.to_numpy() // paso), meses(lo, r["inicio"]).to_numpy() // paso)
+    k1 = np.where(es_d, (hi - r["inicio"]).dt.days.to_numpy() // paso, meses(hi, r["inicio"]).to_numpy() // paso)
+    n  = np.clip(k1 - k0 + 1, 0, None)
+    if n.sum()==0:
+        return pd.DataFrame(columns=cols)
+
+    idx  = np.repeat(np.arange(len(r)), n)
+    k    = np.repeat(k0, n) + (np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n))
+    step = paso[idx] * k
+    f_d  = ini[idx] + step.astype("timedelta64[D]")
+    mes0 = ini[idx].astype("datetime64[M]")
+    dia  = ini[idx] - mes0.astype("datetime64[D]")
+    mes  = mes0 + step.astype("timedelta64[M]")
+    ult  = (mes + 1).astype("datetime64[D]") - np.timedelta64(1, "D")
+    f_m  = np.minimum(mes.astype("datetime64[D]") + dia, ult)
+    fechas = np.where(es_d[idx], f_d, f_m)
+
+    rr = r.iloc[idx]
+    occ = pd.DataFrame({
+        "tipo": rr["tipo"].to_numpy(),
+        "ts": ts_recurrente(rr["id"].to_numpy(), fechas),
+        "fecha": pd.to_datetime(fechas),
+        "cuenta": rr["cuenta"].to_numpy(),
+        "cuenta_receptora": rr["cuenta_receptora"].fillna("").to_numpy(),
+        "categoria": rr["categoria"].fillna("").to_numpy(),
+        "monto": pd.to_numeric(rr["monto"], errors="coerce").fillna(0.0).to_numpy(),
+        "nota": rr["nota"].fillna("").to_numpy(),
+        "regla": rr["id"].to_numpy(),
+    })
+    dentro = (fechas >= lo.to_numpy("datetime64[D]")[idx]) & (fechas <= hi.to_numpy("datetime64[D]")[idx])
+    return occ[dentro].reset_index(drop=True)
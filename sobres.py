@@ -0,0 +1,148 @@
+# sobres.py — presupuestos por categoría (y opcionalmente por cuenta) tipo "sobre"
+#
+# Definiciones en la pestaña "Presupuestos":
+#   categoria   categoría de gasto que descuenta del sobre
+#   cuenta      vacía = cualquier cuenta; si no, sólo gastos de esa cuenta
+#   periodo     Semanal (lunes a domingo) | Mensual
+#   monto       lo que se asigna al sobre cada periodo (MXN)
+#   arrastre    Ninguno  — cada periodo empieza en `monto`
+#               Sobrante — lo no gastado pasa al siguiente periodo (el exceso no)
+#               Todo     — pasa el sobrante y también el exceso (saldo negativo)
+#   inicio      primer periodo que cuenta
+# El gasto por (sobre, periodo) se mantiene en memoria: registrar o borrar un
+# gasto toca sólo los sobres de su categoría, sin recorrer el ledger.
+from __future__ import annotations
+
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+PRESUPUESTOS_COLS = ["id","categoria","cuenta","periodo","monto","arrastre","inicio"]
+PERIODOS = {"Semanal": "W", "Mensual": "M"}
+ARRASTRES = ["Ninguno","Sobrante","Todo"]
+
+
+def inicio_periodo(fecha, freq: str) -> pd.Timestamp:
+    f = pd.Timestamp(fecha).normalize()
+    return f - pd.Timedelta(days=f.weekday()) if freq == "W" else f.replace(day=1)
+
+
+def _periodos(fechas: pd.Series, freq: str) -> pd.Series:
+    return fechas.dt.to_period("W-SUN" if freq == "W" else "M").dt.start_time
+
+
+def _indice(inicios: np.ndarray, desde: pd.Timestamp, freq: str) -> np.ndarray:
+    """Número de periodo de cada inicio contado desde `desde` (0, 1, 2…)."""
+    if freq == "W":
+        return ((inicios - np.datetime64(desde, "ns")) // np.timedelta64(7, "D")).astype(int)
+    return (inicios.astype("datetime64[M]") - np.datetime64(desde, "M")).astype(int)
+
+
+class Sobres:
+    """Saldo de cada sobre, mantenido con sumas por (sobre, periodo).
+
+    `aplicar` es O(sobres de esa categoría) por movimiento; `reconstruir` rehace
+    todo desde el ledger con un par de groupby (para arrancar, cuando cambió algo
+    que no pasó por `aplicar`, y como verificación con `diferencias`).
+    """
+
+    def __init__(self, defs: pd.DataFrame):
+        self.defs = {}
+        self.indice = defaultdict(list)          # (categoria, cuenta|"") -> [id]
+        for r in (defs if defs is not None else pd.DataFrame(columns=PRESUPUESTOS_COLS)).itertuples(index=False):
+            freq = PERIODOS.get(str(r.periodo))
+            monto = pd.to_numeric(r.monto, errors="coerce")
+            if not freq or not str(r.categoria).strip() or pd.isna(monto):
+                continue
+            ini = pd.to_datetime(r.inicio, errors="coerce")
+            cuenta = "" if pd.isna(r.cuenta) else str(r.cuenta).strip()
+            self.defs[r.id] = {"categoria": str(r.categoria).strip(), "cuenta": cuenta, "freq": freq,
+                               "periodo": str(r.periodo), "monto": float(monto),
+                               "arrastre": r.arrastre if r.arrastre in ARRASTRES else "Ninguno",
+                               "inicio": inicio_periodo(ini if pd.notna(ini) else pd.Timestamp("2000-01-01"), freq)}
+            self.indice[(self.defs[r.id]["categoria"], cuenta)].append(r.id)
+        self.gastado = {k: defaultdict(float) for k in self.defs}   # id -> {inicio de periodo: gasto}
+        self._arrastre = {}                                        # id -> (periodo actual, arrastre)
+        self.vers = None
+
+    def _de(self, categoria: str, cuenta: str):
+        return self.indice.get((categoria, ""), []) + self.indice.get((categoria, cuenta), [])
+
+    def aplicar(self, fecha, categoria: str, cuenta: str, monto: float, signo: int = 1):
+        """Suma (signo=1) o resta (signo=−1) un gasto en los sobres que le tocan."""
+        for k in self._de(str(categoria), str(cuenta)):
+            d = self.defs[k]
+            p = inicio_periodo(fecha, d["freq"])
+            if p < d["inicio"]:
+                continue
+            self.gastado[k][p] += signo * float(monto)
+            if k in self._arrastre and p < self._arrastre[k][0]:
+                del self._arrastre[k]            # cambió un periodo cerrado: rehacer su arrastre
+
+    def reconstruir(self, led: pd.DataFrame):
+        """Gasto por (sobre, periodo) desde cero: un groupby por frecuencia y un merge con las definiciones."""
+        self.gastado = {k: defaultdict(float) for k in self.defs}
+        self._arrastre = {}
+        cats = {d["categoria"] for d in self.defs.values()}
+        g = led[(led["tipo"] == "Gasto") & led["fecha"].notna() & led["categoria"].isin(cats)]
+        if g.empty:
+            return self
+        defs = pd.DataFrame.from_dict(self.defs, orient="index").rename_axis("id").reset_index()
+        for freq, d in defs[["id","categoria","cuenta","inicio","freq"]].groupby("freq"):
+            tot = (g.groupby([g["categoria"], g["cuenta"], _periodos(g["fecha"], freq).rename("p")])["monto"]
+                    .sum().reset_index())
+            por_cat = tot.groupby(["categoria","p"], as_index=False)["monto"].sum()
+            m = pd.concat([d[d["cuenta"] == ""].merge(por_cat, on="categoria"),
+                           d[d["cuenta"] != ""].merge(tot, on=["categoria","cuenta"])], ignore_index=True)
+            m = m[m["p"] >= m["inicio"]]
+            for k, x in m.groupby("id"):
+                self.gastado[k].update(zip(x["p"], x["monto"]))
+        return self
+
+    def _arrastre_a(self, k, actual: pd.Timestamp) -> float:
+        """Lo que llega al periodo `actual` desde los anteriores, según la regla del sobre."""
+        d = self.defs[k]
+        if d["arrastre"] == "Ninguno" or actual <= d["inicio"]:
+            return 0.0
+        if self._arrastre.get(k, (None,))[0] == actual:
+            return self._arrastre[k][1]
+        gastos = self.gastado[k]
+        cerrados = [p for p in gastos if p < actual]
+        # gasto de cada periodo cerrado en su posición desde `inicio` (sin reindexar fechas)
+        pos = _indice(np.array(cerrados, dtype="datetime64[ns]"), d["inicio"], d["freq"])
+        neto = np.full(int(_indice(np.array([actual], dtype="datetime64[ns]"), d["inicio"], d["freq"])[0]), d["monto"])
+        np.subtract.at(neto, pos, [gastos[p] for p in cerrados])
+        s = np.cumsum(neto)
+        if d["arrastre"] == "Todo":
+            v = float(s[-1])
+        else:
+            # W_k = max(0, W_{k−1} + x_k) = S_k − min(0, min_{j≤k} S_j)  (sin ciclo por periodo)
+            v = float(s[-1] - min(0.0, s.min()))
+        self._arrastre[k] = (actual, v)
+        return v
+
+    def estado(self, hoy) -> pd.DataFrame:
+        filas = []
+        for k, d in self.defs.items():
+            p = inicio_periodo(hoy, d["freq"])
+            fin = p + (pd.Timedelta(days=6) if d["freq"] == "W" else pd.offsets.MonthEnd(0))
+            arr = self._arrastre_a(k, p)
+            gasto = self.gastado[k].get(p, 0.0)
+            disp = d["monto"] + arr
+            filas.append({"id": k, "categoria": d["categoria"], "cuenta": d["cuenta"] or "Todas",
+                          "periodo": d["periodo"], "desde": p, "hasta": fin, "asignado": d["monto"],
+                          "arrastre": arr, "gastado": gasto, "restante": disp - gasto,
+                          "uso": gasto / disp if disp > 0 else (1.0 if gasto > 0 else 0.0)})
+        return pd.DataFrame(filas, columns=["id","categoria","cuenta","periodo","desde","hasta","asignado",
+                                            "arrastre","gastado","restante","uso"])
+
+    def diferencias(self, led: pd.DataFrame, tol: float = 0.005) -> pd.DataFrame:
+        """(sobre, periodo, incremental, recalculado) donde no coinciden; vacío = todo cuadra."""
+        ref = Sobres.__new__(Sobres)
+        ref.defs, ref.indice = self.defs, self.indice
+        ref.reconstruir(led)
+        filas = [(k, p, self.gastado[k].get(p, 0.0), ref.gastado[k].get(p, 0.0))
+                 for k in self.defs for p in set(self.gastado[k]) | set(ref.gastado[k])]
+        df = pd.DataFrame(filas, columns=["id","periodo","incremental","recalculado"])
+        return df[(df["incremental"] - df["recalculado"]).abs() > tol].reset_index(drop=True)
@@ -0,0 +1,166 @@
+# tarjetas.py — ciclos de estado de cuenta de tarjetas de crédito
+#
+# Cada tarjeta tiene su configuración en Config (clave `tarjeta_<cuenta>`, JSON):
+#   corte        día del mes del corte (recortado a fin de mes: 31 -> 30/28…)
+#   dias_pago    días naturales del corte a la fecha límite de pago
+#   minimo_pct   pago mínimo como fracción del saldo al corte
+#   minimo_fijo  pago mínimo en MXN cuando el porcentaje da menos
+# Un movimiento con fecha en (corte anterior, corte] pertenece al ciclo de ese
+# corte. El saldo de la cuenta es con signo (negativo = deuda), como en Config.
+from __future__ import annotations
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from movimientos import flujos_cuenta
+
+CONFIG_DEFAULT = {"corte": 5, "dias_pago": 20, "minimo_pct": 0.05, "minimo_fijo": 200.0}
+_TIPOS = {"Gasto": 0, "Traspaso": 1, "Ingreso": 2}
+
+
+def clave_config(cuenta: str) -> str:
+    return f"tarjeta_{cuenta}"
+
+
+def leer_config(valor) -> dict:
+    """JSON de Config -> configuración completa (lo que falte o no sea válido toma el default)."""
+    try:
+        datos = json.loads(valor) if valor else {}
+    except (TypeError, ValueError):
+        datos = {}
+    cfg = dict(CONFIG_DEFAULT)
+    for k, v in (datos if isinstance(datos, dict) else {}).items():
+        if k in cfg:
+            try:
+                cfg[k] = type(CONFIG_DEFAULT[k])(v)
+            except (TypeError, ValueError):
+                pass
+    cfg["corte"] = int(min(max(cfg["corte"], 1), 31))
+    cfg["dias_pago"] = int(max(cfg["dias_pago"], 0))
+    return cfg
+
+
+# ==========================
+#   Fechas de corte (vectorizado)
+# ==========================
+def _dia_en_mes(meses: np.ndarray, dia: int) -> np.ndarray:
+    """`dia` de cada mes (datetime64[M]) recortado al último día del mes."""
+    ultimo = (meses + 1).astype("datetime64[D]") - np.timedelta64(1, "D")
+    return np.minimum(meses.astype("datetime64[D]") + np.timedelta64(dia - 1, "D"), ultimo)
+
+
+def fechas_corte(fechas, dia: int) -> np.ndarray:
+    """Corte del ciclo al que pertenece cada fecha: el de su mes si no ha pasado, si no el siguiente."""
+    f = np.asarray(fechas, dtype="datetime64[D]")
+    mes = f.astype("datetime64[M]")
+    este = _dia_en_mes(mes, dia)
+    return np.where(f <= este, este, _dia_en_mes(mes + 1, dia))
+
+
+def corte_anterior(cortes: np.ndarray, dia: int) -> np.ndarray:
+    return _dia_en_mes(np.asarray(cortes, dtype="datetime64[D]").astype("datetime64[M]") - 1, dia)
+
+
+def aportes(led: pd.DataFrame, cuenta: str, config: dict) -> pd.DataFrame:
+    """Aporte de cada movimiento de `cuenta` a su ciclo, indexado por llave = ts·4 + tipo.
+
+    cargo = salidas (gastos, traspasos desde la tarjeta); pago = entradas
+    (traspasos a la tarjeta, ingresos/bonificaciones). `pago_a_tiempo` es el pago
+    hecho a más tardar en la fecha límite del ciclo anterior (el que se está pagando).
+    """
+    toca = ((led["cuenta"] == cuenta) | (led["cuenta_receptora"] == cuenta)).to_numpy()
+    fl = flujos_cuenta(led[toca], extra=("tipo","ts"))
+    fl = fl[(fl["cuenta"] == cuenta) & fl["fecha"].notna()]
+    dia = config["corte"]
+    corte = fechas_corte(fl["fecha"].to_numpy(), dia)
+    limite = corte_anterior(corte, dia) + np.timedelta64(config["dias_pago"], "D")
+    v = fl["valor"].to_numpy(dtype=float)
+    pago = np.clip(v, 0, None)
+    out = pd.DataFrame({"corte": corte.astype("datetime64[ns]"), "cargo": np.clip(-v, 0, None), "pago": pago,
+                        "pago_a_tiempo": np.where(fl["fecha"].to_numpy("datetime64[D]") <= limite, pago, 0.0)},
+                       index=pd.Index(fl["ts"].to_numpy("int64") * 4 + fl["tipo"].map(_TIPOS).fillna(3).to_numpy("int64"),
+                                      name="llave"))
+    return out[~out.index.duplicated(keep="last")]
+
+
+def _agrupar(filas: pd.DataFrame) -> pd.DataFrame:
+    g = filas.groupby("corte")
+    return g[["cargo","pago","pago_a_tiempo"]].sum().assign(n=g.size())
+
+
+# ==========================
+#   Agregados por ciclo (al día por movimiento)
+# ==========================
+class CiclosTarjeta:
+    """Cargos/pagos por ciclo de una tarjeta, al día sin reagrupar el historial.
+
+    `reconstruir` agrupa el ledger una vez; después cada movimiento registrado o
+    borrado se suma/resta con `aplicar` (como los sobres), así que un rerun sin
+    cambios no toca el ledger. `vers` es la versión de datos con que quedaron al
+    día (la asigna quien llama). Cambiar la configuración obliga a reconstruir.
+    """
+
+    def __init__(self, cuenta: str, config: dict):
+        self.cuenta, self.config = cuenta, dict(config)
+        self.vers = None
+        self.agregados = pd.DataFrame(columns=["cargo","pago","pago_a_tiempo","n"], dtype=float)
+
+    def reconstruir(self, led: pd.DataFrame) -> "CiclosTarjeta":
+        self.agregados = _agrupar(aportes(led, self.cuenta, self.config)).sort_index()
+        return self
+
+    def aplicar(self, movs: pd.DataFrame, signo: int = 1) -> int:
+        """Suma (`signo`=1) o resta (-1) los movimientos `movs` (formato ledger); devuelve cuántos tocaron la tarjeta."""
+        a = aportes(movs, self.cuenta, self.config)
+        if a.empty:
+            return 0
+        agg = pd.concat([self.agregados, _agrupar(a) * signo]).groupby(level=0).sum()
+        self.agregados = agg[agg["n"] > 0].sort_index()
+        return len(a)
+
+    def estado(self, saldo_actual: float, hoy) -> pd.DataFrame:
+        """Una fila por ciclo (del primero al actual, sin huecos) con saldo al corte y pago.
+
+        saldo_corte = saldo actual − movimientos de los ciclos posteriores (cada ciclo
+        cubre (corte anterior, corte], así que todo lo posterior está en ciclos siguientes).
+        """
+        dia, cfg = self.config["corte"], self.config
+        actual = fechas_corte([np.datetime64(pd.Timestamp(hoy).date(), "D")], dia)[0]
+        cols = ["inicio","corte","limite_pago","cargos","pagos","saldo_corte",
+                "pago_total","pago_minimo","pagado","pendiente","minimo_pendiente"]
+        agg = self.agregados
+        primero = agg.index.min().to_datetime64().astype("datetime64[D]") if not agg.empty else actual
+        ultimo = max(actual, agg.index.max().to_datetime64().astype("datetime64[D]")) if not agg.empty else actual
+        meses = np.arange(primero.astype("datetime64[M]"), ultimo.astype("datetime64[M]") + 1)
+        cortes = pd.DatetimeIndex(_dia_en_mes(meses, dia))
+        agg = agg.reindex(cortes, fill_value=0.0)
+
+        neto = agg["pago"] - agg["cargo"]
+        saldo = saldo_actual - (neto.sum() - neto.cumsum())
+        adeudo = (-saldo).clip(lower=0.0) + 0.0          # + 0.0: sin "-0.00"
+        minimo = np.minimum(adeudo, np.maximum(adeudo * cfg["minimo_pct"], cfg["minimo_fijo"]))
+        pagado = agg["pago_a_tiempo"].shift(-1, fill_value=0.0)   # pagos del ciclo siguiente antes del límite
+        out = pd.DataFrame({
+            "inicio": pd.DatetimeIndex(corte_anterior(cortes.to_numpy("datetime64[D]"), dia)) + pd.Timedelta(days=1),
+            "corte": cortes, "limite_pago": cortes + pd.Timedelta(days=cfg["dias_pago"]),
+            "cargos": agg["cargo"].to_numpy(), "pagos": agg["pago"].to_numpy(),
+            "saldo_corte": saldo.to_numpy(), "pago_total": adeudo.to_numpy(), "pago_minimo": minimo.to_numpy(),
+            "pagado": pagado.to_numpy(),
+        }, columns=cols[:9])
+        out["pendiente"] = (out["pago_total"] - out["pagado"]).clip(lower=0.0) + 0.0
+        out["minimo_pendiente"] = (out["pago_minimo"] - out["pagado"]).clip(lower=0.0) + 0.0
+        return out.reset_index(drop=True)
+
+
+def resumen(estado: pd.DataFrame, hoy) -> dict:
+    """Ciclo en curso y el pago que sigue (del último corte ya cerrado)."""
+    hoy = pd.Timestamp(hoy).normalize()
+    if estado.empty:
+        return {}
+    en_curso = estado[estado["corte"] >= hoy].iloc[0] if (estado["corte"] >= hoy).any() else estado.iloc[-1]
+    cerrados = estado[estado["corte"] < hoy]
+    cerrado = cerrados.iloc[-1] if not cerrados.empty else None
+    return {"en_curso": en_curso, "cerrado": cerrado,
+            "vencido": cerrado is not None and cerrado["limite_pago"] < hoy and cerrado["minimo_pendiente"] > 0}
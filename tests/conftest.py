@@ -0,0 +1,5 @@
+# Los módulos viven en la raíz del repo (no es un paquete): que pytest los encuentre
+# sin importar desde dónde se corra.
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
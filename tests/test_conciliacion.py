@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from conciliacion import a_numero, conciliar
+
+
+def lado(fechas, montos):
+    return pd.DataFrame({"fecha": pd.to_datetime(fechas), "monto": montos})
+
+
+def test_tolerancia_es_inclusiva():
+    estado = lado(["2024-03-10", "2024-03-10"], [-100.0, -200.0])
+    movs = lado(["2024-03-07", "2024-03-06"], [-100.0, -200.0])
+    pares, solo_e, solo_l = conciliar(estado, movs, tolerancia_dias=3)
+    assert pares[["eid", "lid", "dias"]].values.tolist() == [[0, 0, 3]]
+    assert solo_e["eid"].tolist() == [1] and solo_l["lid"].tolist() == [1]
+
+
+def test_cargos_repetidos_se_emparejan_uno_a_uno():
+    estado = lado(["2024-03-01", "2024-03-01", "2024-03-02"], [-59.9, -59.9, -59.9])
+    movs = lado(["2024-03-01", "2024-03-02"], [-59.9, -59.9])
+    pares, solo_e, solo_l = conciliar(estado, movs)
+    assert len(pares) == 2 and pares["lid"].is_unique and pares["eid"].is_unique
+    assert len(solo_e) == 1 and solo_l.empty
+
+
+def test_el_par_mas_temprano_no_roba_al_siguiente():
+    # e(1)–l(4) y e(5)–l(8): emparejar e(1) con l(4) deja a e(5) su pareja
+    estado = lado(["2024-01-01", "2024-01-05"], [10.0, 10.0])
+    movs = lado(["2024-01-04", "2024-01-08"], [10.0, 10.0])
+    pares, _, _ = conciliar(estado, movs, tolerancia_dias=3)
+    assert len(pares) == 2
+
+
+def test_monto_al_centavo_y_signo():
+    estado = lado(["2024-02-01"] * 3, [-10.004, 10.0, -10.02])
+    movs = lado(["2024-02-01"] * 2, [-10.0, -10.0])
+    pares, _, _ = conciliar(estado, movs)
+    assert pares["eid"].tolist() == [0]      # −10.004 redondea a −10.00; +10 y −10.02 no
+
+
+def test_20k_renglones_en_una_pasada():
+    rng = np.random.default_rng(30)
+    n = 20_000
+    fechas = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D")
+    montos = -rng.integers(100, 500_000, n) / 100          # muchos montos repetidos entre sí
+    movs = lado(fechas, montos)
+    desfase = pd.to_timedelta(rng.integers(0, 3, n), unit="D")
+    orden = rng.permutation(n)
+    estado = lado(fechas[orden] + desfase[orden], montos[orden])
+    extra = lado(["2023-06-01"] * 300, np.arange(300) + 0.37)          # sólo en el banco
+    estado = pd.concat([estado, extra], ignore_index=True)
+
+    t0 = time.perf_counter()
+    pares, solo_e, solo_l = conciliar(estado, movs, tolerancia_dias=3)
+    assert time.perf_counter() - t0 < 5.0
+    assert len(pares) == n and solo_l.empty and len(solo_e) == 300
+    assert pares["eid"].is_unique and pares["lid"].is_unique
+    e = estado.iloc[pares["eid"]].reset_index(drop=True)
+    l = movs.iloc[pares["lid"]].reset_index(drop=True)
+    assert np.allclose(e["monto"], l["monto"]) and (pares["dias"] <= 3).all()
+
+
+def test_a_numero_limpia_formatos_de_banco():
+    s = pd.Series(["$1,234.50", "-1,234.50", " 7 ", "n/a"])
+    assert a_numero(s).tolist()[:3] == [1234.5, -1234.5, 7.0] and np.isnan(a_numero(s).iloc[3])
+    assert a_numero(pd.Series([1, 2])).dtype == float
@@ -0,0 +1,82 @@
+import pandas as pd
+
+from concurrencia import fusionar, marcar, parse_versiones, solo_agrega
+
+
+def gastos(*filas):
+    return pd.DataFrame(list(filas), columns=["ts","fecha","cuenta","monto"])
+
+
+BASE = gastos((1, "2024-05-01", "BBVA Credito", 100.0),
+              (2, "2024-05-02", "BBVA Concentradora", 50.0),
+              (3, "2024-05-03", "Apartados", 20.0))
+
+
+def test_altas_de_ambos_lados_se_conservan():
+    nuestra = pd.concat([BASE, gastos((10, "2024-05-04", "GBM", 5.0))], ignore_index=True)
+    suya = pd.concat([BASE, gastos((20, "2024-05-04", "GBM", 7.0), (21, "2024-05-05", "GBM", 8.0))],
+                     ignore_index=True)
+    out, ajenas = fusionar(BASE, nuestra, suya, "ts")
+    assert out["ts"].tolist() == [1, 2, 3, 20, 21, 10]     # lo suyo en su lugar, lo nuestro al final
+    assert ajenas == 2
+
+
+def test_borrado_nuestro_gana_y_el_suyo_se_respeta():
+    nuestra = BASE[BASE["ts"] != 1]                          # borramos 1
+    suya = BASE[BASE["ts"] != 3].copy()                      # el otro borró 3 y editó 1
+    suya.loc[suya["ts"] == 1, "monto"] = 999.0
+    out, ajenas = fusionar(BASE, nuestra, suya, "ts")
+    assert out["ts"].tolist() == [2]
+    assert ajenas == 0
+
+
+def test_ediciones_en_filas_distintas_se_combinan():
+    nuestra = BASE.copy(); nuestra.loc[nuestra["ts"] == 2, "monto"] = 55.0
+    suya = BASE.copy();    suya.loc[suya["ts"] == 3, "cuenta"] = "GBM"
+    out, _ = fusionar(BASE, nuestra, suya, "ts")
+    por_ts = out.set_index(out["ts"].astype(int))
+    assert por_ts.loc[2, "monto"] == 55.0
+    assert por_ts.loc[3, "cuenta"] == "GBM"
+
+
+def test_misma_fila_editada_en_ambos_gana_la_nuestra():
+    nuestra = BASE.copy(); nuestra.loc[nuestra["ts"] == 1, "monto"] = 110.0
+    suya = BASE.copy();    suya.loc[suya["ts"] == 1, "monto"] = 120.0
+    out, _ = fusionar(BASE, nuestra, suya, "ts")
+    assert out.loc[out["ts"] == 1, "monto"].item() == 110.0
+
+
+def test_saldos_suman_la_diferencia_de_cada_dispositivo():
+    base = pd.DataFrame({"clave": ["saldo_GBM", "objetivo_semana"], "valor": ["100", "1500"]})
+    nuestra = base.assign(valor=["80", "1500"])              # gastamos 20
+    suya = base.assign(valor=["150", "1800"])                # el otro ingresó 50 y cambió el objetivo
+    out, _ = fusionar(base, nuestra, suya, "clave", sumar=("valor", "saldo_"))
+    v = dict(zip(out["clave"], out["valor"]))
+    assert float(v["saldo_GBM"]) == 130.0
+    assert v["objetivo_semana"] == "1800"                    # no lo tocamos: queda lo suyo
+
+
+def test_llave_compuesta():
+    base = pd.DataFrame({"fecha": ["2024-05-01"], "pestaña": ["Gastos"], "filas_datos": [10]})
+    nuestra = pd.concat([base, pd.DataFrame({"fecha": ["2024-05-01"], "pestaña": ["Config"],
+                                             "filas_datos": [4]})], ignore_index=True)
+    suya = pd.concat([base, pd.DataFrame({"fecha": ["2024-05-02"], "pestaña": ["Gastos"],
+                                          "filas_datos": [11]})], ignore_index=True)
+    out, ajenas = fusionar(base, nuestra, suya, ["fecha", "pestaña"])
+    assert len(out) == 3 and ajenas == 1
+
+
+def test_sin_base_todo_lo_nuestro_es_nuevo():
+    suya = gastos((5, "2024-05-01", "GBM", 1.0))
+    out, ajenas = fusionar(None, BASE, suya, "ts")
+    assert sorted(out["ts"].astype(int)) == [1, 2, 3, 5]
+    assert ajenas == 1
+
+
+def test_marcar_distingue_agregar_de_reescribir():
+    vers = parse_versiones([["Gastos", "4", "2", "3", "s1"]])
+    agregado = marcar(vers, "Gastos", BASE, pd.concat([BASE, gastos((9, "2024-06-01", "GBM", 1.0))]), "s2")
+    assert (agregado["version"], agregado["reescritura"], agregado["filas"]) == (5, 2, 4)
+    editado = marcar(vers, "Gastos", BASE, BASE.assign(monto=1.0), "s2")
+    assert (editado["version"], editado["reescritura"]) == (5, 5)
+    assert solo_agrega(None, BASE) and not solo_agrega(BASE, BASE.iloc[:2])
@@ -0,0 +1,89 @@
+import os
+
+import pandas as pd
+import pytest
+
+from estados import MANIFIESTO, generar_estados, leer_manifiesto
+from movimientos import efecto_saldos, ledger_unificado
+
+HOY = "2024-06-15"                   # cerrados: enero–mayo 2024
+OBJ = {"objetivo_semana": 1500.0, "objetivo_ahorro_mes": 8500.0}
+CERRADOS = ["2024-01", "2024-02", "2024-03", "2024-04", "2024-05"]
+
+
+class Libro:
+    """Ledger + saldos actuales que se mueven juntos, como al registrar en la app."""
+
+    def __init__(self):
+        dias = pd.date_range("2024-01-02", "2024-06-10", freq="4D")
+        self.g = pd.DataFrame({"ts": range(1, len(dias) + 1), "fecha": dias.date, "cuenta": "BBVA Concentradora",
+                               "monto": [120.0 + d.day for d in dias], "categoria": "Comida", "nota": ""})
+        self.i = pd.DataFrame({"ts": [900 + m for m in range(1, 7)],
+                               "fecha": [f"2024-0{m}-01" for m in range(1, 7)],
+                               "cuenta": "BBVA Concentradora", "monto": 20_000.0, "categoria": "Nómina", "nota": ""})
+        self.saldos = {"BBVA Concentradora": 50_000.0, "Apartados": 8_000.0}
+
+    @property
+    def ledger(self):
+        return ledger_unificado(self.g, None, self.i)
+
+    def gasto(self, ts, fecha, monto):
+        fila = pd.DataFrame([{"ts": ts, "fecha": fecha, "cuenta": "BBVA Concentradora", "monto": monto,
+                              "categoria": "Ocio", "nota": ""}])
+        self.g = pd.concat([self.g, fila], ignore_index=True)
+        for c, v in efecto_saldos(ledger_unificado(fila, None, None)).items():
+            self.saldos[c] = self.saldos.get(c, 0.0) + v
+
+
+@pytest.fixture
+def libro():
+    return Libro()
+
+
+def correr(libro, salida, **kw):
+    hechos, al_dia = generar_estados(libro.ledger, libro.saldos, kw.pop("objetivos", OBJ), str(salida),
+                                     formatos=kw.pop("formatos", ["html"]), procesos=kw.pop("procesos", 1),
+                                     hoy=HOY, **kw)
+    return sorted(hechos), al_dia
+
+
+def test_primera_corrida_genera_todo_y_la_segunda_nada(libro, tmp_path):
+    hechos, al_dia = correr(libro, tmp_path, formatos=["html", "xlsx"], procesos=2)
+    assert hechos == ["2024"] + CERRADOS and al_dia == 0
+    assert all((tmp_path / f"{k}.{f}").exists() for k in hechos for f in ("html", "xlsx"))
+    assert set(leer_manifiesto(str(tmp_path))) == set(hechos)
+    assert correr(libro, tmp_path, formatos=["html", "xlsx"]) == ([], 6)
+
+
+def test_escribir_en_el_mes_en_curso_no_regenera(libro, tmp_path):
+    correr(libro, tmp_path)
+    libro.gasto(5000, "2024-06-14", 999.0)
+    assert correr(libro, tmp_path) == ([], 6)
+
+
+def test_movimiento_atrasado_regenera_desde_su_mes(libro, tmp_path):
+    correr(libro, tmp_path)
+    antes = (tmp_path / "2024-02.html").stat().st_mtime_ns
+    libro.gasto(5001, "2024-03-20", 450.0)
+    hechos, al_dia = correr(libro, tmp_path)
+    assert hechos == ["2024", "2024-03", "2024-04", "2024-05"] and al_dia == 2
+    assert (tmp_path / "2024-02.html").stat().st_mtime_ns == antes
+    assert "450" in (tmp_path / "2024-03.html").read_text(encoding="utf-8").replace(",", "")
+
+
+def test_archivo_faltante_se_regenera_solo(libro, tmp_path):
+    correr(libro, tmp_path)
+    os.remove(tmp_path / "2024-04.html")
+    assert correr(libro, tmp_path)[0] == ["2024-04"]
+
+
+def test_objetivos_o_todo_regeneran_todo(libro, tmp_path):
+    correr(libro, tmp_path)
+    assert len(correr(libro, tmp_path, objetivos={**OBJ, "objetivo_semana": 2000.0})[0]) == 6
+    assert len(correr(libro, tmp_path, objetivos={**OBJ, "objetivo_semana": 2000.0}, todo=True)[0]) == 6
+
+
+def test_manifiesto_danado_regenera(libro, tmp_path):
+    correr(libro, tmp_path)
+    (tmp_path / MANIFIESTO).write_text("{no es json", encoding="utf-8")
+    assert len(correr(libro, tmp_path)[0]) == 6
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from movimientos import con_saldos, efecto_saldos, exigir_tasas, ledger_unificado, restaurar_filas
+
+CONC, APART = "BBVA Concentradora", "Apartados"
+
+
+@pytest.fixture
+def tablas():
+    """Gastos/Traspasos/Ingresos como vienen de Sheets, fuera de orden a propósito."""
+    g = pd.DataFrame({"ts": [5, 4], "fecha": ["2024-01-03", "2024-01-03"], "cuenta": [CONC, CONC],
+                      "monto": [100.0, 50.0], "categoria": "Comida", "nota": ""})
+    t = pd.DataFrame({"ts": [3], "fecha": ["2024-01-02"], "cuenta_emisora": [CONC],
+                      "cuenta_receptora": [APART], "monto": [300.0], "comentario": "Ahorro"})
+    i = pd.DataFrame({"ts": [1], "fecha": ["2024-01-01"], "cuenta": [CONC], "monto": [1000.0],
+                      "categoria": "Nómina", "nota": ""})
+    return g, t, i
+
+
+def test_saldo_despues_de_cada_movimiento(tablas):
+    led = ledger_unificado(*tablas)
+    led.index = [40, 10, 30, 20]                     # índice arbitrario: el resultado se alinea por posición
+    s = con_saldos(led, {CONC: 550.0, APART: 500.0})
+    assert s.index.tolist() == led.index.tolist()
+    por_ts = s.assign(ts=led["ts"].to_numpy()).set_index("ts")
+    assert por_ts["saldo_cuenta"].to_dict() == {5: 550.0, 4: 650.0, 3: 700.0, 1: 1000.0}
+    assert por_ts.loc[3, "saldo_receptora"] == 500.0
+    assert por_ts["saldo_receptora"].drop(3).isna().all()
+
+
+def test_ultimo_saldo_es_el_actual_y_cuadra_con_el_efecto(tablas):
+    led = ledger_unificado(*tablas)
+    actuales = {CONC: 550.0, APART: 500.0}
+    s = con_saldos(led, actuales)
+    ef = efecto_saldos(led)
+    assert ef[CONC] == -450.0 + 1000.0 and ef[APART] == 300.0
+    # el saldo previo al primer movimiento de cada cuenta es el actual menos todo su efecto
+    primero = s.loc[led["ts"] == 1, "saldo_cuenta"].item() - 1000.0
+    assert primero == actuales[CONC] - ef[CONC]
+
+
+def test_fechas_vacias_van_primero(tablas):
+    g, t, i = tablas
+    g = pd.concat([g, pd.DataFrame({"ts": [9], "fecha": [None], "cuenta": [CONC], "monto": [25.0],
+                                    "categoria": "", "nota": ""})], ignore_index=True)
+    led = ledger_unificado(g, t, i)
+    s = con_saldos(led, {CONC: 525.0, APART: 500.0})
+    assert s.loc[led["ts"] == 9, "saldo_cuenta"].item() == -25.0     # antes de todo lo fechado
+    assert s.loc[led["ts"] == 5, "saldo_cuenta"].item() == 525.0
+
+
+def test_tasa_guardada_gana_y_sin_tasa_no_se_inventa():
+    g = pd.DataFrame({"ts": [1, 2, 3], "fecha": ["2024-02-01"] * 3, "cuenta": CONC, "monto": [10.0, 10.0, 10.0],
+                      "categoria": "", "nota": "", "moneda": ["usd", "USD", "EUR"], "tasa": [17.0, None, None]})
+    tasas = pd.DataFrame({"fecha": pd.to_datetime(["2024-01-15"]), "moneda": ["USD"], "tasa": [18.0]})
+    led = ledger_unificado(g, None, None, tasas)
+    assert led["tasa"].tolist()[:2] == [17.0, 18.0] and np.isnan(led["tasa"].iloc[2])
+    assert led["monto"].tolist()[:2] == [170.0, 180.0]
+    with pytest.raises(ValueError, match="EUR"):
+        exigir_tasas(led)
+    exigir_tasas(led.iloc[:2])
+
+
+def test_deshacer_lote_respeta_lo_escrito_despues():
+    antes_lote = pd.DataFrame({"ts": [1, 2, 3], "fecha": ["2024-04-01"] * 3, "cuenta": [CONC, CONC, APART],
+                               "monto": [10.0, 20.0, 30.0], "categoria": "Comida", "nota": ""})
+    lote = antes_lote[antes_lote["ts"].isin([1, 3])]
+    # el lote cambió 1 de cuenta y borró 3; después otro registro agregó 4 y editó 2
+    ahora = pd.DataFrame({"ts": [1, 2, 4], "fecha": ["2024-04-01"] * 3, "cuenta": [APART, CONC, CONC],
+                          "monto": [10.0, 25.0, 40.0], "categoria": "Comida", "nota": ""})
+    tabla, como_estaban = restaurar_filas(ahora, lote)
+    assert tabla["ts"].tolist() == [1, 2, 4, 3]                       # borradas al final
+    assert tabla.set_index("ts").loc[1, "cuenta"] == CONC              # editada: vuelve en su lugar
+    assert tabla.set_index("ts").loc[2, "monto"] == 25.0               # lo de después se conserva
+    assert como_estaban["ts"].tolist() == [1]
+    delta = efecto_saldos(ledger_unificado(lote, None, None)) \
+        .sub(efecto_saldos(ledger_unificado(como_estaban, None, None)), fill_value=0.0)
+    assert delta.to_dict() == {APART: -30.0 + 10.0, CONC: -10.0}
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from muestreo import lttb, reducir
+
+
+def test_indices_ordenados_con_extremos():
+    x = np.arange(10_000)
+    y = np.sin(x / 300.0)
+    idx = lttb(x, y, 200)
+    assert len(idx) == 200 and idx[0] == 0 and idx[-1] == len(x) - 1
+    assert (np.diff(idx) > 0).all()
+
+
+def test_conserva_picos_y_escalones():
+    y = np.zeros(5_000)
+    y[1234] = 50.0                 # un cargo atípico de un día
+    y[3000:] = -20.0               # un escalón (p. ej. un traspaso grande)
+    idx = lttb(np.arange(len(y)), y, 100)
+    assert 1234 in idx
+    assert ((idx >= 2990) & (idx <= 3010)).any()
+
+
+def test_pocos_puntos_no_se_tocan():
+    assert lttb([0, 1, 2], [5, 6, 7], 10).tolist() == [0, 1, 2]
+    assert lttb(np.arange(50), np.arange(50), 2).tolist() == list(range(50))   # n < 3: sin reducir
+
+
+def test_reducir_serie_diaria():
+    dias = pd.date_range("2015-01-01", "2024-12-31", freq="D")
+    serie = pd.Series(np.cumsum(np.random.default_rng(36).normal(size=len(dias))), index=dias)
+    serie.iloc[::97] = np.nan
+    r = reducir(serie, 400)
+    assert len(r) == 400 and r.notna().all()
+    assert r.index[0] == dias[1] and r.index[-1] == dias[-1]     # el primer día era NaN
+    assert r.index.is_monotonic_increasing
+    assert reducir(serie.iloc[:100], 400).equals(serie.iloc[:100].dropna())
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from recurrentes import REC_COLS, ocurrencias_recurrentes, ts_recurrente
+
+
+@pytest.fixture
+def reglas():
+    r = pd.DataFrame([
+        {"id": "renta", "tipo": "Gasto", "frecuencia": "Mensual", "monto": 9000, "cuenta": "BBVA Concentradora",
+         "categoria": "Servicios", "inicio": "2024-01-31"},
+        {"id": "ahorro", "tipo": "Traspaso", "frecuencia": "Quincenal", "monto": 1500,
+         "cuenta": "BBVA Concentradora", "cuenta_receptora": "Apartados", "inicio": "2024-01-05",
+         "fin": "2024-03-01"},
+        {"id": "seguro", "tipo": "Gasto", "frecuencia": "Anual", "monto": 4000, "cuenta": "BBVA Credito",
+         "categoria": "Otro", "inicio": "2020-02-29"},
+    ])
+    return r.reindex(columns=REC_COLS)
+
+
+def fechas_de(occ, regla):
+    return occ.loc[occ["regla"] == regla, "fecha"].dt.strftime("%Y-%m-%d").tolist()
+
+
+def test_mensual_recorta_a_fin_de_mes_sin_arrastrar_el_recorte(reglas):
+    occ = ocurrencias_recurrentes(reglas, "2024-01-01", "2024-05-31")
+    assert fechas_de(occ, "renta") == ["2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30", "2024-05-31"]
+
+
+def test_anual_desde_29_de_febrero(reglas):
+    occ = ocurrencias_recurrentes(reglas, "2021-01-01", "2024-12-31")
+    assert fechas_de(occ, "seguro") == ["2021-02-28", "2022-02-28", "2023-02-28", "2024-02-29"]
+
+
+def test_quincenal_respeta_fin_y_ventana(reglas):
+    occ = ocurrencias_recurrentes(reglas, "2024-01-10", "2024-12-31")
+    assert fechas_de(occ, "ahorro") == ["2024-01-19", "2024-02-02", "2024-02-16", "2024-03-01"]
+    t = occ[occ["regla"] == "ahorro"]
+    assert (t["cuenta_receptora"] == "Apartados").all() and (t["tipo"] == "Traspaso").all()
+
+
+def test_desde_por_regla_continua_donde_se_quedo(reglas):
+    marca = pd.Series(["2024-03-31", None, "2024-01-01"], index=reglas.index)
+    occ = ocurrencias_recurrentes(reglas, marca, "2024-04-30")
+    assert fechas_de(occ, "renta") == ["2024-03-31", "2024-04-30"]   # la marca es inclusiva
+    assert fechas_de(occ, "ahorro")[0] == "2024-01-05"                # nunca corrida: desde su inicio
+    assert fechas_de(occ, "seguro") == ["2024-02-29"]
+
+
+def test_ts_determinista_y_distinto_por_regla(reglas):
+    a = ocurrencias_recurrentes(reglas, "2024-01-01", "2024-06-30")
+    b = ocurrencias_recurrentes(reglas.iloc[::-1].reset_index(drop=True), "2024-01-01", "2024-06-30")
+    assert sorted(a["ts"]) == sorted(b["ts"])
+    assert a["ts"].is_unique
+    f = np.array(["2024-05-01"], dtype="datetime64[D]")
+    assert ts_recurrente(["renta"], f)[0] != ts_recurrente(["ahorro"], f)[0]
+    assert ts_recurrente(["renta"], f)[0] // 86_400_000 == f.astype("datetime64[D]").astype("int64")[0]
+
+
+def test_reglas_invalidas_o_vacias():
+    vacio = ocurrencias_recurrentes(pd.DataFrame(columns=REC_COLS), "2024-01-01", "2024-12-31")
+    assert vacio.empty and "regla" in vacio.columns
+    mala = pd.DataFrame([{"id": "x", "tipo": "Gasto", "frecuencia": "Cada tanto", "monto": 1,
+                          "inicio": "2024-01-01"}]).reindex(columns=REC_COLS)
+    assert ocurrencias_recurrentes(mala, "2024-01-01", "2024-12-31").empty
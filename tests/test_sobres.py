@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from sobres import PRESUPUESTOS_COLS, Sobres, inicio_periodo
+
+
+def defs(*filas):
+    return pd.DataFrame([dict(zip(PRESUPUESTOS_COLS, f)) for f in filas])
+
+
+DEFS = defs(("s1", "Comida", "", "Mensual", 1000, "Ninguno", "2024-01-01"),
+            ("s2", "Comida", "", "Mensual", 1000, "Sobrante", "2024-01-01"),
+            ("s3", "Comida", "", "Mensual", 1000, "Todo", "2024-01-01"),
+            ("s4", "Comida", "BBVA Credito", "Semanal", 300, "Ninguno", "2024-03-01"))
+
+
+def gasto(fecha, monto, cuenta="BBVA Concentradora", categoria="Comida"):
+    return {"tipo": "Gasto", "fecha": pd.Timestamp(fecha), "categoria": categoria, "cuenta": cuenta, "monto": monto}
+
+
+LEDGER = pd.DataFrame([gasto("2024-01-15", 700.0), gasto("2024-02-03", 900.0), gasto("2024-02-20", 600.0),
+                       gasto("2024-03-05", 200.0, "BBVA Credito"), gasto("2024-03-06", 50.0, categoria="Ocio"),
+                       {"tipo": "Ingreso", "fecha": pd.Timestamp("2024-03-07"), "categoria": "Comida",
+                        "cuenta": "BBVA Concentradora", "monto": 5000.0}])
+
+
+def por_id(est):
+    return est.set_index("id")
+
+
+def test_arrastre_segun_regla():
+    # enero sobran 300, febrero se pasa por 500, marzo sobran 800
+    est = por_id(Sobres(DEFS).reconstruir(LEDGER).estado("2024-04-10"))
+    assert est.loc["s1", "arrastre"] == 0.0
+    assert est.loc["s2", "arrastre"] == 800.0     # el exceso de febrero no se arrastra
+    assert est.loc["s3", "arrastre"] == 600.0     # 300 − 500 + 800
+    assert est.loc["s3", "restante"] == 1600.0 and est.loc["s3", "uso"] == 0.0
+
+
+def test_sobre_por_cuenta_y_desde_su_inicio():
+    sob = Sobres(DEFS).reconstruir(LEDGER)
+    semana = inicio_periodo("2024-03-05", "W")
+    assert semana == pd.Timestamp("2024-03-04")        # lunes
+    assert dict(sob.gastado["s4"]) == {semana: 200.0}  # sólo BBVA Credito, nada antes de marzo
+    est = por_id(sob.estado("2024-03-06"))
+    assert est.loc["s4", "gastado"] == 200.0 and np.isclose(est.loc["s4", "uso"], 2 / 3)
+    assert est.loc["s1", "gastado"] == 200.0           # el mensual sin cuenta ve todos los de Comida
+
+
+def test_aplicar_cuadra_con_reconstruir():
+    rng = np.random.default_rng(39)
+    extra = pd.DataFrame([gasto(pd.Timestamp("2024-01-01") + pd.Timedelta(days=int(d)), float(m),
+                                rng.choice(["BBVA Credito", "GBM"]), rng.choice(["Comida", "Ocio"]))
+                          for d, m in zip(rng.integers(0, 120, 300), rng.integers(1, 400, 300))])
+    sob = Sobres(DEFS).reconstruir(LEDGER)
+    sob.estado("2024-05-01")                            # deja el arrastre en caché
+    for r in extra.itertuples(index=False):
+        sob.aplicar(r.fecha, r.categoria, r.cuenta, r.monto)
+    quitar = extra.iloc[::4]
+    for r in quitar.itertuples(index=False):
+        sob.aplicar(r.fecha, r.categoria, r.cuenta, r.monto, -1)
+    led = pd.concat([LEDGER, extra.drop(quitar.index)], ignore_index=True)
+    assert sob.diferencias(led).empty
+    pd.testing.assert_frame_equal(sob.estado("2024-05-01"), Sobres(DEFS).reconstruir(led).estado("2024-05-01"),
+                                  atol=1e-6)
+
+
+def test_gasto_en_periodo_cerrado_rehace_el_arrastre():
+    sob = Sobres(DEFS).reconstruir(LEDGER)
+    assert por_id(sob.estado("2024-04-10")).loc["s3", "arrastre"] == 600.0
+    sob.aplicar("2024-01-20", "Comida", "GBM", 100.0)
+    assert por_id(sob.estado("2024-04-10")).loc["s3", "arrastre"] == 500.0
+
+
+def test_definiciones_invalidas_se_ignoran():
+    sob = Sobres(defs(("a", "Comida", "", "Diario", 100, "Todo", "2024-01-01"),
+                      ("b", "", "", "Mensual", 100, "Todo", "2024-01-01"),
+                      ("c", "Comida", None, "Mensual", "x", "Todo", "2024-01-01"),
+                      ("d", "Comida", None, "Mensual", 100, "Raro", None)))
+    assert list(sob.defs) == ["d"]
+    assert sob.defs["d"]["arrastre"] == "Ninguno" and sob.defs["d"]["cuenta"] == ""
+    assert sob.reconstruir(LEDGER.iloc[0:0]).estado("2024-01-01")["gastado"].tolist() == [0.0]
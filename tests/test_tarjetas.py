@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from movimientos import ledger_unificado
+from tarjetas import CONFIG_DEFAULT, CiclosTarjeta, corte_anterior, fechas_corte, leer_config
+
+TC = "BBVA Credito"
+CONF = {**CONFIG_DEFAULT, "corte": 5, "dias_pago": 20, "minimo_pct": 0.1, "minimo_fijo": 100.0}
+
+
+@pytest.fixture
+def ledger():
+    g = pd.DataFrame({"ts": [1, 2, 3, 4], "fecha": ["2024-01-03", "2024-01-05", "2024-01-06", "2024-02-10"],
+                      "cuenta": [TC, TC, TC, "BBVA Concentradora"], "monto": [300.0, 200.0, 1000.0, 50.0],
+                      "categoria": "Comida", "nota": ""})
+    t = pd.DataFrame({"ts": [10, 11], "fecha": ["2024-01-20", "2024-02-28"],
+                      "cuenta_emisora": "BBVA Concentradora", "cuenta_receptora": TC,
+                      "monto": [500.0, 400.0], "comentario": "Pago tarjeta"})
+    return ledger_unificado(g, t, None)
+
+
+def test_corte_recortado_a_fin_de_mes():
+    f = np.array(["2024-02-10", "2024-02-29", "2024-03-01", "2024-04-30"], dtype="datetime64[D]")
+    assert fechas_corte(f, 31).astype(str).tolist() == ["2024-02-29", "2024-02-29", "2024-03-31", "2024-04-30"]
+    assert corte_anterior(np.array(["2024-03-31"], dtype="datetime64[D]"), 31).astype(str).tolist() == ["2024-02-29"]
+
+
+def test_el_dia_de_corte_cierra_su_ciclo(ledger):
+    agg = CiclosTarjeta(TC, CONF).reconstruir(ledger).agregados
+    assert agg.loc["2024-01-05", "cargo"] == 500.0          # 3 y 5 de enero
+    assert agg.loc["2024-02-05", "cargo"] == 1000.0         # el 6 ya es del ciclo siguiente
+    assert agg.loc["2024-02-05", "pago"] == 500.0
+    assert agg.loc["2024-02-05", "pago_a_tiempo"] == 500.0  # antes del 25 de enero (límite del ciclo anterior)
+    assert agg.loc["2024-03-05", "pago_a_tiempo"] == 0.0     # el 28 de feb pasó del límite (25 de feb)
+
+
+def test_aplicar_equivale_a_reagrupar(ledger):
+    rng = np.random.default_rng(38)
+    n = 400
+    g = pd.DataFrame({"ts": 1000 + np.arange(n),
+                      "fecha": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 200, n), unit="D"),
+                      "cuenta": rng.choice([TC, "GBM"], n), "monto": rng.integers(1, 900, n).astype(float),
+                      "categoria": "Ocio", "nota": ""})
+    nuevos = ledger_unificado(g, None, None)
+    motor = CiclosTarjeta(TC, CONF).reconstruir(ledger)
+    for i in range(0, n, 50):                              # de a poco, como registrar_*
+        motor.aplicar(nuevos.iloc[i:i + 50], 1)
+    quitados = nuevos.iloc[::3]
+    motor.aplicar(quitados, -1)                            # como eliminar_*
+    quedan = pd.concat([ledger, nuevos.drop(quitados.index)], ignore_index=True)
+    esperado = CiclosTarjeta(TC, CONF).reconstruir(quedan).agregados
+    pd.testing.assert_frame_equal(motor.agregados, esperado, check_dtype=False, check_freq=False, atol=1e-6)
+
+
+def test_aplicar_ignora_otras_cuentas(ledger):
+    motor = CiclosTarjeta(TC, CONF).reconstruir(ledger)
+    antes = motor.agregados.copy()
+    assert motor.aplicar(ledger[ledger["cuenta"] == "BBVA Concentradora"].iloc[:1], 1) == 0
+    pd.testing.assert_frame_equal(motor.agregados, antes)
+
+
+def test_estado_saldo_al_corte_y_pagos(ledger):
+    motor = CiclosTarjeta(TC, CONF).reconstruir(ledger)
+    # saldo actual: −300 −200 −1000 +500 +400 = −600
+    est = motor.estado(-600.0, "2024-03-01").set_index("corte")
+    assert list(est.index.strftime("%m-%d")) == ["01-05", "02-05", "03-05"]
+    ene, feb = est.loc["2024-01-05"], est.loc["2024-02-05"]
+    assert ene["saldo_corte"] == -500.0 and ene["pago_total"] == 500.0
+    assert ene["pago_minimo"] == 100.0                     # 10 % = 50 < mínimo fijo
+    assert ene["pagado"] == 500.0 and ene["pendiente"] == 0.0
+    assert feb["saldo_corte"] == -1000.0 and feb["pagado"] == 0.0 and feb["minimo_pendiente"] == 100.0
+
+
+def test_leer_config_tolera_basura():
+    c = leer_config('{"corte": 40, "dias_pago": "x", "otro": 1}')
+    assert c["corte"] == 31 and c["dias_pago"] == CONFIG_DEFAULT["dias_pago"] and "otro" not in c
+    assert leer_config("no es json") == CONFIG_DEFAULT